@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
 from .models import (
-    TradingPair, Order, Trade, OrderBook, 
+    TradingPair, Order, Trade, OrderBook, Candle,
     TestExchangeAPI, TestTrade
 )
 
@@ -134,6 +134,15 @@ class OrderBookAdmin(admin.ModelAdmin):
     list_filter = ('trading_pair', 'side')
     ordering = ('trading_pair', 'side', '-price')
 
+@admin.register(Candle)
+class CandleAdmin(admin.ModelAdmin):
+    list_display = (
+        'trading_pair', 'resolution', 'open_time', 'open_price', 'high_price',
+        'low_price', 'close_price', 'volume'
+    )
+    list_filter = ('trading_pair', 'resolution')
+    ordering = ('trading_pair', 'resolution', '-open_time')
+
 @admin.register(TestExchangeAPI)
 class TestExchangeAPIAdmin(admin.ModelAdmin):
     list_display = (
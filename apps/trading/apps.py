@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+class TradingConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.trading'
+    verbose_name = 'Trading'
+
+    def ready(self):
+        """
+        Import signal handlers when the app is ready.
+        """
+        import apps.trading.signals  # noqa
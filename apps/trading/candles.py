@@ -0,0 +1,297 @@
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from typing import Deque, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections
+from .models import Candle, TradingPair
+
+logger = logging.getLogger(__name__)
+
+CANDLE_SETTINGS = getattr(settings, 'CANDLES', {})
+
+# Bar length in seconds per resolution; bars open on multiples of it (UTC)
+RESOLUTIONS = {'1s': 1, '1m': 60, '5m': 300, '1h': 3600, '1d': 86400}
+
+
+def to_datetime(epoch: float) -> datetime:
+    return datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+
+
+class Bar:
+    """An OHLCV bar; open_time is in epoch seconds"""
+    __slots__ = ('open_time', 'open', 'high', 'low', 'close', 'volume', 'updates')
+
+    def __init__(self, open_time: int, price: Decimal, volume: Decimal):
+        self.open_time = open_time
+        self.open = self.high = self.low = self.close = price
+        self.volume = volume
+        self.updates = 1
+
+    def update(self, price: Decimal, volume: Decimal):
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += volume
+        self.updates += 1
+
+    def to_dict(self, closed: bool = True) -> dict:
+        return {
+            'open_time': to_datetime(self.open_time).isoformat(),
+            'open': str(self.open),
+            'high': str(self.high),
+            'low': str(self.low),
+            'close': str(self.close),
+            'volume': str(self.volume),
+            'updates': self.updates,
+            'closed': closed,
+        }
+
+
+def candle_dict(candle: Candle) -> dict:
+    """A stored candle in the shape of Bar.to_dict"""
+    return {
+        'open_time': candle.open_time.isoformat(),
+        'open': str(candle.open_price),
+        'high': str(candle.high_price),
+        'low': str(candle.low_price),
+        'close': str(candle.close_price),
+        'volume': str(candle.volume),
+        'updates': candle.updates,
+        'closed': True,
+    }
+
+
+class CandleAggregator:
+    """
+    Rolling OHLCV bars per pair at every resolution in RESOLUTIONS, built
+    incrementally from feed ticks (price only) and engine trades (price and
+    volume). Each (pair, resolution) keeps its open bar plus the last
+    ring_size closed bars in a ring buffer, so recent candles are served
+    from memory.
+
+    A bar closes when an update falls into a later bar, or once its end has
+    passed on the flush thread's next pass. Closed bars are queued and
+    written every interval seconds with one bulk insert by a daemon thread
+    started with the first update. Bars already stored for the same pair,
+    resolution and open time (written by another process) are left as they
+    are. If the insert is refused (a pair deleted meanwhile, a price out of
+    range), bars of missing pairs are dropped with their series and the
+    rest are written one by one, dropping those refused; any other failure
+    keeps the batch for the next pass, up to max_pending bars (the oldest
+    are dropped beyond that).
+
+    Updates falling into a bar that already closed are counted and
+    dropped from it.
+    """
+
+    def __init__(self, ring_size: Optional[int] = None, interval: Optional[float] = None,
+                 max_pending: Optional[int] = None):
+        if ring_size is None:
+            ring_size = CANDLE_SETTINGS.get('RING_SIZE', 1000)
+        if interval is None:
+            interval = CANDLE_SETTINGS.get('FLUSH_INTERVAL', 1.0)
+        if max_pending is None:
+            max_pending = CANDLE_SETTINGS.get('MAX_PENDING', 100000)
+        self.ring_size = ring_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.closed: Dict[Tuple[int, str], Deque[Bar]] = {}
+        self.current: Dict[Tuple[int, str], Bar] = {}
+        self.pending: List[Tuple[int, str, Bar]] = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.updates = 0
+        self.late = 0
+        self.bars_written = 0
+        self.bars_dropped = 0
+
+    def add(self, trading_pair_id: int, price: Decimal, volume: Decimal, at: float):
+        """Fold a price (and traded volume) seen at epoch time at into every resolution"""
+        with self.lock:
+            late = False
+            for resolution, seconds in RESOLUTIONS.items():
+                key = (trading_pair_id, resolution)
+                open_time = int(at // seconds) * seconds
+                bar = self.current.get(key)
+                if bar is None:
+                    ring = self.closed.get(key)
+                    if ring and open_time <= ring[-1].open_time:
+                        late = True  # Its bar was closed already
+                        continue
+                    self.current[key] = Bar(open_time, price, volume)
+                elif open_time > bar.open_time:
+                    self.close_bar(key, bar)
+                    self.current[key] = Bar(open_time, price, volume)
+                elif open_time == bar.open_time:
+                    bar.update(price, volume)
+                else:
+                    late = True
+            self.updates += 1
+            self.late += late
+        self.start()
+
+    def add_tick(self, trading_pair_id: int, tick, received: Optional[float] = None):
+        """Fold an MCXTick's last price, received at epoch time received (now by default)"""
+        price = tick.price('last_price')
+        if price is not None:
+            self.add(trading_pair_id, price, Decimal('0'), time.time() if received is None else received)
+
+    def add_trades(self, trading_pair_id: int, trades):
+        """Fold saved Trades, at their timestamps"""
+        for trade in trades:
+            self.add(trading_pair_id, trade.price, trade.quantity, trade.timestamp.timestamp())
+
+    def close_bar(self, key: Tuple[int, str], bar: Bar):
+        ring = self.closed.get(key)
+        if ring is None:
+            ring = self.closed[key] = deque(maxlen=self.ring_size)
+        ring.append(bar)
+        self.pending.append((key[0], key[1], bar))
+
+    def close_expired(self, now: float):
+        """Close the open bars whose end has passed"""
+        with self.lock:
+            for key, bar in list(self.current.items()):
+                if bar.open_time + RESOLUTIONS[key[1]] <= now:
+                    del self.current[key]
+                    self.close_bar(key, bar)
+
+    def start(self):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name='candle-writer', daemon=True)
+                    self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.close_expired(time.time())
+            if self.pending:
+                close_old_connections()
+                self.flush()
+
+    def flush(self):
+        """Write the queued closed bars (see the class docstring for failures)"""
+        with self.lock:
+            batch, self.pending = self.pending, []
+        try:
+            self.write(batch)
+        except (IntegrityError, DataError) as e:
+            logger.error(f"Error writing {len(batch)} candles, writing them one by one: {str(e)}")
+            self.write_rows(batch)
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} candles: {str(e)}")
+            self.requeue(batch)
+
+    def write(self, batch: List[Tuple[int, str, Bar]]):
+        Candle.objects.bulk_create([
+            Candle(
+                trading_pair_id=trading_pair_id,
+                resolution=resolution,
+                open_time=to_datetime(bar.open_time),
+                open_price=bar.open,
+                high_price=bar.high,
+                low_price=bar.low,
+                close_price=bar.close,
+                volume=bar.volume,
+                updates=bar.updates,
+            )
+            for trading_pair_id, resolution, bar in batch
+        ], ignore_conflicts=True)
+        self.bars_written += len(batch)
+
+    def write_rows(self, batch: List[Tuple[int, str, Bar]]):
+        """Drop the bars of deleted pairs, then write the rest one at a time"""
+        pair_ids = {trading_pair_id for trading_pair_id, _, _ in batch}
+        try:
+            missing = pair_ids - set(TradingPair.objects.filter(id__in=pair_ids).values_list('id', flat=True))
+        except Exception as e:
+            logger.error(f"Error looking up the pairs of {len(batch)} candles: {str(e)}")
+            self.requeue(batch)
+            return
+        if missing:
+            self.forget(missing)
+            kept = [row for row in batch if row[0] not in missing]
+            self.bars_dropped += len(batch) - len(kept)
+            logger.error(f"Dropped {len(batch) - len(kept)} candles of deleted pairs {sorted(missing)}")
+            batch = kept
+        for index, row in enumerate(batch):
+            try:
+                self.write([row])
+            except (IntegrityError, DataError) as e:
+                self.bars_dropped += 1
+                logger.error(f"Dropped {row[1]} candle of pair {row[0]} at {to_datetime(row[2].open_time)}: {str(e)}")
+            except Exception as e:
+                logger.error(f"Error writing {len(batch) - index} candles: {str(e)}")
+                self.requeue(batch[index:])
+                return
+
+    def requeue(self, batch: List[Tuple[int, str, Bar]]):
+        """Put unwritten bars back ahead of newer ones, dropping the oldest beyond max_pending"""
+        with self.lock:
+            self.pending = batch + self.pending
+            excess = len(self.pending) - self.max_pending
+            if excess > 0:
+                del self.pending[:excess]
+                self.bars_dropped += excess
+        if excess > 0:
+            logger.error(f"Candle queue full: dropped the {excess} oldest unwritten candles")
+
+    def forget(self, trading_pair_ids):
+        """Drop the bars held for pairs, e.g. ones deleted from the database"""
+        with self.lock:
+            for key in [key for key in self.closed if key[0] in trading_pair_ids]:
+                del self.closed[key]
+            for key in [key for key in self.current if key[0] in trading_pair_ids]:
+                del self.current[key]
+
+    def recent(self, trading_pair_id: int, resolution: str) -> List[Tuple[Bar, bool]]:
+        """(bar, closed) for the bars held in memory, oldest first"""
+        key = (trading_pair_id, resolution)
+        with self.lock:
+            bars = [(bar, True) for bar in self.closed.get(key, ())]
+            bar = self.current.get(key)
+            if bar is not None:
+                bars.append((bar, False))
+        return bars
+
+    def get_candles(self, trading_pair_id: int, resolution: str, start: Optional[datetime] = None,
+                    end: Optional[datetime] = None, limit: int = 500) -> List[dict]:
+        """
+        Up to limit bars opening in [start, end), oldest first; the latest
+        ones when start is not given. Stored bars are read for the whole
+        range, whichever process wrote them, and the bars held in memory
+        replace those with the same open time.
+        """
+        stored = Candle.objects.filter(trading_pair_id=trading_pair_id, resolution=resolution)
+        if start is not None:
+            stored = stored.filter(open_time__gte=start)
+        if end is not None:
+            stored = stored.filter(open_time__lt=end)
+        stored = stored.order_by('open_time' if start is not None else '-open_time')[:limit]
+        bars = {int(candle.open_time.timestamp()): candle_dict(candle) for candle in stored}
+        for bar, closed in self.recent(trading_pair_id, resolution):
+            if (start is None or bar.open_time >= start.timestamp()) and (end is None or bar.open_time < end.timestamp()):
+                bars[bar.open_time] = bar.to_dict(closed)
+        candles = [bars[open_time] for open_time in sorted(bars)]
+        return candles[:limit] if start is not None else candles[-limit:]
+
+    def get_metrics(self) -> dict:
+        return {
+            'series': len(self.current),
+            'updates': self.updates,
+            'late': self.late,
+            'pending_bars': len(self.pending),
+            'bars_written': self.bars_written,
+            'bars_dropped': self.bars_dropped,
+        }
+
+
+candle_aggregator = CandleAggregator()
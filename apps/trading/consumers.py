@@ -1,133 +1,72 @@
 import json
-import asyncio
-import websockets
 import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
-from asgiref.sync import sync_to_async
-from django.utils import timezone
-from decimal import Decimal
-from .models import TradingPair
+from .events import MCX_FEED_GROUP
+from .mcx_upstream import mcx_upstream
+from .outbound import OutboundBuffer
+from .subscriptions import MARKET_DATA_SUBPROTOCOL, Subscriptions, parse_subscription_message
 
 logger = logging.getLogger(__name__)
 
 class MCXMarketDataConsumer(AsyncWebsocketConsumer):
-    MCX_WS_URL = "ws://78.46.93.146:8084"
+    """
+    Raw MCX ticks. Every connection shares the process's single upstream
+    session (see MCXUpstream), which parses each message once and
+    publishes its ticks to the MCX feed group; this consumer only forwards
+    the ticks its client subscribed to.
+    """
     
     async def connect(self):
         """
-        Connect to the WebSocket server and start receiving market data
+        Join the MCX feed group and make sure the shared upstream is running.
+        market.data.v1 clients only receive the MCX symbols they subscribe
+        to (see MarketDataConsumer for the protocol); others get them all.
         """
-        await self.accept()
-        self.mcx_connection = None
-        self.is_running = True
-        
-        # Start the MCX data feed
-        asyncio.create_task(self.connect_to_mcx())
+        self.subscriptions = Subscriptions()
+        self.outbound = None
+        subprotocols = self.scope.get('subprotocols') or []
+        if MARKET_DATA_SUBPROTOCOL in subprotocols:
+            await self.accept(subprotocol=MARKET_DATA_SUBPROTOCOL)
+        elif subprotocols:
+            await self.close()
+            return
+        else:
+            await self.accept()
+            self.subscriptions.add(['*'])
+        self.outbound = OutboundBuffer(self)
+        self.outbound.start()
+        await self.channel_layer.group_add(MCX_FEED_GROUP, self.channel_name)
+        mcx_upstream.acquire()
 
     async def disconnect(self, close_code):
         """
-        Clean up connections on disconnect
+        Leave the feed group; the upstream idles once nobody is subscribed
         """
-        self.is_running = False
-        if self.mcx_connection:
-            await self.mcx_connection.close()
+        if self.outbound is None:
+            return
+        self.outbound.stop()
+        await self.channel_layer.group_discard(MCX_FEED_GROUP, self.channel_name)
+        mcx_upstream.release()
 
-    async def connect_to_mcx(self):
+    async def receive(self, text_data=None, bytes_data=None):
         """
-        Connect to MCX WebSocket and handle incoming data
-        """
-        while self.is_running:
-            try:
-                async with websockets.connect(self.MCX_WS_URL) as websocket:
-                    self.mcx_connection = websocket
-                    logger.info("Connected to MCX WebSocket")
-                    
-                    while self.is_running:
-                        try:
-                            message = await websocket.recv()
-                            await self.process_mcx_data(message)
-                        except websockets.ConnectionClosed:
-                            logger.warning("MCX WebSocket connection closed")
-                            break
-                        except Exception as e:
-                            logger.error(f"Error processing MCX data: {str(e)}")
-                            continue
-                            
-            except Exception as e:
-                logger.error(f"Error connecting to MCX: {str(e)}")
-                await asyncio.sleep(5)  # Wait before retrying
-
-    async def process_mcx_data(self, message):
-        """
-        Process incoming MCX market data
-        Format: [symbol, name, open, low, high, close, ltp, bid, ask, timestamp, extra]
+        Handle subscribe/unsubscribe messages
         """
         try:
-            data = json.loads(message)
-            for item in data:
-                if len(item) < 10:
-                    continue
-                    
-                symbol = item[0]
-                trading_pair = await self.get_or_create_trading_pair(symbol)
-                
-                # Update trading pair data
-                updates = {
-                    'last_price': Decimal(str(item[6])),  # LTP
-                    'bid_price': Decimal(str(item[7])),
-                    'ask_price': Decimal(str(item[8])),
-                    'high_price': Decimal(str(item[4])),
-                    'low_price': Decimal(str(item[3])),
-                    'open_price': Decimal(str(item[2])),
-                    'close_price': Decimal(str(item[5])),
-                    'last_updated': timezone.now()
-                }
-                
-                await self.update_trading_pair(trading_pair.id, updates)
-                
-                # Broadcast the update to connected clients
-                await self.send(text_data=json.dumps({
-                    'type': 'market_data',
-                    'symbol': symbol,
-                    'data': {
-                        'last_price': str(updates['last_price']),
-                        'bid': str(updates['bid_price']),
-                        'ask': str(updates['ask_price']),
-                        'high': str(updates['high_price']),
-                        'low': str(updates['low_price']),
-                        'open': str(updates['open_price']),
-                        'close': str(updates['close_price']),
-                        'timestamp': item[9]
-                    }
-                }))
-                
-        except Exception as e:
-            logger.error(f"Error processing MCX data: {str(e)}")
-
-    @sync_to_async
-    def get_or_create_trading_pair(self, symbol):
-        """
-        Get or create a trading pair from MCX symbol
-        """
-        # Extract base and quote assets from symbol (you may need to adjust this based on your symbol format)
-        base_asset = symbol.replace('FUT', '').strip()
-        quote_asset = 'INR'  # MCX typically quotes in INR
-        
-        trading_pair, created = TradingPair.objects.get_or_create(
-            base_asset=base_asset,
-            quote_asset=quote_asset,
-            defaults={
-                'min_trade_size': Decimal('0.01'),
-                'price_precision': 2,
-                'is_active': True
-            }
-        )
-        
-        return trading_pair
+            action, symbols = parse_subscription_message(text_data)
+        except ValueError as e:
+            self.outbound.put(json.dumps({'type': 'error', 'message': str(e)}))
+            return
+        if action == 'subscribe':
+            self.subscriptions.add(symbols)
+            self.outbound.put(json.dumps({'type': 'subscribed', 'symbols': symbols}))
+        else:
+            removed = self.subscriptions.remove(symbols)
+            self.outbound.put(json.dumps({'type': 'unsubscribed', 'symbols': removed}))
 
-    @sync_to_async
-    def update_trading_pair(self, pair_id, updates):
+    async def mcx_data(self, message):
         """
-        Update trading pair with new market data
+        Forward a tick from the shared upstream, replacing an unsent one for the symbol
         """
-        TradingPair.objects.filter(id=pair_id).update(**updates)
+        if self.subscriptions.matches(message['symbol']):
+            self.outbound.put(message['text'], key=message['symbol'])
@@ -1,18 +1,63 @@
 import json
 import asyncio
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from rest_framework.renderers import JSONRenderer
 from .models import TradingPair
+from .engine import engine_registry
+from .events import (
+    MARKET_DATA_GROUP, book_group, market_data_group, order_events_group, quote_frame
+)
+from .outbound import OutboundBuffer
+from .quotes import quote_store
+from .subscriptions import MARKET_DATA_SUBPROTOCOL, Subscriptions, is_pattern, parse_subscription_message
+
+logger = logging.getLogger(__name__)
 
 class MarketDataConsumer(AsyncWebsocketConsumer):
+    """
+    Ticker stream. Clients speaking the market.data.v1 subprotocol start
+    with no symbols and send
+        {"action": "subscribe" | "unsubscribe", "symbols": [...]}
+    where a symbol is a pair such as "GOLD/INR" or a shell-style pattern
+    such as "*", "GOLD*" or "*/INR". Clients without a subprotocol get
+    every symbol, as before it existed.
+
+    Exact symbols join their pair's group, so a client watching three
+    pairs receives three streams. Patterns join the wildcard group, which
+    also covers pairs listed later, and filter its ticks locally. The
+    current state of newly matched pairs is sent with each subscription;
+    after that the consumer only forwards the ticks the feed pushes.
+
+    Sends go through an OutboundBuffer keyed by symbol, so a client that
+    falls behind receives the latest tick per symbol. If the buffer drops
+    its backlog anyway, the current quote of every subscribed symbol is
+    queued again, so no symbol stays stale until its next tick.
+    """
+
     async def connect(self):
         """Handle WebSocket connection"""
+        self.subscriptions = Subscriptions()
+        self.symbol_groups = {}  # subscribed symbol -> its pair's group
+        self.joined_groups = set()
+        self.outbound = None
+        self.resyncing = False
+        subprotocols = self.scope.get('subprotocols') or []
         try:
             print(f"New WebSocket connection attempt from {self.scope['client']}")
-            await self.accept()
-            self.should_send = True
+            if MARKET_DATA_SUBPROTOCOL in subprotocols:
+                await self.accept(subprotocol=MARKET_DATA_SUBPROTOCOL)
+            elif subprotocols:
+                await self.close()  # None of the offered protocols is spoken here
+                return
+            else:
+                await self.accept()
+            self.outbound = OutboundBuffer(self, on_drop=self.schedule_resync)
+            self.outbound.start()
+            if not subprotocols:
+                await self.subscribe(['*'], acknowledge=False)
             print(f"WebSocket connection accepted for {self.scope['client']}")
-            asyncio.create_task(self.send_market_data())
         except Exception as e:
             print(f"Error during WebSocket connection: {str(e)}")
             raise
@@ -20,66 +65,240 @@ class MarketDataConsumer(AsyncWebsocketConsumer):
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
         print(f"WebSocket disconnected with code {close_code} for {self.scope['client']}")
-        self.should_send = False
-
-    async def send_market_data(self):
-        """Send market data updates periodically"""
-        print(f"Starting market data stream for {self.scope['client']}")
-        while self.should_send:
-            try:
-                pairs = await self.get_trading_pairs()
-                print(f"Retrieved {len(pairs)} trading pairs")
-                
-                for pair in pairs:
-                    if not self.should_send:
-                        print("Stopping market data stream - disconnected")
-                        break
-                        
-                    data = {
-                        'type': 'market_data',
-                        'symbol': pair['symbol'],
-                        'data': {
-                            'last_price': str(pair['last_price']),
-                            'bid': str(pair['bid_price']),
-                            'ask': str(pair['ask_price']),
-                            'high': str(pair['high_price']),
-                            'low': str(pair['low_price']),
-                            'open': str(pair['open_price']),
-                            'close': str(pair['close_price']),
-                            'volume': str(pair['volume_24h']),
-                            'timestamp': pair['last_updated'].isoformat() if pair['last_updated'] else None
-                        }
-                    }
-                    
-                    try:
-                        await self.send(text_data=json.dumps(data))
-                        print(f"Sent market data for {pair['symbol']}")
-                    except Exception as send_error:
-                        print(f"Error sending market data: {str(send_error)}")
-                        self.should_send = False
-                        break
-                        
-                    await asyncio.sleep(0.1)  # Small delay between each symbol
-                    
-                if self.should_send:
-                    await asyncio.sleep(1)  # Wait before next update cycle
-                
-            except Exception as e:
-                print(f"Error in market data consumer: {str(e)}")
-                print(f"Connection state: {self.should_send}")
-                print(f"Client: {self.scope['client']}")
-                await asyncio.sleep(5)  # Wait longer on error
+        for group in self.joined_groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.joined_groups = set()
+        if self.outbound is not None:
+            self.outbound.stop()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """Handle subscribe/unsubscribe messages"""
+        try:
+            action, symbols = parse_subscription_message(text_data)
+        except ValueError as e:
+            self.outbound.put(json.dumps({'type': 'error', 'message': str(e)}))
+            return
+        if action == 'subscribe':
+            await self.subscribe(symbols)
+        else:
+            await self.unsubscribe(symbols)
+
+    async def subscribe(self, symbols, acknowledge: bool = True):
+        pairs = await self.get_pairs()
+        unknown = [symbol for symbol in symbols if not is_pattern(symbol) and symbol not in pairs]
+        symbols = [symbol for symbol in symbols if symbol not in unknown]
+        
+        before = {symbol for symbol in pairs if self.subscriptions.matches(symbol)}
+        added = self.subscriptions.add(symbols)
+        for symbol in added:
+            if symbol in pairs:
+                self.symbol_groups[symbol] = market_data_group(pairs[symbol]['id'])
+        await self.update_groups()
+        
+        if acknowledge:
+            self.outbound.put(json.dumps({
+                'type': 'subscribed',
+                'symbols': symbols,
+                'unknown': unknown,
+            }))
+        for symbol, quote in pairs.items():
+            if symbol not in before and self.subscriptions.matches(symbol):
+                self.outbound.put(quote_frame(quote), key=symbol)
+
+    async def unsubscribe(self, symbols):
+        removed = self.subscriptions.remove(symbols)
+        for symbol in removed:
+            self.symbol_groups.pop(symbol, None)
+        await self.update_groups()
+        self.outbound.put(json.dumps({'type': 'unsubscribed', 'symbols': removed}))
+
+    async def update_groups(self):
+        """Join and leave groups so every subscribed tick arrives exactly once"""
+        if self.subscriptions.has_patterns:
+            wanted = {MARKET_DATA_GROUP}
+        else:
+            wanted = set(self.symbol_groups.values())
+        for group in wanted - self.joined_groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+        for group in self.joined_groups - wanted:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.joined_groups = wanted
+
+    async def market_data(self, message):
+        """Forward a tick published by the feed"""
+        # Wildcard group ticks, or ticks queued before an unsubscribe
+        if self.subscriptions.matches(message['symbol']):
+            self.outbound.put(message['text'], key=message['symbol'])
+
+    def schedule_resync(self):
+        """Outbound ticks were dropped: the client needs the current quotes"""
+        if not self.resyncing:
+            self.resyncing = True
+            asyncio.create_task(self.resync())
+
+    async def resync(self):
+        """Queue the quote of every subscribed symbol a newer tick is not already waiting for"""
+        try:
+            pairs = await self.get_pairs()
+        finally:
+            self.resyncing = False
+        for symbol, quote in pairs.items():
+            if self.subscriptions.matches(symbol) and symbol not in self.outbound.frames:
+                self.outbound.put(quote_frame(quote), key=symbol)
+
+    @database_sync_to_async
+    def get_pairs(self):
+        """Latest quotes of the active trading pairs by symbol, from the quote store"""
+        return {quote['symbol']: quote for quote in quote_store.active()}
+
+
+class SequencedBookConsumer(AsyncWebsocketConsumer):
+    """
+    Base of the per-pair book streams: a snapshot, then the engine's
+    sequenced frames for each flush. Subclasses name the pair's group and
+    build the snapshot frame.
+
+    Frames come pre-serialized from the engine, so a message costs one
+    queued send per connection. Frames already covered by the snapshot are
+    skipped; a gap (the channel layer drops messages for a lagging
+    consumer), an engine reset or frames dropped by the outbound buffer
+    make the consumer send a fresh snapshot instead.
+    """
+    stream = None  # Name used in logs
+
+    def get_group_name(self) -> str:
+        raise NotImplementedError
+
+    def snapshot(self, engine):
+        """(sequence, client frame) of the engine's book; called with its lock held"""
+        raise NotImplementedError
+
+    async def connect(self):
+        """Join the pair's group before taking the snapshot so no frame falls between"""
+        self.trading_pair_id = int(self.scope['url_route']['kwargs']['trading_pair_id'])
+        self.group_name = self.get_group_name()
+        self.last_seq = None
+        self.held = None  # Messages arriving while a resync fetches its snapshot
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        self.outbound = OutboundBuffer(self, on_drop=self.schedule_resync)
+        self.outbound.start()
+        if not await self.send_snapshot():
+            await self.close(code=4004)
+
+    async def disconnect(self, close_code):
+        """Leave the pair's group"""
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if getattr(self, 'outbound', None) is not None:
+            self.outbound.stop()
+
+    async def send_snapshot(self) -> bool:
+        snapshot = await self.get_snapshot()
+        if snapshot is None:
+            return False
+        self.last_seq, text = snapshot
+        self.outbound.put(text)
+        return True
 
     @database_sync_to_async
-    def get_trading_pairs(self):
-        """Get all active trading pairs with their latest data"""
-        pairs = TradingPair.objects.filter(is_active=True).values(
-            'base_asset', 'quote_asset', 'last_price', 'bid_price',
-            'ask_price', 'high_price', 'low_price', 'open_price',
-            'close_price', 'volume_24h', 'last_updated'
+    def get_snapshot(self):
+        """The pair's snapshot, loading its engine if needed; None for unknown pairs"""
+        try:
+            trading_pair = TradingPair.objects.get(id=self.trading_pair_id, is_active=True)
+        except TradingPair.DoesNotExist:
+            return None
+        engine = engine_registry.get_engine(trading_pair)
+        with engine.lock:
+            return self.snapshot(engine)
+
+    def schedule_resync(self):
+        """Outbound frames were dropped: the client needs a new snapshot"""
+        if self.held is None:
+            asyncio.create_task(self.resync())
+
+    async def resync(self):
+        """Send a fresh snapshot, then the frames that arrived while it was taken"""
+        self.held = []
+        try:
+            found = await self.send_snapshot()
+        finally:
+            held, self.held = self.held, None
+        if not found:
+            await self.close(code=4004)
+            return
+        for message in held:
+            await self.forward(message)
+
+    async def receive_sequenced(self, message):
+        if self.held is not None:
+            self.held.append(message)
+            return
+        await self.forward(message)
+
+    async def forward(self, message):
+        """Queue a frame for the client, resyncing on a gap or a reset"""
+        first_seq, last_seq = message['first_seq'], message['last_seq']
+        if first_seq is None:
+            # Unsequenced (swept from the database); cancels are safe to replay
+            self.outbound.put(message['text'])
+            return
+        if self.last_seq is None or last_seq <= self.last_seq:
+            return  # Before the snapshot, or already reflected in it
+        if first_seq != self.last_seq + 1 or message['reset']:
+            logger.info(
+                f"{self.stream} resync for pair {self.trading_pair_id} on {self.channel_name} "
+                f"(expected seq {self.last_seq + 1}, got {first_seq})"
+            )
+            await self.resync()
+            return
+        self.last_seq = last_seq
+        self.outbound.put(message['text'])
+
+
+class OrderBookL3Consumer(SequencedBookConsumer):
+    """
+    Order-by-order (L3) stream for one trading pair. The client receives an
+    'l3_snapshot' of every resting order, then 'l3' frames holding the
+    engine's add/fill/cancel events for each flush, numbered by seq.
+    """
+    stream = 'L3'
+
+    def get_group_name(self) -> str:
+        return order_events_group(self.trading_pair_id)
+
+    def snapshot(self, engine):
+        snapshot = engine.get_l3_snapshot()
+        return snapshot['sequence'], json.dumps({
+            'type': 'l3_snapshot',
+            'trading_pair_id': self.trading_pair_id,
+            **snapshot
+        })
+
+    async def order_events(self, message):
+        """Forward a batch of engine events"""
+        await self.receive_sequenced(message)
+
+
+class OrderBookL2Consumer(SequencedBookConsumer):
+    """
+    Price-level (L2) stream for one trading pair. The client receives a
+    'book_snapshot' of the whole book (the order_book endpoint's cached
+    rendering), then 'l2' frames with each flush's level deltas: 'update'
+    carries a level's new total quantity and order count, 'remove' a level
+    that emptied. Every delta has its own seq.
+    """
+    stream = 'L2'
+
+    def get_group_name(self) -> str:
+        return book_group(self.trading_pair_id)
+
+    def snapshot(self, engine):
+        content = engine.cached_snapshot(JSONRenderer().render)
+        return engine.sequence, (
+            f'{{"type": "book_snapshot", "trading_pair_id": {self.trading_pair_id}, "book": '
+            + content.decode() + '}'
         )
-        
-        return [{
-            'symbol': f"{pair['base_asset']}/{pair['quote_asset']}",
-            **pair
-        } for pair in pairs]
+
+    async def book_deltas(self, message):
+        """Forward a flush's level deltas"""
+        await self.receive_sequenced(message)
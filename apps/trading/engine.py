@@ -1,69 +1,351 @@
+import asyncio
+import heapq
 import logging
-from decimal import Decimal
-from typing import List, Optional, Tuple
-from django.db import transaction
+import threading
+import time
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
 from django.utils import timezone
-from django.db.models import F
 from .models import Order, Trade, OrderBook, OrderStatus, OrderSide, OrderType, TradingPair
+from .orderbook import BookSide, OrderNode, StopIndex
+from .fixedpoint import DecimalArithmetic, FixedPointArithmetic, decimal_places
+from .journal import EngineJournal
+from .candles import candle_aggregator
+from .events import order_event, publish_book_deltas, publish_order_events
+from .symbols import MARKET_DATA_FIELDS
+
+if TYPE_CHECKING:
+    from .sequencer import PairSequencer
 
 logger = logging.getLogger(__name__)
 
+ENGINE_SETTINGS = getattr(settings, 'MATCHING_ENGINE', {})
+
+# 0.1% maker, 0.2% taker
+MAKER_FEE_RATE = Decimal('0.001')
+TAKER_FEE_RATE = Decimal('0.002')
+
+STOP_ORDER_TYPES = [OrderType.STOP_LOSS, OrderType.STOP_LIMIT]
+
+# Rendered snapshots kept per engine (one per depth/band combination)
+SNAPSHOT_CACHE_SIZE = 32
+
+# Channel layer channel on which market data processes publish last prices
+# for the engines' stop triggers
+MARKET_PRICE_CHANNEL = 'matching-engine.prices'
+
+# Order columns the engine changes; flushed together with bulk_update
+ORDER_UPDATE_FIELDS = [
+    'status', 'filled_quantity', 'remaining_quantity', 'total_filled_amount',
+    'fees', 'average_fill_price', 'updated_at'
+]
+
+class StatementCounter:
+    """connection.execute_wrapper hook counting the SQL statements executed"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
 class MatchingEngine:
-    def __init__(self, trading_pair: TradingPair):
+    def __init__(self, trading_pair: TradingPair, fixed_point: Optional[bool] = None,
+                 journal: Optional[bool] = None, candles: bool = True):
         self.trading_pair = trading_pair
+        self.lock = threading.RLock()  # Serializes access to the in-memory book
+        if fixed_point is None:
+            fixed_point = ENGINE_SETTINGS.get('FIXED_POINT', True)
+        self.fixed_point = fixed_point
+        self.arith = self.make_arithmetic()
+        self.tick_scale = 10 ** trading_pair.price_precision
         self.order_book = {
-            'BUY': {},  # price -> [orders]
-            'SELL': {}  # price -> [orders]
+            'BUY': BookSide(is_bid=True),
+            'SELL': BookSide(is_bid=False)
         }
-        self.load_order_book()
+        self.order_index: Dict[int, OrderNode] = {}  # order id -> queue node
+        self.stop_orders = StopIndex()  # Pending stops by stop price
+        self.expiries: List[Tuple[float, int]] = []  # (expires_at timestamp, order id) min-heap
+        if journal is None:
+            journal = ENGINE_SETTINGS.get('JOURNAL_ENABLED', False)
+        self.journal = EngineJournal.for_pair(trading_pair.id) if journal else None
+        self.candles = candle_aggregator if candles else None  # Fed with the flushed trades
+        
+        # Writes accumulated while processing an order, persisted by flush()
+        self.pending_trades: List[Trade] = []
+        self.dirty_orders: Dict[int, Order] = {}
+        self.pending_last_price = None
+        self.pending_events: List[dict] = []
+        
+        # L2 book sequence: bumped for every published level delta
+        self.sequence = 0
+        self.changed_levels: Dict[Tuple[str, int], None] = {}  # (side, ticks) touched since the last flush
+        self.snapshot_cache: Dict[tuple, Tuple[int, bytes]] = {}  # (depth, band) -> (sequence, rendered)
+        # L3 sequence: bumped for every published order event
+        self.event_sequence = 0
+        
+        self.orders_processed = 0
+        self.db_statements = 0
+        self.last_db_statements = 0
+        self.warmup_seconds = 0.0
+        self.loaded_at = None
+        if self.journal and self.journal.has_state():
+            self.restore_from_journal()
+        else:
+            self.load_order_book()
+
+    def live_orders(self):
+        """The pair's stored open orders and pending stops"""
+        return Order.objects.filter(
+            Q(status__in=[OrderStatus.OPEN, OrderStatus.PARTIALLY_FILLED]) |
+            Q(status=OrderStatus.PENDING, order_type__in=STOP_ORDER_TYPES),
+            trading_pair=self.trading_pair
+        )
 
     def load_order_book(self):
-        """Load existing open orders into memory"""
-        open_orders = Order.objects.filter(
-            trading_pair=self.trading_pair,
-            status__in=[OrderStatus.OPEN, OrderStatus.PARTIALLY_FILLED]
-        ).order_by('created_at')
+        """Load existing open orders and pending stops into memory"""
+        started = time.perf_counter()
+        open_orders = self.live_orders().order_by('created_at')
+        
+        self.build_book(list(open_orders))
+        if self.journal:
+            # The database is the new starting point for the journal
+            self.journal.write_snapshot(self.book_orders())
+
+        self.warmup_seconds = time.perf_counter() - started
+        self.loaded_at = timezone.now()
+        logger.info(
+            f"Loaded order book for {self.trading_pair}: "
+            f"{self.book_size()} orders in {self.warmup_seconds * 1000:.1f}ms"
+        )
+
+    def restore_from_journal(self):
+        """
+        Rebuild the book from the latest snapshot and the journal tail.
+        Records reach the journal after their transaction commits, so a
+        crash in between leaves it behind the database; the recovered
+        orders are checked against the stored ones and the book is loaded
+        from the database instead if they differ.
+        """
+        started = time.perf_counter()
+        states = self.journal.recover()
+        if not self.journal_matches_database(states):
+            logger.warning(
+                f"Journal of {self.trading_pair} does not match the database, "
+                f"loading the order book from the database"
+            )
+            self.load_order_book()
+            return
+        self.build_book([
+            Order(trading_pair=self.trading_pair, **state) for state in states.values()
+        ])
+
+        self.warmup_seconds = time.perf_counter() - started
+        self.loaded_at = timezone.now()
+        logger.info(
+            f"Restored order book for {self.trading_pair} from its journal: "
+            f"{self.book_size()} orders in {self.warmup_seconds * 1000:.1f}ms"
+        )
+
+    def journal_matches_database(self, states: Dict[int, dict]) -> bool:
+        """Whether recovered orders have the status and open quantity of the stored live orders"""
+        stored = {
+            order_id: (status, remaining)
+            for order_id, status, remaining in self.live_orders().values_list(
+                'id', 'status', 'remaining_quantity'
+            )
+        }
+        return stored == {
+            order_id: (state['status'], state['remaining_quantity'])
+            for order_id, state in states.items()
+        }
+
+    def build_book(self, open_orders: List[Order]):
+        """
+        Add resting orders and arm pending stops, oldest first, picking the
+        arithmetic they fit
+        """
+        precision = self.trading_pair.price_precision
+        price_digits = max([precision] + [
+            decimal_places(price)
+            for order in open_orders
+            for price in (order.price, order.stop_price)
+            if price is not None
+        ])
+        if price_digits > precision or self.arith.fixed_point and not all(
+            self.arith.is_representable(None, order.remaining_quantity)
+            for order in open_orders
+        ):
+            # Orders accepted before lot-size validation, or before the
+            # pair's precision was reduced, may not fit its ticks and lots.
+            # Keep such books on the Decimal path, with ticks fine enough
+            # for every price so no order rests or triggers off its own.
+            logger.warning(
+                f"Order book for {self.trading_pair} has orders finer than its "
+                f"ticks/lots, using Decimal arithmetic at {price_digits} price digits"
+            )
+            self.arith = DecimalArithmetic(price_digits)
+            self.tick_scale = 10 ** price_digits
         
         for order in open_orders:
-            self.add_to_order_book(order)
+            if order.status == OrderStatus.PENDING:
+                self.stop_orders.add(order, self.price_to_ticks(order.stop_price))
+                self.schedule_expiry(order)
+            else:
+                self.add_to_order_book(order)
+        # A loaded book is the baseline at the current sequence, not a delta
+        self.changed_levels = {}
+
+    def book_orders(self) -> List[Order]:
+        """Resting orders in time priority, followed by the pending stops"""
+        return [node.order for node in self.order_index.values()] + list(self.stop_orders)
+
+    def reload(self):
+        """Drop the in-memory book and rebuild it from the database"""
+        with self.lock:
+            if self.pending_trades or self.dirty_orders:
+                # Keep writes already made in this transaction
+                self.flush()
+            self.arith = self.make_arithmetic()
+            self.tick_scale = 10 ** self.trading_pair.price_precision
+            for side in self.order_book.values():
+                side.clear()
+            self.order_index.clear()
+            self.stop_orders.clear()
+            self.expiries.clear()
+            self.changed_levels = {}
+            self.load_order_book()
+            # Deltas cannot describe a rebuilt book; clients resync from a snapshot
+            self.sequence += 1
+            publish_book_deltas(self.trading_pair.id, [{'seq': self.sequence, 'action': 'reset'}])
+            self.event_sequence += 1
+            publish_order_events(self.trading_pair.id, [{'seq': self.event_sequence, 'event': 'reset'}])
+
+    def refresh_pair(self):
+        """
+        Re-read the pair's settings (precision, trade size, activity) after
+        an edit and rebuild the book with them. Market data columns are left
+        alone: the engine's last price is at least as recent as the stored one.
+        """
+        with self.lock:
+            self.trading_pair.refresh_from_db(fields=[
+                field.attname for field in TradingPair._meta.concrete_fields
+                if not field.primary_key and field.name not in MARKET_DATA_FIELDS
+            ])
+            self.reload()
+
+    def make_arithmetic(self):
+        """Arithmetic used on the hot path: scaled integers or Decimals"""
+        if self.fixed_point:
+            return FixedPointArithmetic(
+                self.trading_pair.price_precision,
+                self.trading_pair.min_trade_size
+            )
+        return DecimalArithmetic(self.trading_pair.price_precision)
+
+    def book_size(self) -> int:
+        """Number of resting orders held in memory"""
+        return sum(side.order_count for side in self.order_book.values())
+
+    def get_metrics(self) -> dict:
+        """Book size and warm-up statistics for monitoring"""
+        return {
+            'trading_pair': str(self.trading_pair),
+            'orders': self.book_size(),
+            'bid_levels': len(self.order_book['BUY']),
+            'ask_levels': len(self.order_book['SELL']),
+            'pending_stops': len(self.stop_orders),
+            'sequence': self.sequence,
+            'fixed_point': self.arith.fixed_point,
+            'orders_processed': self.orders_processed,
+            'db_statements_per_order': (
+                self.db_statements / self.orders_processed if self.orders_processed else 0
+            ),
+            'last_db_statements': self.last_db_statements,
+            'warmup_seconds': self.warmup_seconds,
+            'loaded_at': self.loaded_at.isoformat() if self.loaded_at else None,
+        }
+
+    def price_to_ticks(self, price: Decimal) -> int:
+        """Convert a price to integer ticks of the pair's price precision"""
+        # Orders built from a request and orders loaded from the database can
+        # differ in trailing zeros; both must land on the same level.
+        return int((price * self.tick_scale).to_integral_value())
+
+    def ticks_to_price(self, ticks: int) -> Decimal:
+        return self.arith.ticks_to_price(ticks)
 
     def add_to_order_book(self, order: Order):
         """Add an order to the in-memory order book"""
         if order.order_type == OrderType.MARKET:
             return  # Market orders are not added to the book
-            
-        price = str(order.price)  # Use string to avoid floating point issues
-        if price not in self.order_book[order.side]:
-            self.order_book[order.side][price] = []
-        self.order_book[order.side][price].append(order)
+
+        if order.id in self.order_index:
+            return  # Already resting
+
+        ticks = self.price_to_ticks(order.price)
+        self.order_index[order.id] = self.order_book[order.side].add(
+            order, ticks, self.ticks_to_price(ticks),
+            self.arith.qty_to_units(order.remaining_quantity)
+        )
+        self.changed_levels[(order.side, ticks)] = None
+        self.schedule_expiry(order)
 
     def remove_from_order_book(self, order: Order):
         """Remove an order from the in-memory order book"""
-        price = str(order.price)
-        if price in self.order_book[order.side]:
-            self.order_book[order.side][price] = [
-                o for o in self.order_book[order.side][price] if o.id != order.id
-            ]
-            if not self.order_book[order.side][price]:
-                del self.order_book[order.side][price]
+        node = self.order_index.pop(order.id, None)
+        if node is not None:
+            self.changed_levels[(order.side, node.level.ticks)] = None
+            node.side.remove(node)
 
-    @transaction.atomic
     def process_order(self, order: Order) -> List[Trade]:
         """Process a new order and generate trades"""
+        return self.execute(self.handle_order, order)
+
+    def execute(self, handler, *args):
+        """Run a handler and persist its writes with a single flush, counting statements"""
+        counter = StatementCounter()
+        with connection.execute_wrapper(counter):
+            try:
+                with transaction.atomic():
+                    result = handler(*args)
+                    self.flush()
+            except Exception:
+                self.discard_pending()
+                raise
+        
+        self.record_statements(counter.count, 1)
+        return result
+
+    def record_statements(self, count: int, orders: int):
+        """Account for the SQL statements spent on a number of orders"""
+        self.orders_processed += orders
+        self.db_statements += count
+        self.last_db_statements = count / orders if orders else count
+
+    def handle_order(self, order: Order) -> List[Trade]:
+        """Run an order through validation and matching, recording writes for flush()"""
         trades = []
         
         # Validate order
         if not self.validate_order(order):
             order.status = OrderStatus.REJECTED
-            order.save()
+            self.mark_dirty(order)
             return trades
 
         # Check if order has expired
         if order.expires_at and order.expires_at <= timezone.now():
             order.status = OrderStatus.EXPIRED
-            order.save()
+            self.mark_dirty(order)
             return trades
 
+        if self.journal:
+            self.journal.place(order)
+
         # Process market orders immediately
         if order.order_type == OrderType.MARKET:
             trades = self.match_market_order(order)
@@ -74,24 +356,152 @@ class MatchingEngine:
             
             # If order is not fully filled, add to order book
             if order.remaining_quantity > 0:
-                order.status = OrderStatus.OPEN if order.filled_quantity == 0 else OrderStatus.PARTIALLY_FILLED
-                order.save()
-                self.add_to_order_book(order)
+                self.rest_order(order)
         
         # Process stop orders
-        elif order.order_type in [OrderType.STOP_LOSS, OrderType.STOP_LIMIT]:
+        elif order.order_type in STOP_ORDER_TYPES:
+            # A reload may already have armed an order still in the queue
+            self.stop_orders.remove(order.id)
             if self.check_stop_price_triggered(order):
-                trades = self.match_limit_order(order)
-                if order.remaining_quantity > 0:
-                    order.status = OrderStatus.OPEN if order.filled_quantity == 0 else OrderStatus.PARTIALLY_FILLED
-                    order.save()
-                    self.add_to_order_book(order)
+                trades = self.execute_stop(order)
             else:
-                order.status = OrderStatus.PENDING
-                order.save()
+                self.arm_stop(order)
 
+        if trades:
+            # The new last price may cross pending stops
+            self.trigger_stops()
+
+        return trades
+
+    def rest_order(self, order: Order):
+        """Put the unfilled remainder of a limit order in the book"""
+        order.status = OrderStatus.OPEN if order.filled_quantity == 0 else OrderStatus.PARTIALLY_FILLED
+        self.mark_dirty(order)
+        self.add_to_order_book(order)
+        node = self.order_index[order.id]
+        self.pending_events.append(order_event(
+            'add', order, node.level.price, self.arith.units_to_qty(node.remaining)
+        ))
+        if self.journal:
+            self.journal.rest(order.id)
+
+    def arm_stop(self, order: Order):
+        """Hold a stop order until the last price reaches its stop price"""
+        order.status = OrderStatus.PENDING
+        self.mark_dirty(order)
+        self.stop_orders.add(order, self.price_to_ticks(order.stop_price))
+        self.schedule_expiry(order)
+        if self.journal:
+            self.journal.stop(order.id)
+
+    def execute_stop(self, order: Order) -> List[Trade]:
+        """
+        Run a triggered stop: a stop-limit, or a stop-loss with a price,
+        matches up to its limit and rests the remainder; a stop-loss without
+        a price becomes a market order.
+        """
+        if order.price is None:
+            return self.match_market_order(order)
+        trades = self.match_limit_order(order)
+        if order.remaining_quantity > 0:
+            self.rest_order(order)
         return trades
 
+    def stops_crossed(self, last_price: Decimal) -> bool:
+        """Whether a last price would trigger any pending stop"""
+        return self.stop_orders.crossed(*self.stop_trigger_ticks(last_price))
+
+    def stop_trigger_ticks(self, last_price: Decimal) -> Tuple[int, int]:
+        """
+        Ticks to compare buy and sell stops against. Feed prices need not be
+        on the pair's tick grid; rounding down for buys and up for sells
+        keeps the comparison with on-grid stop prices exact.
+        """
+        scaled = last_price * self.tick_scale
+        return (
+            int(scaled.to_integral_value(ROUND_FLOOR)),
+            int(scaled.to_integral_value(ROUND_CEILING))
+        )
+
+    def trigger_stops(self, last_price: Optional[Decimal] = None) -> List[Trade]:
+        """
+        Activate every pending stop crossed by the last price, then the
+        stops crossed by the trades of those, until the price settles.
+        Market data ticks pass their price; after local trades the pair's
+        last trade price is used.
+        """
+        if last_price is not None:
+            self.trading_pair.last_price = last_price
+        
+        trades = []
+        while self.stop_orders and self.trading_pair.last_price:
+            triggered = self.stop_orders.pop_triggered(
+                *self.stop_trigger_ticks(self.trading_pair.last_price)
+            )
+            if not triggered:
+                break
+            
+            for order in triggered:
+                if self.journal:
+                    self.journal.trigger(order.id)
+                trades += self.execute_stop(order)
+        
+        if trades:
+            logger.info(f"Stops on {self.trading_pair} generated {len(trades)} trades")
+        return trades
+
+    def schedule_expiry(self, order: Order):
+        """Track a resting order or pending stop that has an expiry time"""
+        if order.expires_at:
+            heapq.heappush(self.expiries, (order.expires_at.timestamp(), order.id))
+
+    def held_order(self, order_id: int) -> Optional[Order]:
+        """The resting order or pending stop with this id, if any"""
+        node = self.order_index.get(order_id)
+        if node is not None:
+            return node.order
+        return self.stop_orders.get(order_id)
+
+    def seconds_until_expiry(self) -> Optional[float]:
+        """
+        Time until the next held order expires, None if none will. Entries
+        of orders that already left the book are dropped on the way.
+        """
+        expiries = self.expiries
+        while expiries:
+            deadline, order_id = expiries[0]
+            order = self.held_order(order_id)
+            if order is not None and order.expires_at and order.expires_at.timestamp() == deadline:
+                return max(0.0, deadline - time.time())
+            heapq.heappop(expiries)
+        return None
+
+    def expire_orders(self) -> List[int]:
+        """
+        Expire every held order whose expires_at has passed, in deadline
+        order, recording the writes for flush(). Returns the expired ids.
+        """
+        expired = []
+        now = time.time()
+        expiries = self.expiries
+        while expiries and expiries[0][0] <= now:
+            deadline, order_id = heapq.heappop(expiries)
+            order = self.held_order(order_id)
+            if order is None or not order.expires_at or order.expires_at.timestamp() != deadline:
+                continue  # Filled, cancelled or rescheduled since
+            
+            order.status = OrderStatus.EXPIRED
+            self.mark_dirty(order)
+            self.cancel_resting(order, 'expired')
+            self.stop_orders.remove(order_id)
+            if self.journal:
+                self.journal.expire(order_id)
+            expired.append(order_id)
+        
+        if expired:
+            logger.info(f"Expired {len(expired)} orders on {self.trading_pair}")
+        return expired
+
     def validate_order(self, order: Order) -> bool:
         """Validate order parameters"""
         try:
@@ -101,9 +511,17 @@ class MatchingEngine:
                 return False
 
             # Check price precision
-            if order.price and len(str(order.price).split('.')[-1]) > self.trading_pair.price_precision:
+            if order.price and decimal_places(order.price) > self.trading_pair.price_precision:
                 logger.warning(f"Order {order.id} rejected: Invalid price precision")
                 return False
+            if order.stop_price and decimal_places(order.stop_price) > self.trading_pair.price_precision:
+                logger.warning(f"Order {order.id} rejected: Invalid stop price precision")
+                return False
+
+            # Check quantity precision against the lot size
+            if decimal_places(order.quantity) > decimal_places(self.trading_pair.min_trade_size):
+                logger.warning(f"Order {order.id} rejected: Invalid quantity precision")
+                return False
 
             # Additional validations can be added here
             return True
@@ -114,32 +532,7 @@ class MatchingEngine:
 
     def match_market_order(self, order: Order) -> List[Trade]:
         """Match a market order against the order book"""
-        trades = []
-        opposite_side = 'SELL' if order.side == 'BUY' else 'BUY'
-        
-        # Sort prices (ascending for buy, descending for sell)
-        prices = sorted(
-            self.order_book[opposite_side].keys(),
-            key=lambda x: Decimal(x),
-            reverse=(order.side == 'BUY')
-        )
-        
-        for price_str in prices:
-            if order.remaining_quantity <= 0:
-                break
-                
-            price = Decimal(price_str)
-            for maker_order in self.order_book[opposite_side][price_str][:]:
-                if order.remaining_quantity <= 0:
-                    break
-                    
-                trade = self.create_trade(maker_order, order, price)
-                if trade:
-                    trades.append(trade)
-                    
-                    # Update order book
-                    if maker_order.status in [OrderStatus.FILLED, OrderStatus.CANCELLED]:
-                        self.remove_from_order_book(maker_order)
+        trades = self.match_against_book(order)
         
         # Update order status
         if order.remaining_quantity == 0:
@@ -148,105 +541,258 @@ class MatchingEngine:
             order.status = OrderStatus.PARTIALLY_FILLED
         else:
             order.status = OrderStatus.REJECTED
-        order.save()
+        self.mark_dirty(order)
         
         return trades
 
     def match_limit_order(self, order: Order) -> List[Trade]:
         """Match a limit order against the order book"""
-        trades = []
-        opposite_side = 'SELL' if order.side == 'BUY' else 'BUY'
+        return self.match_against_book(order, limit_ticks=self.price_to_ticks(order.price))
+
+    def match_against_book(self, order: Order, limit_ticks: Optional[int] = None) -> List[Trade]:
+        """
+        Walk the opposite side from its best level (lowest ask for a buy,
+        highest bid for a sell) until the order is filled or, for limit
+        orders, the next level no longer crosses the limit price.
         
-        # Sort prices (ascending for buy, descending for sell)
-        prices = sorted(
-            self.order_book[opposite_side].keys(),
-            key=lambda x: Decimal(x),
-            reverse=(order.side == 'BUY')
-        )
+        Matching runs entirely on engine units (integer lots in fixed-point
+        mode) held on the book nodes; the resulting fills are converted and
+        persisted afterwards by settle_fills.
+        """
+        fills = []
+        is_buy = order.side == 'BUY'
+        book_side = 'SELL' if is_buy else 'BUY'
+        book = self.order_book[book_side]
+        remaining = self.arith.qty_to_units(order.remaining_quantity)
         
-        for price_str in prices:
-            if order.remaining_quantity <= 0:
+        while remaining > 0:
+            level = book.best()
+            if level is None:
                 break
                 
-            price = Decimal(price_str)
             # Check if price is acceptable
-            if ((order.side == 'BUY' and price > order.price) or 
-                (order.side == 'SELL' and price < order.price)):
+            if limit_ticks is not None and (
+                (is_buy and level.ticks > limit_ticks) or
+                (not is_buy and level.ticks < limit_ticks)
+            ):
                 break
                 
-            for maker_order in self.order_book[opposite_side][price_str][:]:
-                if order.remaining_quantity <= 0:
-                    break
-                    
-                trade = self.create_trade(maker_order, order, price)
-                if trade:
-                    trades.append(trade)
-                    
-                    # Update order book
-                    if maker_order.status in [OrderStatus.FILLED, OrderStatus.CANCELLED]:
-                        self.remove_from_order_book(maker_order)
+            self.changed_levels[(book_side, level.ticks)] = None
+            node = level.head
+            while node is not None and remaining > 0:
+                next_node = node.next
+                quantity = node.remaining if node.remaining < remaining else remaining
+                level.fill(node, quantity)
+                remaining -= quantity
+                fills.append((node.order, quantity, level.ticks))
+                self.pending_events.append(order_event(
+                    'fill', node.order, level.price, self.arith.units_to_qty(quantity),
+                    remaining=str(self.arith.units_to_qty(node.remaining)),
+                    taker_order_id=order.id
+                ))
+                
+                # Update order book
+                if not node.remaining:
+                    self.remove_from_order_book(node.order)
+                node = next_node
         
-        return trades
+        return self.settle_fills(order, fills)
 
-    @transaction.atomic
-    def create_trade(self, maker_order: Order, taker_order: Order, price: Decimal) -> Optional[Trade]:
-        """Create a trade between two orders"""
-        try:
-            # Calculate trade quantity
-            quantity = min(maker_order.remaining_quantity, taker_order.remaining_quantity)
-            
-            # Calculate fees
-            maker_fee = self.calculate_fee(quantity, price, is_maker=True)
-            taker_fee = self.calculate_fee(quantity, price, is_maker=False)
+    def settle_fills(self, taker_order: Order, fills: List[Tuple[Order, object, int]]) -> List[Trade]:
+        """Convert matched fills to Decimals, record trades and update both sides"""
+        trades = []
+        totals = {}  # order id -> [order, filled units, notional, fee units]
+        arith = self.arith
+        price = None
+        
+        for maker_order, quantity, ticks in fills:
+            price = arith.ticks_to_price(ticks)
+            maker_fee = self.calculate_fee(quantity, ticks, is_maker=True)
+            taker_fee = self.calculate_fee(quantity, ticks, is_maker=False)
+            notional = arith.notional(quantity, ticks)
             
-            # Create trade
-            trade = Trade.objects.create(
-                maker_order=maker_order,
-                taker_order=taker_order,
-                trading_pair=self.trading_pair,
-                price=price,
-                quantity=quantity,
-                maker_fee=maker_fee,
-                taker_fee=taker_fee
+            trade = self.create_trade(
+                maker_order, taker_order, price, arith.units_to_qty(quantity),
+                arith.fee_to_decimal(maker_fee), arith.fee_to_decimal(taker_fee)
             )
+            trades.append(trade)
+            if self.journal:
+                self.journal.fill(
+                    maker_order.id, taker_order.id, trade.price, trade.quantity,
+                    trade.maker_fee, trade.taker_fee
+                )
             
-            # Update orders
-            for order in [maker_order, taker_order]:
-                order.filled_quantity = F('filled_quantity') + quantity
-                order.remaining_quantity = F('remaining_quantity') - quantity
-                order.total_filled_amount = F('total_filled_amount') + (quantity * price)
-                order.fees = F('fees') + (maker_fee if order == maker_order else taker_fee)
-                
-                # Update average fill price
-                total_quantity = order.filled_quantity + quantity
-                if total_quantity > 0:
-                    order.average_fill_price = (
-                        (order.average_fill_price or 0) * order.filled_quantity + price * quantity
-                    ) / total_quantity
-                
-                # Update status
-                if order.remaining_quantity == 0:
-                    order.status = OrderStatus.FILLED
-                else:
-                    order.status = OrderStatus.PARTIALLY_FILLED
-                
-                order.save()
-            
-            # Update last price
-            self.trading_pair.last_price = price
-            self.trading_pair.save()
+            for order, fee in ((maker_order, maker_fee), (taker_order, taker_fee)):
+                total = totals.get(order.id)
+                if total is None:
+                    total = totals[order.id] = [order, 0, 0, 0]
+                total[1] += quantity
+                total[2] += notional
+                total[3] += fee
+        
+        # Update orders once each. The engine keeps these instances in memory
+        # across requests, so values are computed here rather than with F()
+        # expressions that would leave unresolved values on the instances.
+        for order, filled, notional, fees in totals.values():
+            filled = arith.units_to_qty(filled)
+            order.filled_quantity = order.filled_quantity + filled
+            order.remaining_quantity = order.remaining_quantity - filled
+            order.total_filled_amount = order.total_filled_amount + arith.notional_to_decimal(notional)
+            order.fees = order.fees + arith.fee_to_decimal(fees)
+            order.average_fill_price = order.total_filled_amount / order.filled_quantity
             
-            return trade
+            # Update status
+            if order.remaining_quantity == 0:
+                order.status = OrderStatus.FILLED
+            else:
+                order.status = OrderStatus.PARTIALLY_FILLED
             
-        except Exception as e:
-            logger.error(f"Error creating trade: {str(e)}")
-            return None
+            self.mark_dirty(order)
+            if self.journal:
+                self.journal.update(order)
+        
+        if price is not None:
+            self.trading_pair.last_price = price
+            self.pending_last_price = price
+        
+        return trades
+
+    def create_trade(self, maker_order: Order, taker_order: Order, price: Decimal,
+                     quantity: Decimal, maker_fee: Decimal, taker_fee: Decimal) -> Trade:
+        """Create a trade between two orders (saved by the next flush)"""
+        trade = Trade(
+            maker_order=maker_order,
+            taker_order=taker_order,
+            trading_pair=self.trading_pair,
+            price=price,
+            quantity=quantity,
+            maker_fee=maker_fee,
+            taker_fee=taker_fee
+        )
+        self.pending_trades.append(trade)
+        return trade
+
+    def mark_dirty(self, order: Order):
+        """Queue an order's engine-managed columns for the next flush"""
+        self.dirty_orders[order.id] = order
+
+    def flush(self):
+        """
+        Persist everything recorded since the last flush: one bulk insert for
+        the trades, one batched update for the touched orders and a single
+        last_price update for the pair.
+        """
+        trades, self.pending_trades = self.pending_trades, []
+        orders, self.dirty_orders = list(self.dirty_orders.values()), {}
+        last_price, self.pending_last_price = self.pending_last_price, None
+        
+        if trades:
+            Trade.objects.bulk_create(trades)
+            if self.candles is not None:
+                transaction.on_commit(lambda: self.candles.add_trades(self.trading_pair.id, trades))
+        
+        if orders:
+            now = timezone.now()
+            for order in orders:
+                order.updated_at = now
+            self.write_orders(orders)
+        
+        if last_price is not None:
+            # Only touch last_price so the feed's market data columns survive
+            TradingPair.objects.filter(id=self.trading_pair.id).update(last_price=last_price)
+        
+        if self.journal:
+            # Journal records only reach disk once the writes above commit
+            transaction.on_commit(self.commit_journal)
+        
+        events = self.collect_events()
+        if events:
+            transaction.on_commit(lambda: publish_order_events(self.trading_pair.id, events))
+        
+        deltas = self.collect_deltas()
+        if deltas:
+            transaction.on_commit(lambda: publish_book_deltas(self.trading_pair.id, deltas))
+
+    def collect_events(self) -> List[dict]:
+        """Number the L3 events recorded since the last flush, in the order they happened"""
+        events = []
+        for event in self.pending_events:
+            self.event_sequence += 1
+            events.append({'seq': self.event_sequence, **event})
+        self.pending_events = []
+        return events
+
+    def collect_deltas(self) -> List[dict]:
+        """
+        Turn the price levels touched since the last flush into L2 deltas,
+        one sequence number each, carrying the level's resulting aggregate
+        quantity and order count (or its removal).
+        """
+        deltas = []
+        for side, ticks in self.changed_levels:
+            self.sequence += 1
+            level = self.order_book[side].get(ticks)
+            key = 'bids' if side == 'BUY' else 'asks'
+            if level is None:
+                deltas.append({
+                    'seq': self.sequence,
+                    'action': 'remove',
+                    'side': key,
+                    'price': str(self.ticks_to_price(ticks)),
+                })
+            else:
+                deltas.append({
+                    'seq': self.sequence,
+                    'action': 'update',
+                    'side': key,
+                    'price': str(level.price),
+                    'quantity': str(self.arith.units_to_qty(level.quantity)),
+                    'count': level.count,
+                })
+        self.changed_levels = {}
+        return deltas
 
-    def calculate_fee(self, quantity: Decimal, price: Decimal, is_maker: bool) -> Decimal:
-        """Calculate trading fee"""
+    def commit_journal(self):
+        """Append the committed records, snapshotting the book when due"""
+        self.journal.commit()
+        if self.journal.needs_snapshot():
+            self.journal.write_snapshot(self.book_orders())
+
+    def write_orders(self, orders: List[Order]):
+        """
+        Update the engine-managed columns of many orders with one
+        executemany. bulk_update builds a CASE per column and row, which
+        dominates flushes of thousands of orders such as stop bursts.
+        """
+        quote = connection.ops.quote_name
+        fields = [Order._meta.get_field(name) for name in ORDER_UPDATE_FIELDS]
+        sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+            quote(Order._meta.db_table),
+            ', '.join(f'{quote(field.column)} = %s' for field in fields),
+            quote(Order._meta.pk.column)
+        )
+        params = [
+            [field.get_db_prep_save(getattr(order, field.attname), connection) for field in fields] + [order.pk]
+            for order in orders
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+    def discard_pending(self):
+        """Drop unflushed writes after a failed transaction"""
+        self.pending_trades = []
+        self.dirty_orders = {}
+        self.pending_last_price = None
+        self.pending_events = []
+        self.changed_levels = {}
+        if self.journal:
+            self.journal.discard()
+
+    def calculate_fee(self, quantity, ticks: int, is_maker: bool):
+        """Calculate trading fee in engine units for a fill of quantity units at ticks"""
         # Example fee calculation (can be customized)
-        fee_rate = Decimal('0.001') if is_maker else Decimal('0.002')  # 0.1% maker, 0.2% taker
-        return quantity * price * fee_rate
+        fee_rate = MAKER_FEE_RATE if is_maker else TAKER_FEE_RATE
+        return self.arith.fee(quantity, ticks, fee_rate)
 
     def check_stop_price_triggered(self, order: Order) -> bool:
         """Check if stop price has been triggered"""
@@ -265,34 +811,407 @@ class MatchingEngine:
     def cancel_order(self, order: Order) -> bool:
         """Cancel an open order"""
         try:
-            if order.status not in [OrderStatus.OPEN, OrderStatus.PARTIALLY_FILLED, OrderStatus.PENDING]:
-                return False
-                
-            order.status = OrderStatus.CANCELLED
-            order.save()
-            
-            self.remove_from_order_book(order)
-            return True
-            
+            return self.execute(self.handle_cancel, order)
         except Exception as e:
             logger.error(f"Error cancelling order: {str(e)}")
             return False
 
-    def get_order_book_snapshot(self) -> dict:
-        """Get current order book snapshot"""
+    def handle_cancel(self, order: Order) -> bool:
+        """Cancel an order in memory, recording the write for flush()"""
+        node = self.order_index.get(order.id)
+        if node is not None:
+            # Use the resting instance: it carries fills that may not be flushed yet
+            order = node.order
+        else:
+            order = self.stop_orders.remove(order.id) or order
+        
+        if order.status not in [OrderStatus.OPEN, OrderStatus.PARTIALLY_FILLED, OrderStatus.PENDING]:
+            return False
+            
+        order.status = OrderStatus.CANCELLED
+        self.mark_dirty(order)
+        
+        self.cancel_resting(order, 'cancelled')
+        if self.journal:
+            self.journal.cancel(order.id)
+        return True
+
+    def cancel_resting(self, order: Order, reason: str):
+        """Take an order out of the book, emitting its L3 cancel if it was resting"""
+        node = self.order_index.get(order.id)
+        if node is None:
+            return  # Pending stops are not part of the public book
+        self.pending_events.append(order_event(
+            'cancel', order, node.level.price, self.arith.units_to_qty(node.remaining),
+            reason=reason
+        ))
+        self.remove_from_order_book(order)
+
+    def mass_cancel(self, user_id: Optional[int] = None) -> List[int]:
+        """
+        Cancel every resting order and pending stop on this pair, or only a
+        single user's, using the in-memory indexes instead of scanning the
+        book or the orders table. The orders are written by the next
+        flush, like single cancels. Returns the ids of the cancelled orders.
+        """
+        orders = [
+            node.order for node in self.order_index.values()
+            if user_id is None or node.order.user_id == user_id
+        ] + [
+            order for order in self.stop_orders
+            if user_id is None or order.user_id == user_id
+        ]
+        for order in orders:
+            order.status = OrderStatus.CANCELLED
+            self.mark_dirty(order)
+            self.cancel_resting(order, 'cancelled')
+            self.stop_orders.remove(order.id)
+            if self.journal:
+                self.journal.cancel(order.id)
+        return [order.id for order in orders]
+
+    def get_order_book_snapshot(self, depth: Optional[int] = None,
+                                band_bps: Optional[Decimal] = None) -> dict:
+        """
+        Get current order book snapshot from the per-level aggregates. The
+        sequence is that of the last delta already reflected, so clients
+        apply only deltas with a higher seq on top of it.
+        
+        depth keeps the best N levels per side and band_bps the levels
+        within that many basis points of the mid price. Levels are walked
+        from the best price outwards and the walk stops at the first level
+        outside the limits, so a top-20 snapshot costs O(20).
+        """
         snapshot = {
+            'sequence': self.sequence,
             'bids': [],  # Buy orders
             'asks': []   # Sell orders
         }
         
-        # Process buy orders
-        for price_str in sorted(self.order_book['BUY'].keys(), key=lambda x: Decimal(x), reverse=True):
-            total_quantity = sum(order.remaining_quantity for order in self.order_book['BUY'][price_str])
-            snapshot['bids'].append([Decimal(price_str), total_quantity])
+        low = high = None
+        if band_bps is not None:
+            reference = self.mid_price()
+            if reference is not None:
+                width = reference * band_bps / 10000
+                low, high = reference - width, reference + width
         
-        # Process sell orders
-        for price_str in sorted(self.order_book['SELL'].keys(), key=lambda x: Decimal(x)):
-            total_quantity = sum(order.remaining_quantity for order in self.order_book['SELL'][price_str])
-            snapshot['asks'].append([Decimal(price_str), total_quantity])
+        for key, side in (('bids', 'BUY'), ('asks', 'SELL')):
+            levels = snapshot[key]
+            for level in self.order_book[side]:
+                if depth is not None and len(levels) >= depth:
+                    break
+                if low is not None and not low <= level.price <= high:
+                    break
+                levels.append([level.price, self.arith.units_to_qty(level.quantity)])
         
         return snapshot
+
+    def get_l3_snapshot(self) -> dict:
+        """
+        Every resting order as [order id, price, open quantity], bids and
+        asks from the best price outwards and in time priority within a
+        level. The sequence is that of the last L3 event already reflected.
+        """
+        snapshot = {'sequence': self.event_sequence}
+        for key, side in (('bids', 'BUY'), ('asks', 'SELL')):
+            snapshot[key] = [
+                [node.order.id, str(level.price), str(self.arith.units_to_qty(node.remaining))]
+                for level in self.order_book[side]
+                for node in level.nodes()
+            ]
+        return snapshot
+
+    def mid_price(self) -> Optional[Decimal]:
+        """Mid of the best bid and ask, or the best price of a one-sided book"""
+        best_bid, best_ask = self.order_book['BUY'].best(), self.order_book['SELL'].best()
+        if best_bid is not None and best_ask is not None:
+            return (best_bid.price + best_ask.price) / 2
+        if best_bid is not None:
+            return best_bid.price
+        if best_ask is not None:
+            return best_ask.price
+        return None
+
+    def cached_snapshot(self, render, depth: Optional[int] = None,
+                        band_bps: Optional[Decimal] = None) -> bytes:
+        """
+        Snapshot rendered to bytes by render(), reused until the book's
+        sequence moves so concurrent readers share one rendering. Call with
+        the engine lock held.
+        """
+        key = (depth, band_bps)
+        cached = self.snapshot_cache.get(key)
+        if cached is not None and cached[0] == self.sequence:
+            return cached[1]
+        
+        if len(self.snapshot_cache) >= SNAPSHOT_CACHE_SIZE:
+            self.snapshot_cache.clear()
+        content = render(self.get_order_book_snapshot(depth, band_bps))
+        self.snapshot_cache[key] = (self.sequence, content)
+        return content
+
+
+def expire_stored_orders(exclude_pair_ids=(), batch_size: int = 1000) -> int:
+    """
+    Bulk-expire open, partially filled and pending orders whose expires_at
+    has passed, straight in the database, using the (status, expires_at)
+    index. Meant for pairs without an engine in this process; engines
+    expire the orders they hold themselves. Publishes unsequenced L3
+    cancels with reason 'expired' and returns the number of expired orders.
+    """
+    live_statuses = [OrderStatus.OPEN, OrderStatus.PARTIALLY_FILLED, OrderStatus.PENDING]
+    expired = 0
+    while True:
+        now = timezone.now()
+        batch = list(
+            Order.objects.filter(status__in=live_statuses, expires_at__lte=now)
+            .exclude(trading_pair_id__in=exclude_pair_ids)
+            .order_by('expires_at')[:batch_size]
+        )
+        if not batch:
+            return expired
+
+        with transaction.atomic():
+            # The status guard skips orders an engine touched meanwhile
+            updated = Order.objects.filter(
+                id__in=[order.id for order in batch],
+                status__in=live_statuses
+            ).update(status=OrderStatus.EXPIRED, updated_at=now)
+
+        events = {}
+        for order in batch:
+            order.status = OrderStatus.EXPIRED
+            events.setdefault(order.trading_pair_id, []).append(order_event(
+                'cancel', order, order.price, order.remaining_quantity, reason='expired'
+            ))
+        for trading_pair_id, pair_events in events.items():
+            publish_order_events(trading_pair_id, pair_events)
+
+        expired += updated
+        if len(batch) < batch_size:
+            return expired
+
+
+class EngineRegistry:
+    """
+    Process-wide registry keeping one warm MatchingEngine per trading pair.
+    Writes go through each pair's PairSequencer, which is the engine's only
+    writer; readers may use the engine directly while holding engine.lock.
+    """
+
+    def __init__(self):
+        self.engines: Dict[int, MatchingEngine] = {}
+        self.sequencers: Dict[int, 'PairSequencer'] = {}
+        self.lock = threading.Lock()
+        self.price_listener = None
+        self.expiry_sweeper = None
+        self.hits = 0
+        self.misses = 0
+
+    def get_engine(self, trading_pair: TradingPair) -> MatchingEngine:
+        """Return the warm engine for a pair, loading its book on first use"""
+        with self.lock:
+            engine = self.engines.get(trading_pair.id)
+            if engine is None:
+                self.misses += 1
+                engine = MatchingEngine(trading_pair)
+                self.engines[trading_pair.id] = engine
+            else:
+                # The engine keeps its own pair: its last price is the
+                # engine's, and edits reach it through invalidate()
+                self.hits += 1
+            return engine
+
+    def get_sequencer(self, trading_pair: TradingPair) -> 'PairSequencer':
+        """Return the pair's sequencer, starting its writer thread on first use"""
+        from .sequencer import PairSequencer
+
+        engine = self.get_engine(trading_pair)
+        with self.lock:
+            sequencer = dead = self.sequencers.get(trading_pair.id)
+            if sequencer is not None and not sequencer.thread.is_alive():
+                # The writer thread died: fail what it left queued and start over
+                logger.error(f"Sequencer for {engine.trading_pair} is not running, restarting it")
+                sequencer.drain(RuntimeError(f"Sequencer for {engine.trading_pair} stopped"))
+                sequencer = None
+            else:
+                dead = None
+            if sequencer is None:
+                sequencer = PairSequencer(engine)
+                self.sequencers[trading_pair.id] = sequencer
+                if dead is not None:
+                    # The book may hold the dead thread's unflushed work, and
+                    # the orders it failed to place must not be loaded
+                    sequencer.unplaced |= dead.unplaced
+                    sequencer.submit('call', engine.discard_pending)
+                    sequencer.submit('call', sequencer.rebuild)
+                sequencer.start()
+            if self.price_listener is None:
+                self.price_listener = threading.Thread(
+                    target=self.listen_for_prices,
+                    name='engine-prices',
+                    daemon=True
+                )
+                self.price_listener.start()
+            if self.expiry_sweeper is None:
+                self.expiry_sweeper = threading.Thread(
+                    target=self.sweep_expired_orders,
+                    name='engine-expiry-sweep',
+                    daemon=True
+                )
+                self.expiry_sweeper.start()
+            return sequencer
+
+    def submit(self, trading_pair: TradingPair, action: str, *args):
+        """Queue a command on the pair's sequencer, returning a Future for its result"""
+        return self.get_sequencer(trading_pair).submit(action, *args)
+
+    def on_market_price(self, trading_pair_id: int, last_price: Decimal) -> bool:
+        """
+        Hand a market data last price to the pair's engine so crossed stops
+        trigger. Only engines living in this process are affected, and the
+        work is queued on the pair's sequencer, so this never blocks on the
+        database. Returns True if a trigger was queued.
+        """
+        from .sequencer import SequencerBusy
+
+        engine = self.engines.get(trading_pair_id)
+        if engine is None or last_price is None or not engine.stops_crossed(last_price):
+            return False
+        try:
+            self.submit(engine.trading_pair, 'call', engine.trigger_stops, last_price)
+        except SequencerBusy:
+            logger.warning(f"Dropped stop trigger at {last_price} for {engine.trading_pair}: queue is full")
+            return False
+        return True
+
+    def listen_for_prices(self):
+        """
+        Receive last prices published on MARKET_PRICE_CHANNEL by market data
+        processes such as mcx_feed. Needs a channel layer shared between
+        processes (Redis); runs on a daemon thread started with the first
+        sequencer.
+        """
+        from channels.layers import get_channel_layer
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+
+        async def receive():
+            while True:
+                try:
+                    message = await channel_layer.receive(MARKET_PRICE_CHANNEL)
+                    self.on_market_price(message['trading_pair_id'], Decimal(message['last_price']))
+                except Exception as e:
+                    logger.error(f"Error receiving market price: {str(e)}")
+                    await asyncio.sleep(1)
+
+        asyncio.run(receive())
+
+    def sweep_expired_orders(self):
+        """
+        Periodically expire stored orders of pairs whose engine is not in
+        this process. Runs on a daemon thread started with the first
+        sequencer; the engines' own schedulers handle the pairs they hold.
+        Engines only read so far (order book snapshots) have no scheduler:
+        once one holds an expired order, its sequencer is started to expire
+        it in the book and the database.
+        """
+        interval = ENGINE_SETTINGS.get('EXPIRY_SWEEP_INTERVAL', 60)
+        while True:
+            time.sleep(interval)
+            close_old_connections()
+            try:
+                with self.lock:
+                    pair_ids = list(self.engines)
+                    idle = [
+                        engine for pair_id, engine in self.engines.items()
+                        if pair_id not in self.sequencers or not self.sequencers[pair_id].thread.is_alive()
+                    ]
+                for engine in idle:
+                    with engine.lock:
+                        due = engine.seconds_until_expiry() == 0
+                    if due:
+                        self.get_sequencer(engine.trading_pair)
+                expired = expire_stored_orders(exclude_pair_ids=pair_ids)
+                if expired:
+                    logger.info(f"Expiry sweep expired {expired} stored orders")
+            except Exception as e:
+                logger.error(f"Error sweeping expired orders: {str(e)}")
+
+    def invalidate(self, trading_pair_id: int):
+        """Re-read a pair and rebuild its book from the database, e.g. after an edit"""
+        from .sequencer import SequencerBusy
+
+        with self.lock:
+            sequencer = dead = self.sequencers.get(trading_pair_id)
+            if sequencer is not None and not sequencer.thread.is_alive():
+                del self.sequencers[trading_pair_id]
+                sequencer.drain(RuntimeError(f"Sequencer for {sequencer.engine.trading_pair} stopped"))
+                sequencer = None
+            else:
+                dead = None
+            if sequencer is None:
+                engine = self.engines.pop(trading_pair_id, None)
+        if dead is not None:
+            try:
+                # The next engine loads from the database: reject its failed orders first
+                dead.reject_unplaced()
+            except Exception as e:
+                logger.error(f"Could not reject the failed orders of {dead.engine.trading_pair}: {str(e)}")
+        if sequencer is not None:
+            # Reload through the queue so the sequencer stays the only writer
+            engine = sequencer.engine
+            try:
+                sequencer.submit('call', engine.refresh_pair)
+            except SequencerBusy:
+                logger.error(f"Could not reload matching engine for {engine.trading_pair}: queue is full")
+                return
+        if engine:
+            logger.info(f"Invalidated matching engine for {engine.trading_pair}")
+
+    def remove(self, trading_pair_id: int):
+        """Drop a deleted pair's engine; its sequencer stops after the commands already queued"""
+        with self.lock:
+            engine = self.engines.pop(trading_pair_id, None)
+            sequencer = self.sequencers.pop(trading_pair_id, None)
+        if sequencer is not None:
+            sequencer.stop()
+        if engine:
+            logger.info(f"Removed matching engine for {engine.trading_pair}")
+
+    def invalidate_all(self):
+        """Rebuild every cached book"""
+        with self.lock:
+            pair_ids = list(self.engines)
+        for pair_id in pair_ids:
+            self.invalidate(pair_id)
+
+    def reload(self, trading_pair_id: int) -> Optional[MatchingEngine]:
+        """Rebuild a cached engine's book in place"""
+        engine = self.engines.get(trading_pair_id)
+        if engine:
+            with engine.lock:
+                engine.reload()
+        return engine
+
+    def get_metrics(self) -> dict:
+        """Registry-wide metrics: cache hit rate plus per-pair book statistics"""
+        with self.lock:
+            engines = list(self.engines.items())
+        return {
+            'engines': len(engines),
+            'hits': self.hits,
+            'misses': self.misses,
+            'pairs': {
+                pair_id: {
+                    **engine.get_metrics(),
+                    **(self.sequencers[pair_id].get_metrics() if pair_id in self.sequencers else {})
+                }
+                for pair_id, engine in engines
+            },
+        }
+
+# Global instance
+engine_registry = EngineRegistry()
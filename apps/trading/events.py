@@ -0,0 +1,164 @@
+import json
+import logging
+from typing import List
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+
+MARKET_DATA_GROUP = 'market-data'  # Ticks for every pair, for wildcard subscribers
+MCX_FEED_GROUP = 'mcx-feed'  # Raw ticks from the shared MCX upstream
+
+
+def order_events_group(trading_pair_id: int) -> str:
+    """Channel layer group receiving a pair's L3 (order-by-order) events"""
+    return f"orders.{trading_pair_id}"
+
+
+def market_data_group(trading_pair_id: int) -> str:
+    """Channel layer group receiving one pair's ticks"""
+    return f"market-data.{trading_pair_id}"
+
+
+def book_group(trading_pair_id: int) -> str:
+    """Channel layer group receiving a pair's L2 book deltas"""
+    return f"book.{trading_pair_id}"
+
+
+def order_event(event: str, order, price, quantity, **fields) -> dict:
+    """
+    L3 event for one resting order: 'add' when it joins the book, 'fill'
+    when it trades (quantity filled, plus the remaining open quantity and
+    the taker) and 'cancel' when it leaves unfilled (reason 'cancelled' or
+    'expired'). Order owners are not part of the public stream.
+    """
+    return {
+        'event': event,
+        'order_id': order.id,
+        'side': order.side,
+        'price': str(price) if price is not None else None,
+        'quantity': str(quantity),
+        **fields,
+    }
+
+
+def publish_order_events(trading_pair_id: int, events: List[dict]):
+    """
+    Send a batch of L3 events to the pair's group in one message. Called
+    from the engine's writer thread after the events' transaction commits;
+    delivery across processes needs a shared channel layer such as Redis.
+
+    The client frame is serialized here once, so consumers forward it as is
+    however many connections are subscribed. first_seq/last_seq let them
+    spot gaps without decoding it; both are None for unsequenced events
+    such as expiries swept from the database. reset marks an engine reload
+    after which only a new snapshot describes the book.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not events:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(order_events_group(trading_pair_id), {
+            'type': 'order.events',
+            'trading_pair_id': trading_pair_id,
+            'first_seq': events[0].get('seq'),
+            'last_seq': events[-1].get('seq'),
+            'reset': events[-1].get('event') == 'reset',
+            'text': json.dumps({
+                'type': 'l3',
+                'trading_pair_id': trading_pair_id,
+                'events': events,
+            }),
+        })
+    except Exception as e:
+        logger.error(f"Error publishing order events for pair {trading_pair_id}: {str(e)}")
+
+
+def publish_book_deltas(trading_pair_id: int, deltas: List[dict]):
+    """
+    Send a flush's sequenced L2 deltas to the pair's book group in one
+    message, serialized once like publish_order_events. Every delta has its
+    own seq; a 'reset' delta means the engine rebuilt its book and clients
+    must fetch a new snapshot.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not deltas:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(book_group(trading_pair_id), {
+            'type': 'book.deltas',
+            'trading_pair_id': trading_pair_id,
+            'first_seq': deltas[0]['seq'],
+            'last_seq': deltas[-1]['seq'],
+            'reset': deltas[-1].get('action') == 'reset',
+            'text': json.dumps({
+                'type': 'l2',
+                'trading_pair_id': trading_pair_id,
+                'deltas': deltas,
+            }),
+        })
+    except Exception as e:
+        logger.error(f"Error publishing book deltas for pair {trading_pair_id}: {str(e)}")
+
+
+def pair_symbol(pair) -> str:
+    return f"{pair.base_asset}/{pair.quote_asset}"
+
+
+def market_data_frame(pair) -> str:
+    """Client frame with a trading pair's latest market data"""
+    return json.dumps({
+        'type': 'market_data',
+        'symbol': pair_symbol(pair),
+        'data': {
+            'last_price': str(pair.last_price),
+            'bid': str(pair.bid_price),
+            'ask': str(pair.ask_price),
+            'high': str(pair.high_price),
+            'low': str(pair.low_price),
+            'open': str(pair.open_price),
+            'close': str(pair.close_price),
+            'volume': str(pair.volume_24h),
+            'timestamp': pair.last_updated.isoformat() if pair.last_updated else None
+        }
+    })
+
+
+def quote_frame(quote: dict) -> str:
+    """market_data_frame for a quote from the quote store"""
+    return json.dumps({
+        'type': 'market_data',
+        'symbol': quote['symbol'],
+        'data': {
+            'last_price': str(quote.get('last_price')),
+            'bid': str(quote.get('bid_price')),
+            'ask': str(quote.get('ask_price')),
+            'high': str(quote.get('high_price')),
+            'low': str(quote.get('low_price')),
+            'open': str(quote.get('open_price')),
+            'close': str(quote.get('close_price')),
+            'volume': str(quote.get('volume_24h')),
+            'timestamp': quote.get('last_updated')
+        }
+    })
+
+
+async def apublish_market_data(channel_layer, pair):
+    """
+    Push a pair's tick to the clients subscribed to it and to the wildcard
+    group, serialized once here rather than per connection. symbol lets
+    pattern subscribers filter without decoding the frame.
+    """
+    if channel_layer is None:
+        return
+    message = {
+        'type': 'market.data',
+        'symbol': pair_symbol(pair),
+        'text': market_data_frame(pair),
+    }
+    try:
+        await channel_layer.group_send(market_data_group(pair.id), message)
+        await channel_layer.group_send(MARKET_DATA_GROUP, message)
+    except Exception as e:
+        logger.error(f"Error publishing market data for {pair}: {str(e)}")
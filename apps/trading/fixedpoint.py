@@ -0,0 +1,91 @@
+from decimal import Decimal
+
+# Fee rates are applied as integer millionths in fixed-point mode
+FEE_DIGITS = 6
+
+
+def decimal_places(value: Decimal) -> int:
+    """Number of decimal places a value needs, ignoring trailing zeros"""
+    return max(0, -value.normalize().as_tuple().exponent)
+
+
+class DecimalArithmetic:
+    """
+    Engine arithmetic on Decimal values. Quantities stay Decimals and prices
+    are recovered from integer ticks; this is the reference behaviour the
+    fixed-point mode must reproduce exactly.
+    """
+    fixed_point = False
+
+    def __init__(self, price_precision: int):
+        self.price_digits = price_precision
+
+    def qty_to_units(self, quantity: Decimal) -> Decimal:
+        return quantity
+
+    def units_to_qty(self, units: Decimal) -> Decimal:
+        return units
+
+    def ticks_to_price(self, ticks: int) -> Decimal:
+        return Decimal(ticks).scaleb(-self.price_digits)
+
+    def notional(self, units: Decimal, ticks: int) -> Decimal:
+        return units * self.ticks_to_price(ticks)
+
+    def notional_to_decimal(self, value: Decimal) -> Decimal:
+        return value
+
+    def fee(self, units: Decimal, ticks: int, rate: Decimal) -> Decimal:
+        return units * self.ticks_to_price(ticks) * rate
+
+    def fee_to_decimal(self, value: Decimal) -> Decimal:
+        return value
+
+
+class FixedPointArithmetic:
+    """
+    Engine arithmetic on scaled integers. Prices are ticks of the pair's
+    price_precision, quantities are lots of the decimal places in its
+    min_trade_size, so notionals are ticks x lots and fees are ticks x lots
+    x millionths. Decimals are only built when values leave the engine.
+    """
+    fixed_point = True
+
+    def __init__(self, price_precision: int, min_trade_size: Decimal):
+        self.price_digits = price_precision
+        self.qty_digits = decimal_places(min_trade_size)
+        self._rates = {}
+
+    def qty_to_units(self, quantity: Decimal) -> int:
+        scaled = quantity.scaleb(self.qty_digits)
+        units = int(scaled)
+        if units != scaled:
+            raise ValueError(f"Quantity {quantity} is finer than {self.qty_digits} decimal places")
+        return units
+
+    def units_to_qty(self, units: int) -> Decimal:
+        return Decimal(units).scaleb(-self.qty_digits)
+
+    def ticks_to_price(self, ticks: int) -> Decimal:
+        return Decimal(ticks).scaleb(-self.price_digits)
+
+    def notional(self, units: int, ticks: int) -> int:
+        return units * ticks
+
+    def notional_to_decimal(self, value: int) -> Decimal:
+        return Decimal(value).scaleb(-(self.qty_digits + self.price_digits))
+
+    def fee(self, units: int, ticks: int, rate: Decimal) -> int:
+        rate_units = self._rates.get(rate)
+        if rate_units is None:
+            rate_units = self._rates[rate] = int(rate.scaleb(FEE_DIGITS))
+        return units * ticks * rate_units
+
+    def fee_to_decimal(self, value: int) -> Decimal:
+        return Decimal(value).scaleb(-(self.qty_digits + self.price_digits + FEE_DIGITS))
+
+    def is_representable(self, price, quantity: Decimal) -> bool:
+        """Whether an order's price and quantity fit the pair's ticks and lots"""
+        if price is not None and decimal_places(price) > self.price_digits:
+            return False
+        return decimal_places(quantity) <= self.qty_digits
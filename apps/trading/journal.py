@@ -0,0 +1,386 @@
+import logging
+import os
+import struct
+import time
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, ROUND_HALF_EVEN
+from typing import Dict, Iterator, List, Optional, Tuple
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+ENGINE_SETTINGS = getattr(settings, 'MATCHING_ENGINE', {})
+
+# Record types
+PLACE = 1   # Order accepted by the engine
+FILL = 2    # Trade between a resting maker and a taker
+UPDATE = 3  # Order totals after the fills of one command
+REST = 4    # Taker left resting in the book
+CANCEL = 5  # Order removed from the book without trading
+STOP = 6    # Stop order armed, waiting for its stop price
+TRIGGER = 7 # Armed stop order activated
+EXPIRE = 8  # Order removed from the book at its expiry time
+
+# Framing: type, sequence, payload length | payload | crc32 of header + payload
+RECORD_HEADER = struct.Struct('<BQI')
+RECORD_CRC = struct.Struct('<I')
+
+# Payloads. Decimals are stored as integers of 1e-8 (the model's precision),
+# datetimes as microseconds since the epoch and missing values as NULL.
+PLACE_RECORD = struct.Struct('<qqBBqqqqq')   # id, user, side, type, price, stop, quantity, created, expires
+FILL_RECORD = struct.Struct('<qqqqqq')       # maker, taker, price, quantity, maker fee, taker fee
+UPDATE_RECORD = struct.Struct('<qBqqqqq')    # id, status, filled, remaining, total, fees, average price
+ORDER_ID_RECORD = struct.Struct('<q')        # order id
+
+SNAPSHOT_MAGIC = b'BBXBOOK1'
+SNAPSHOT_HEADER = struct.Struct('<8sqQI')    # magic, pair id, journal sequence, order count
+SNAPSHOT_ORDER = struct.Struct('<qqBBBqqqqqqqqqq')
+# id, user, side, type, status, price, stop, quantity, remaining, filled,
+# total filled amount, fees, average fill price, created, expires
+
+NULL = -(2 ** 63)
+SCALE = 8
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+SIDES = ['BUY', 'SELL']
+ORDER_TYPES = ['LIMIT', 'MARKET', 'STOP_LOSS', 'STOP_LIMIT']
+STATUSES = ['PENDING', 'OPEN', 'PARTIALLY_FILLED', 'FILLED', 'CANCELLED', 'REJECTED', 'EXPIRED']
+
+# Fields of a replayed order, in snapshot order
+ORDER_FIELDS = (
+    'id', 'user_id', 'side', 'order_type', 'status', 'price', 'stop_price',
+    'quantity', 'remaining_quantity', 'filled_quantity', 'total_filled_amount',
+    'fees', 'average_fill_price', 'created_at', 'expires_at'
+)
+
+
+def encode_decimal(value: Optional[Decimal]) -> int:
+    if value is None:
+        return NULL
+    return int(Decimal(value).scaleb(SCALE).to_integral_value(ROUND_HALF_EVEN))
+
+
+def decode_decimal(value: int) -> Optional[Decimal]:
+    if value == NULL:
+        return None
+    return Decimal(value).scaleb(-SCALE)
+
+
+def encode_datetime(value: Optional[datetime]) -> int:
+    if value is None:
+        return NULL
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def decode_datetime(value: int) -> Optional[datetime]:
+    if value == NULL:
+        return None
+    return EPOCH + timedelta(microseconds=value)
+
+
+class EngineJournal:
+    """
+    Append-only binary journal of one pair's accepted orders, fills, order
+    updates, rests, cancels, expiries and stop arming/triggering, plus a
+    compact snapshot of the resting book and pending stops. Fills are kept
+    as an audit trail; recovery applies the order updates.
+
+    Records are buffered while an order is processed and appended when the
+    engine's database transaction commits, so the journal never contains
+    work that was rolled back. A crash between the commit and the append
+    (or before an fsync) leaves it behind the database instead; the engine
+    checks a recovered book against the database before using it. Every snapshot_interval records the book is
+    snapshotted and the journal restarts, so recovery reads the snapshot and
+    replays only the tail.
+
+    fsync policy:
+        always   -- fsync after every commit
+        interval -- fsync at most every fsync_interval seconds
+        never    -- leave it to the operating system
+    """
+
+    def __init__(self, directory: str, trading_pair_id: int, fsync: str = 'interval',
+                 fsync_interval: float = 0.05, snapshot_interval: int = 10000):
+        os.makedirs(directory, exist_ok=True)
+        self.trading_pair_id = trading_pair_id
+        self.journal_path = os.path.join(directory, f"pair-{trading_pair_id}.journal")
+        self.snapshot_path = os.path.join(directory, f"pair-{trading_pair_id}.snapshot")
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.snapshot_interval = snapshot_interval
+
+        self.buffer = bytearray()
+        self.sequence = 0
+        self.committed_sequence = 0
+        self.records_since_snapshot = 0
+        self.last_fsync = 0.0
+        self.valid_length = 0
+        self.file = None
+
+    @classmethod
+    def for_pair(cls, trading_pair_id: int) -> 'EngineJournal':
+        """Journal configured from MATCHING_ENGINE settings"""
+        return cls(
+            ENGINE_SETTINGS.get('JOURNAL_DIR', 'journal'),
+            trading_pair_id,
+            fsync=ENGINE_SETTINGS.get('JOURNAL_FSYNC', 'interval'),
+            fsync_interval=ENGINE_SETTINGS.get('JOURNAL_FSYNC_INTERVAL', 0.05),
+            snapshot_interval=ENGINE_SETTINGS.get('JOURNAL_SNAPSHOT_INTERVAL', 10000)
+        )
+
+    def has_state(self) -> bool:
+        return os.path.exists(self.snapshot_path)
+
+    # Writing
+
+    def append(self, record_type: int, payload: bytes):
+        self.sequence += 1
+        header = RECORD_HEADER.pack(record_type, self.sequence, len(payload))
+        self.buffer += header
+        self.buffer += payload
+        self.buffer += RECORD_CRC.pack(zlib.crc32(payload, zlib.crc32(header)))
+
+    def place(self, order):
+        self.append(PLACE, PLACE_RECORD.pack(
+            order.id, order.user_id, SIDES.index(order.side),
+            ORDER_TYPES.index(order.order_type), encode_decimal(order.price),
+            encode_decimal(order.stop_price), encode_decimal(order.quantity),
+            encode_datetime(order.created_at), encode_datetime(order.expires_at)
+        ))
+
+    def fill(self, maker_id: int, taker_id: int, price: Decimal, quantity: Decimal,
+             maker_fee: Decimal, taker_fee: Decimal):
+        self.append(FILL, FILL_RECORD.pack(
+            maker_id, taker_id, encode_decimal(price), encode_decimal(quantity),
+            encode_decimal(maker_fee), encode_decimal(taker_fee)
+        ))
+
+    def update(self, order):
+        self.append(UPDATE, UPDATE_RECORD.pack(
+            order.id, STATUSES.index(order.status), encode_decimal(order.filled_quantity),
+            encode_decimal(order.remaining_quantity), encode_decimal(order.total_filled_amount),
+            encode_decimal(order.fees), encode_decimal(order.average_fill_price)
+        ))
+
+    def rest(self, order_id: int):
+        self.append(REST, ORDER_ID_RECORD.pack(order_id))
+
+    def cancel(self, order_id: int):
+        self.append(CANCEL, ORDER_ID_RECORD.pack(order_id))
+
+    def expire(self, order_id: int):
+        self.append(EXPIRE, ORDER_ID_RECORD.pack(order_id))
+
+    def stop(self, order_id: int):
+        self.append(STOP, ORDER_ID_RECORD.pack(order_id))
+
+    def trigger(self, order_id: int):
+        self.append(TRIGGER, ORDER_ID_RECORD.pack(order_id))
+
+    def commit(self):
+        """Append buffered records to the journal file, honouring the fsync policy"""
+        if not self.buffer:
+            return
+        if self.file is None:
+            self.file = open(self.journal_path, 'ab')
+        self.file.write(self.buffer)
+        self.file.flush()
+        now = time.monotonic()
+        if self.fsync == 'always' or (
+            self.fsync == 'interval' and now - self.last_fsync >= self.fsync_interval
+        ):
+            os.fsync(self.file.fileno())
+            self.last_fsync = now
+        self.records_since_snapshot += self.sequence - self.committed_sequence
+        self.committed_sequence = self.sequence
+        self.buffer.clear()
+
+    def discard(self):
+        """Drop buffered records of a rolled-back transaction"""
+        self.buffer.clear()
+        self.sequence = self.committed_sequence
+
+    def needs_snapshot(self) -> bool:
+        return self.records_since_snapshot >= self.snapshot_interval
+
+    def write_snapshot(self, orders):
+        """
+        Atomically replace the snapshot with the given resting orders and
+        pending stops (each in time priority) and start a fresh journal
+        after it.
+        """
+        orders = list(orders)
+        # The snapshot covers everything recorded so far, buffered or not
+        self.buffer.clear()
+        self.committed_sequence = self.sequence
+        temporary = self.snapshot_path + '.tmp'
+        with open(temporary, 'wb') as handle:
+            handle.write(SNAPSHOT_HEADER.pack(
+                SNAPSHOT_MAGIC, self.trading_pair_id, self.committed_sequence, len(orders)
+            ))
+            for order in orders:
+                handle.write(SNAPSHOT_ORDER.pack(
+                    order.id, order.user_id, SIDES.index(order.side),
+                    ORDER_TYPES.index(order.order_type), STATUSES.index(order.status),
+                    encode_decimal(order.price), encode_decimal(order.stop_price),
+                    encode_decimal(order.quantity), encode_decimal(order.remaining_quantity),
+                    encode_decimal(order.filled_quantity), encode_decimal(order.total_filled_amount),
+                    encode_decimal(order.fees), encode_decimal(order.average_fill_price),
+                    encode_datetime(order.created_at), encode_datetime(order.expires_at)
+                ))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, self.snapshot_path)
+
+        # Records up to the snapshot's sequence are no longer needed
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        open(self.journal_path, 'wb').close()
+        self.records_since_snapshot = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    # Reading
+
+    def read_snapshot(self) -> Tuple[int, List[dict]]:
+        """Journal sequence covered by the snapshot and its resting orders"""
+        with open(self.snapshot_path, 'rb') as handle:
+            data = handle.read()
+        magic, pair_id, sequence, count = SNAPSHOT_HEADER.unpack_from(data, 0)
+        if magic != SNAPSHOT_MAGIC or pair_id != self.trading_pair_id:
+            raise ValueError(f"{self.snapshot_path} is not a snapshot for pair {self.trading_pair_id}")
+
+        orders = []
+        offset = SNAPSHOT_HEADER.size
+        for _ in range(count):
+            values = SNAPSHOT_ORDER.unpack_from(data, offset)
+            offset += SNAPSHOT_ORDER.size
+            state = dict(zip(ORDER_FIELDS, values))
+            state['side'] = SIDES[state['side']]
+            state['order_type'] = ORDER_TYPES[state['order_type']]
+            state['status'] = STATUSES[state['status']]
+            for field in ('price', 'stop_price', 'quantity', 'remaining_quantity',
+                          'filled_quantity', 'total_filled_amount', 'fees', 'average_fill_price'):
+                state[field] = decode_decimal(state[field])
+            state['created_at'] = decode_datetime(state['created_at'])
+            state['expires_at'] = decode_datetime(state['expires_at'])
+            orders.append(state)
+        return sequence, orders
+
+    def read_records(self, after_sequence: int = 0) -> Iterator[Tuple[int, int, tuple]]:
+        """Yield (type, sequence, fields) for committed records after a sequence"""
+        self.valid_length = 0
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'rb') as handle:
+            data = handle.read()
+
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            header = data[offset:offset + RECORD_HEADER.size]
+            record_type, sequence, length = RECORD_HEADER.unpack(header)
+            start = offset + RECORD_HEADER.size
+            end = start + length + RECORD_CRC.size
+            if end > len(data):
+                logger.warning(f"{self.journal_path}: truncated record {sequence}, ignoring the tail")
+                break
+            payload = data[start:start + length]
+            (crc,) = RECORD_CRC.unpack_from(data, start + length)
+            if crc != zlib.crc32(payload, zlib.crc32(header)):
+                logger.warning(f"{self.journal_path}: bad checksum on record {sequence}, ignoring the tail")
+                break
+            offset = end
+
+            if sequence <= after_sequence:
+                continue
+            if record_type == PLACE:
+                fields = PLACE_RECORD.unpack(payload)
+            elif record_type == FILL:
+                fields = FILL_RECORD.unpack(payload)
+            elif record_type == UPDATE:
+                fields = UPDATE_RECORD.unpack(payload)
+            else:
+                fields = ORDER_ID_RECORD.unpack(payload)
+            yield record_type, sequence, fields
+
+        self.valid_length = offset
+
+    def recover(self, repair: bool = True) -> Dict[int, dict]:
+        """
+        Rebuild the resting book and the pending stops from the latest
+        snapshot plus the journal tail. Returns order states keyed by id, in
+        time priority (stops have status PENDING), and leaves
+        the journal positioned to append after the last valid record. Pass
+        repair=False to read a journal another process is writing.
+        """
+        snapshot_sequence, orders = self.read_snapshot()
+        book = {state['id']: state for state in orders}
+        placed = {}  # accepted orders that are neither resting nor armed (yet)
+        sequence = snapshot_sequence
+
+        for record_type, sequence, fields in self.read_records(snapshot_sequence):
+            if record_type == PLACE:
+                order_id, user_id, side, order_type, price, stop, quantity, created, expires = fields
+                quantity = decode_decimal(quantity)
+                placed[order_id] = {
+                    'id': order_id,
+                    'user_id': user_id,
+                    'side': SIDES[side],
+                    'order_type': ORDER_TYPES[order_type],
+                    'status': 'PENDING',
+                    'price': decode_decimal(price),
+                    'stop_price': decode_decimal(stop),
+                    'quantity': quantity,
+                    'remaining_quantity': quantity,
+                    'filled_quantity': Decimal('0'),
+                    'total_filled_amount': Decimal('0'),
+                    'fees': Decimal('0'),
+                    'average_fill_price': None,
+                    'created_at': decode_datetime(created),
+                    'expires_at': decode_datetime(expires),
+                }
+            elif record_type == UPDATE:
+                # Totals are recorded as the database stores them, so a
+                # recovered order matches one loaded from its row
+                order_id, status, filled, remaining, total, fees, average = fields
+                state = book.get(order_id) or placed.get(order_id)
+                if state is None:
+                    continue
+                state['status'] = STATUSES[status]
+                state['filled_quantity'] = decode_decimal(filled)
+                state['remaining_quantity'] = decode_decimal(remaining)
+                state['total_filled_amount'] = decode_decimal(total)
+                state['fees'] = decode_decimal(fees)
+                state['average_fill_price'] = decode_decimal(average)
+                if state['remaining_quantity'] == 0:
+                    book.pop(order_id, None)
+            elif record_type == REST:
+                state = placed.pop(fields[0], None)
+                if state is not None:
+                    if state['status'] == 'PENDING':
+                        state['status'] = 'OPEN'
+                    book[state['id']] = state
+            elif record_type in (CANCEL, EXPIRE):
+                book.pop(fields[0], None)
+                placed.pop(fields[0], None)
+            elif record_type == STOP:
+                state = placed.pop(fields[0], None)
+                if state is not None:
+                    state['status'] = 'PENDING'
+                    book[state['id']] = state
+            elif record_type == TRIGGER:
+                state = book.pop(fields[0], None)
+                if state is not None:
+                    placed[state['id']] = state
+
+        # Cut off a torn last write so new records follow the valid ones
+        if repair and os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > self.valid_length:
+            os.truncate(self.journal_path, self.valid_length)
+
+        self.sequence = self.committed_sequence = sequence
+        self.records_since_snapshot = sequence - snapshot_sequence
+        return book
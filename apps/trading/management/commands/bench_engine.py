@@ -0,0 +1,271 @@
+from django.core.management.base import BaseCommand
+import random
+import time
+import uuid
+from decimal import Decimal
+from django.db import connection, transaction
+from apps.users.models import User
+from apps.trading.engine import MatchingEngine, StatementCounter
+from apps.trading.models import Order, Trade, TradingPair, OrderSide, OrderType
+
+SCENARIOS = ['poisson', 'power-law', 'market-maker', 'sweep']
+
+
+class FlowGenerator:
+    """
+    Seeded synthetic order flow. Every generator returns a list of
+    (arrival seconds, action) where action is
+        ('place', order_type, side, price ticks or None, lots)
+        ('cancel', index of an earlier place)
+    Prices are integer ticks around a mid, sizes integer lots.
+    """
+
+    def __init__(self, seed: int, mid: int = 10000):
+        self.rng = random.Random(seed)
+        self.mid = mid
+
+    def generate(self, scenario: str, count: int, rate: float):
+        return getattr(self, scenario.replace('-', '_'))(count, rate)
+
+    def arrivals(self, count: int, rate: float):
+        """Poisson process: exponential inter-arrival times at rate per second"""
+        now = 0.0
+        for _ in range(count):
+            now += self.rng.expovariate(rate)
+            yield now
+
+    def limit_price(self, side: str, spread: int = 50) -> int:
+        """Passive-leaning limit price: mostly behind the mid, sometimes crossing"""
+        offset = int(abs(self.rng.gauss(0, spread / 2)))
+        if self.rng.random() < 0.3:
+            offset = -offset  # Marketable
+        return self.mid - offset if side == OrderSide.BUY else self.mid + offset
+
+    def side(self) -> str:
+        return OrderSide.BUY if self.rng.random() < 0.5 else OrderSide.SELL
+
+    def poisson(self, count: int, rate: float):
+        """Poisson arrivals of limit orders with uniform sizes and 10% cancels"""
+        flow = []
+        placed = 0
+        for arrival in self.arrivals(count, rate):
+            if placed and self.rng.random() < 0.1:
+                flow.append((arrival, ('cancel', self.rng.randrange(placed))))
+                continue
+            side = self.side()
+            flow.append((arrival, ('place', OrderType.LIMIT, side, self.limit_price(side), self.rng.randint(1, 100))))
+            placed += 1
+        return flow
+
+    def power_law(self, count: int, rate: float):
+        """Heavy-tailed sizes: most orders are small, a few are huge"""
+        flow = []
+        for arrival in self.arrivals(count, rate):
+            side = self.side()
+            lots = min(int(self.rng.paretovariate(1.2)), 100000)
+            if self.rng.random() < 0.15:
+                flow.append((arrival, ('place', OrderType.MARKET, side, None, lots)))
+            else:
+                flow.append((arrival, ('place', OrderType.LIMIT, side, self.limit_price(side), lots)))
+        return flow
+
+    def market_maker(self, count: int, rate: float):
+        """
+        Quotes at several levels each side that are cancelled and replaced
+        most of the time, with occasional takers trading against them.
+        """
+        flow = []
+        resting = []  # indexes of quotes that have not been cancelled
+        placed = 0
+        for arrival in self.arrivals(count, rate):
+            roll = self.rng.random()
+            if resting and roll < 0.6:
+                quote = resting.pop(self.rng.randrange(len(resting)))
+                flow.append((arrival, ('cancel', quote)))
+                continue
+            side = self.side()
+            if roll < 0.95:
+                level = self.rng.randint(1, 10)
+                price = self.mid - level if side == OrderSide.BUY else self.mid + level
+                flow.append((arrival, ('place', OrderType.LIMIT, side, price, self.rng.randint(1, 20))))
+                resting.append(placed)
+            else:
+                flow.append((arrival, ('place', OrderType.MARKET, side, None, self.rng.randint(1, 50))))
+            placed += 1
+        return flow
+
+    def sweep(self, count: int, rate: float):
+        """Deep book refilled by small makers and swept by large market orders"""
+        flow = []
+        for arrival in self.arrivals(count, rate):
+            side = self.side()
+            if self.rng.random() < 0.1:
+                flow.append((arrival, ('place', OrderType.MARKET, side, None, self.rng.randint(200, 2000))))
+            else:
+                offset = self.rng.randint(1, 200)
+                price = self.mid - offset if side == OrderSide.BUY else self.mid + offset
+                flow.append((arrival, ('place', OrderType.LIMIT, side, price, self.rng.randint(1, 20))))
+        return flow
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the matching engine on seeded synthetic order flow'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario',
+            nargs='+',
+            choices=SCENARIOS,
+            default=SCENARIOS,
+            help='Order flow generators to run'
+        )
+        parser.add_argument(
+            '--mode',
+            nargs='+',
+            choices=['memory', 'persistent'],
+            default=['memory', 'persistent'],
+            help='memory: match only, writes discarded; persistent: flush to the database'
+        )
+        parser.add_argument('--orders', type=int, default=20000, help='Actions per run')
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=2000,
+            help='Poisson arrival rate (orders/sec) used for queueing latency'
+        )
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'scenario':>13} {'mode':>10} {'actions':>8} {'orders/s':>10} "
+            f"{'p50 us':>9} {'p99 us':>9} {'p999 us':>9} {'queued p99 us':>14} "
+            f"{'queries':>8} {'trades':>7}"
+        )
+        for scenario in options['scenario']:
+            flow = FlowGenerator(options['seed']).generate(scenario, options['orders'], options['rate'])
+            for mode in options['mode']:
+                result = self.run(flow, persistent=(mode == 'persistent'))
+                self.report(scenario, mode, result)
+
+    def run(self, flow, persistent: bool) -> dict:
+        """
+        Replay a flow against a throwaway inactive pair, deleting it
+        afterwards. Each run gets its own symbol, so a pair left behind by
+        an interrupted run is no obstacle, and its trades are kept out of
+        the candle aggregator.
+        """
+        user, _ = User.objects.get_or_create(username='engine-bench')
+        pair = TradingPair.objects.create(
+            base_asset=f"B{uuid.uuid4().hex[:9].upper()}",
+            quote_asset='TEST',
+            min_trade_size=Decimal('0.01'),
+            price_precision=2,
+            is_active=False
+        )
+        try:
+            engine = MatchingEngine(pair, journal=False, candles=False)
+            if persistent:
+                return self.run_persistent(engine, flow, user, pair)
+            return self.run_in_memory(engine, flow, user, pair)
+        finally:
+            pair.delete()
+
+    def build_order(self, action, user, pair, **kwargs) -> Order:
+        _, order_type, side, ticks, lots = action
+        quantity = Decimal(lots).scaleb(-2)
+        return Order(
+            user=user,
+            trading_pair=pair,
+            order_type=order_type,
+            side=side,
+            price=Decimal(ticks).scaleb(-2) if ticks is not None else None,
+            quantity=quantity,
+            remaining_quantity=quantity,
+            **kwargs
+        )
+
+    def run_in_memory(self, engine, flow, user, pair) -> dict:
+        """Matching only: handlers run directly and their writes are discarded"""
+        orders = []
+        arrivals = []
+        latencies = []
+        trades = 0
+        for arrival, action in flow:
+            if action[0] == 'cancel':
+                target = orders[action[1]] if action[1] < len(orders) else None
+                if target is None:
+                    continue
+                started = time.perf_counter_ns()
+                engine.handle_cancel(target)
+            else:
+                order = self.build_order(action, user, pair, id=len(orders) + 1)
+                orders.append(order)
+                started = time.perf_counter_ns()
+                trades += len(engine.handle_order(order))
+            latencies.append(time.perf_counter_ns() - started)
+            arrivals.append(arrival)
+            engine.discard_pending()
+        return {'arrivals': arrivals, 'latencies': latencies, 'trades': trades, 'queries': 0}
+
+    def run_persistent(self, engine, flow, user, pair) -> dict:
+        """
+        Orders are inserted first, as the API does before handing them to
+        the engine; the timing covers matching plus the engine's flush.
+        """
+        orders = []
+        arrivals = []
+        latencies = []
+        queries = 0
+        for arrival, action in flow:
+            if action[0] == 'cancel':
+                target = orders[action[1]] if action[1] < len(orders) else None
+                if target is None:
+                    continue
+                handler, argument = engine.handle_cancel, target
+            else:
+                order = self.build_order(action, user, pair)
+                order.save()
+                orders.append(order)
+                handler, argument = engine.handle_order, order
+
+            counter = StatementCounter()
+            started = time.perf_counter_ns()
+            with connection.execute_wrapper(counter):
+                with transaction.atomic():
+                    handler(argument)
+                    engine.flush()
+            latencies.append(time.perf_counter_ns() - started)
+            arrivals.append(arrival)
+            queries += counter.count
+
+        trades = Trade.objects.filter(trading_pair=pair).count()
+        return {'arrivals': arrivals, 'latencies': latencies, 'trades': trades, 'queries': queries}
+
+    def report(self, scenario: str, mode: str, result: dict):
+        latencies = result['latencies']
+        total_seconds = sum(latencies) / 1e9
+        service = sorted(latencies)
+
+        # Single-writer queue fed by the flow's arrival times: how long an
+        # order waits for the sequencer plus its own processing time.
+        queued = []
+        busy_until = 0.0
+        for arrival, latency in zip(result['arrivals'], latencies):
+            finished = max(arrival, busy_until) + latency / 1e9
+            queued.append(finished - arrival)
+            busy_until = finished
+        queued.sort()
+
+        self.stdout.write(
+            f"{scenario:>13} {mode:>10} {len(latencies):>8} "
+            f"{len(latencies) / total_seconds if total_seconds else 0:>10.0f} "
+            f"{percentile(service, 0.5) / 1000:>9.1f} {percentile(service, 0.99) / 1000:>9.1f} "
+            f"{percentile(service, 0.999) / 1000:>9.1f} {percentile(queued, 0.99) * 1e6:>14.1f} "
+            f"{result['queries'] / len(latencies) if latencies else 0:>8.2f} {result['trades']:>7}"
+        )
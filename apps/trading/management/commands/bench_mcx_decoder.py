@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand, CommandError
+import json
+import random
+import time
+from decimal import Decimal
+from apps.trading.mcx_decoder import PRICE_COLUMNS, MCXDecoder, orjson
+from apps.trading.mcx_recording import read_recording
+
+
+def legacy_decode(message):
+    """The previous per-handler parsing: json.loads, then Decimal(str(x)) per price"""
+    ticks = []
+    for item in json.loads(message):
+        if len(item) < 10:
+            continue
+        ticks.append({
+            field: Decimal(str(item[index])) if item[index] not in ['', None] else None
+            for field, index in PRICE_COLUMNS
+        })
+    return ticks
+
+
+def synthetic_corpus(frames: int, symbols: int, seed: int):
+    """Frames in the feed's row format, every symbol quoted in each"""
+    rng = random.Random(seed)
+    prices = [rng.uniform(100, 80000) for _ in range(symbols)]
+    corpus = []
+    for n in range(frames):
+        rows = []
+        for i in range(symbols):
+            prices[i] = max(1.0, prices[i] * (1 + rng.gauss(0, 0.0005)))
+            last = round(prices[i], 2)
+            rows.append([
+                f"SYM{i}FUT", f"Symbol {i}",
+                round(last * 0.99, 2), round(last * 0.98, 2), round(last * 1.02, 2), round(last * 1.01, 2),
+                last, round(last - 0.05, 2), round(last + 0.05, 2),
+                f"17-10-2026 10:{n // 60 % 60:02d}:{n % 60:02d}", '',
+            ])
+        corpus.append(json.dumps(rows))
+    return corpus
+
+
+class Command(BaseCommand):
+    help = 'Compare the shared MCX decoder against the previous json + Decimal parsing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corpus',
+            help='A recording written by mcx_feed --record (directory or segment); synthetic if omitted'
+        )
+        parser.add_argument('--frames', type=int, default=2000, help='Synthetic frames')
+        parser.add_argument('--symbols', type=int, default=40, help='Instruments per synthetic frame')
+        parser.add_argument('--repeat', type=int, default=3, help='Passes over the corpus per implementation')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['corpus']:
+            corpus = self.read_corpus(options['corpus'])
+        else:
+            corpus = synthetic_corpus(options['frames'], options['symbols'], options['seed'])
+        if not corpus:
+            raise CommandError('The corpus has no frames')
+
+        decoder = MCXDecoder()
+        legacy = [legacy_decode(message) for message in corpus]
+        decoded = [decoder.decode(message) for message in corpus]
+        mismatches = sum(
+            1
+            for old_ticks, new_ticks in zip(legacy, decoded)
+            for old, new in zip(old_ticks, new_ticks)
+            if any(old[field] != new.price(field) for field, _ in PRICE_COLUMNS)
+        )
+        ticks = sum(len(ticks) for ticks in decoded)
+
+        self.stdout.write(
+            f"{len(corpus)} frames, {ticks} ticks, orjson {'on' if orjson is not None else 'off'}"
+        )
+        self.stdout.write(f"{'impl':>8} {'us/frame':>10} {'ns/tick':>10}")
+        for name, decode in (('legacy', legacy_decode), ('decoder', MCXDecoder().decode)):
+            best = None
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                for message in corpus:
+                    decode(message)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            self.stdout.write(
+                f"{name:>8} {best / len(corpus) * 1e6:>10.1f} {best / max(ticks, 1) * 1e9:>10.0f}"
+            )
+
+        if mismatches:
+            self.stdout.write(self.style.ERROR(f'{mismatches} ticks decode differently from the previous parsing'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Decoded prices match the previous parsing'))
+
+    def read_corpus(self, path):
+        try:
+            return [message for _, message in read_recording(path)]
+        except OSError as e:
+            raise CommandError(f'Cannot read {path}: {e}')
@@ -0,0 +1,165 @@
+from django.core.management.base import BaseCommand
+import random
+import time
+from decimal import Decimal
+from apps.trading.orderbook import BookSide
+
+
+class BenchOrder:
+    """Minimal stand-in for a resting Order"""
+    __slots__ = ('id', 'price', 'remaining_quantity')
+
+    def __init__(self, order_id, price, quantity):
+        self.id = order_id
+        self.price = price
+        self.remaining_quantity = quantity
+
+
+class LegacySide:
+    """The previous book layout: str(price) -> [orders], re-sorted on every match"""
+
+    def __init__(self, is_bid):
+        self.is_bid = is_bid
+        self.levels = {}
+
+    def add(self, order):
+        price = str(order.price)
+        if price not in self.levels:
+            self.levels[price] = []
+        self.levels[price].append(order)
+
+    def remove(self, order):
+        price = str(order.price)
+        if price in self.levels:
+            self.levels[price] = [o for o in self.levels[price] if o.id != order.id]
+            if not self.levels[price]:
+                del self.levels[price]
+
+    def take_best(self):
+        prices = sorted(self.levels.keys(), key=lambda x: Decimal(x), reverse=self.is_bid)
+        maker = self.levels[prices[0]][0]
+        self.remove(maker)
+        return maker
+
+    def snapshot(self):
+        return [
+            [Decimal(price), sum(o.remaining_quantity for o in self.levels[price])]
+            for price in sorted(self.levels.keys(), key=lambda x: Decimal(x), reverse=self.is_bid)
+        ]
+
+
+class SortedSide:
+    """Adapter giving BookSide the same interface as LegacySide"""
+
+    def __init__(self, is_bid, tick_scale):
+        self.side = BookSide(is_bid=is_bid)
+        self.tick_scale = tick_scale
+
+    def add(self, order):
+        ticks = int(order.price * self.tick_scale)
+        self.side.add(order, ticks, order.price, order.remaining_quantity)
+
+    def take_best(self):
+        level = self.side.best()
+        maker = level.head.order
+        self.side.remove(level.head)
+        return maker
+
+    def snapshot(self):
+        return [
+            [level.price, sum(o.remaining_quantity for o in level)]
+            for level in self.side
+        ]
+
+
+class Command(BaseCommand):
+    help = 'Compare the sorted price-level book against the previous dict-of-lists layout'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--orders',
+            type=int,
+            nargs='+',
+            default=[10000, 100000],
+            help='Resting book sizes to benchmark'
+        )
+        parser.add_argument(
+            '--levels',
+            type=int,
+            default=1000,
+            help='Number of distinct price levels the resting orders are spread over'
+        )
+        parser.add_argument(
+            '--matches',
+            type=int,
+            default=1000,
+            help='Incoming orders matched against the best level per run'
+        )
+        parser.add_argument(
+            '--snapshots',
+            type=int,
+            default=10,
+            help='Full book snapshots taken per run'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        precision = 2
+        tick_scale = 10 ** precision
+        self.stdout.write(
+            f"{'orders':>8} {'impl':>7} {'build ms':>10} {'match us/op':>12} {'snapshot ms':>12}"
+        )
+
+        for size in options['orders']:
+            rng = random.Random(options['seed'])
+            orders = [
+                BenchOrder(
+                    order_id,
+                    Decimal(10000 + rng.randrange(options['levels'])).scaleb(-precision),
+                    Decimal(rng.randint(1, 100))
+                )
+                for order_id in range(size)
+            ]
+            refill = [
+                BenchOrder(
+                    size + n,
+                    Decimal(10000 + rng.randrange(options['levels'])).scaleb(-precision),
+                    Decimal(1)
+                )
+                for n in range(options['matches'])
+            ]
+
+            results = {}
+            for name, factory in (
+                ('legacy', lambda: LegacySide(is_bid=False)),
+                ('sorted', lambda: SortedSide(is_bid=False, tick_scale=tick_scale)),
+            ):
+                side = factory()
+
+                started = time.perf_counter()
+                for order in orders:
+                    side.add(order)
+                build = time.perf_counter() - started
+
+                # Each incoming order consumes the best maker and a new maker
+                # arrives, so the book size stays constant across the run.
+                started = time.perf_counter()
+                for order in refill:
+                    side.take_best()
+                    side.add(order)
+                match = time.perf_counter() - started
+
+                started = time.perf_counter()
+                for _ in range(options['snapshots']):
+                    snapshot = side.snapshot()
+                snap = time.perf_counter() - started
+
+                results[name] = snapshot
+                self.stdout.write(
+                    f"{size:>8} {name:>7} {build * 1000:>10.1f} "
+                    f"{match / options['matches'] * 1e6:>12.1f} "
+                    f"{snap / options['snapshots'] * 1000:>12.2f}"
+                )
+
+            if [level[0] for level in results['legacy']] != [level[0] for level in results['sorted']]:
+                self.stdout.write(self.style.ERROR('Level ordering differs between implementations'))
@@ -0,0 +1,126 @@
+from django.core.management.base import BaseCommand, CommandError
+import random
+from decimal import Decimal
+from django.db import transaction
+from apps.users.models import User
+from apps.trading.engine import MatchingEngine
+from apps.trading.models import Order, Trade, TradingPair, OrderType, OrderSide
+
+
+class Command(BaseCommand):
+    help = 'Check that fixed-point matching produces exactly the same results as the Decimal path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000, help='Orders to replay per run')
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument('--price-precision', type=int, default=2)
+        parser.add_argument('--min-trade-size', default='0.01')
+
+    def handle(self, *args, **options):
+        flow = self.generate_flow(options)
+
+        results = {}
+        for fixed_point in (False, True):
+            results[fixed_point] = self.run(flow, options, fixed_point)
+
+        mismatches = 0
+        for section in ('trades', 'orders', 'book'):
+            expected, actual = results[False][section], results[True][section]
+            if len(expected) != len(actual):
+                self.stdout.write(self.style.ERROR(
+                    f"{section}: {len(expected)} rows on the Decimal path, {len(actual)} in fixed-point"
+                ))
+                mismatches += 1
+                continue
+            for index, (left, right) in enumerate(zip(expected, actual)):
+                if left != right:
+                    mismatches += 1
+                    if mismatches <= 20:
+                        self.stdout.write(self.style.ERROR(f"{section}[{index}]: {left} != {right}"))
+
+        summary = (
+            f"{len(flow)} orders, {len(results[False]['trades'])} trades, "
+            f"{len(results[False]['book'])} resting levels compared"
+        )
+        if mismatches:
+            raise CommandError(f"{mismatches} mismatches ({summary})")
+        self.stdout.write(self.style.SUCCESS(f"Fixed-point matches Decimal path: {summary}"))
+
+    def generate_flow(self, options):
+        """Seeded mix of limit, market and cancel instructions"""
+        rng = random.Random(options['seed'])
+        price_step = Decimal(1).scaleb(-options['price_precision'])
+        lot = Decimal(options['min_trade_size'])
+        mid = 10000
+
+        flow = []
+        for index in range(options['orders']):
+            roll = rng.random()
+            if roll < 0.1 and index:
+                flow.append(('cancel', rng.randrange(index)))
+                continue
+            side = OrderSide.BUY if rng.random() < 0.5 else OrderSide.SELL
+            quantity = lot * rng.randint(1, 500)
+            if roll < 0.25:
+                flow.append(('order', OrderType.MARKET, side, None, quantity))
+            else:
+                offset = rng.randint(-50, 50)
+                flow.append(('order', OrderType.LIMIT, side, price_step * (mid + offset), quantity))
+        return flow
+
+    def run(self, flow, options, fixed_point):
+        """Replay the flow against a throwaway pair and roll everything back"""
+        with transaction.atomic():
+            user = User.objects.create(username='engine-conformance')
+            pair = TradingPair.objects.create(
+                base_asset='CONFORM',
+                quote_asset='TEST',
+                min_trade_size=Decimal(options['min_trade_size']),
+                price_precision=options['price_precision']
+            )
+            engine = MatchingEngine(pair, fixed_point=fixed_point, journal=False)
+
+            orders = []
+            for step in flow:
+                if step[0] == 'cancel':
+                    if step[1] < len(orders):
+                        engine.cancel_order(orders[step[1]])
+                    continue
+                _, order_type, side, price, quantity = step
+                order = Order.objects.create(
+                    user=user,
+                    trading_pair=pair,
+                    order_type=order_type,
+                    side=side,
+                    price=price,
+                    quantity=quantity,
+                    remaining_quantity=quantity
+                )
+                orders.append(order)
+                engine.process_order(order)
+
+            position = {order.id: index for index, order in enumerate(orders)}
+            result = {
+                'trades': [
+                    (
+                        position[trade.maker_order_id], position[trade.taker_order_id],
+                        trade.price, trade.quantity, trade.maker_fee, trade.taker_fee
+                    )
+                    for trade in Trade.objects.filter(trading_pair=pair).order_by('id')
+                ],
+                'orders': [
+                    (
+                        position[order.id], order.status, order.filled_quantity,
+                        order.remaining_quantity, order.total_filled_amount,
+                        order.fees, order.average_fill_price
+                    )
+                    for order in Order.objects.filter(trading_pair=pair).order_by('id')
+                ],
+                'book': [
+                    (side, price, quantity)
+                    for side in ('bids', 'asks')
+                    for price, quantity in engine.get_order_book_snapshot()[side]
+                ],
+            }
+            transaction.set_rollback(True)
+        return result
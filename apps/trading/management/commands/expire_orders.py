@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+import time
+from django.db import close_old_connections
+from apps.trading.engine import expire_stored_orders
+
+
+class Command(BaseCommand):
+    help = 'Expire stored orders whose expires_at has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Keep sweeping every INTERVAL seconds instead of running once'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Orders expired per UPDATE'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_stored_orders(batch_size=options['batch_size'])
+            self.stdout.write(f"Expired {expired} orders")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+            close_old_connections()
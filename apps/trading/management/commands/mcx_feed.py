@@ -1,11 +1,20 @@
 from django.core.management.base import BaseCommand
 import asyncio
 import websockets
-import json
 import logging
+import time
 from django.utils import timezone
-from decimal import Decimal
-from apps.trading.models import TradingPair
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from apps.trading.candles import candle_aggregator
+from apps.trading.engine import MARKET_PRICE_CHANNEL
+from apps.trading.events import apublish_market_data
+from apps.trading.mcx_decoder import MCXDecoder
+from apps.trading.mcx_recording import TickRecorder
+from apps.trading.mcx_upstream import MCX_WS_URL
+from apps.trading.quotes import quote_writer
+from apps.trading.symbols import MARKET_DATA_FIELDS, symbol_cache
+from apps.trading.tick_history import tick_history_writer
 
 logger = logging.getLogger(__name__)
 
@@ -18,15 +27,51 @@ class Command(BaseCommand):
             action='store_true',
             help='Show detailed output'
         )
+        parser.add_argument(
+            '--url',
+            default=MCX_WS_URL,
+            help="Feed WebSocket URL; defaults to MCX_FEED['URL']"
+        )
+        parser.add_argument(
+            '--record',
+            metavar='PATH',
+            help='Also write every received frame to rotating gzip segments in this directory'
+        )
+        parser.add_argument(
+            '--no-history',
+            action='store_true',
+            help='Do not append ticks to the tick history'
+        )
 
     def handle(self, *args, **options):
         self.verbose = options['verbose']
+        self.decoder = MCXDecoder()
         self.stdout.write('Starting MCX market data feed...')
-        asyncio.run(self.run_websocket())
+        self.channel_layer = get_channel_layer()
+        if isinstance(self.channel_layer, InMemoryChannelLayer):
+            # The engines and clients live in the web process; an in-memory layer cannot reach them
+            self.stdout.write(self.style.WARNING(
+                'In-memory channel layer: ticks will not reach market data clients '
+                'and last prices will not trigger stop orders'
+            ))
+            self.channel_layer = None
+        self.url = options['url']
+        self.recorder = TickRecorder(options['record']) if options['record'] else None
+        self.history = not options['no_history']
+        symbol_cache.load()
+        try:
+            asyncio.run(self.run_websocket())
+        finally:
+            if self.recorder is not None:
+                self.recorder.close()
+                self.stdout.write(f'Recorded {self.recorder.frames} frames in {self.recorder.segments} segments')
 
     async def run_websocket(self):
         """Run the WebSocket connection"""
-        ws_url = "ws://78.46.93.146:8084"
+        ws_url = self.url
+        quote_writer.start()
+        if self.history:
+            tick_history_writer.start()
         
         while True:
             try:
@@ -36,7 +81,10 @@ class Command(BaseCommand):
                     while True:
                         try:
                             message = await websocket.recv()
-                            await self.process_message(message)
+                            received = time.time()
+                            if self.recorder is not None:
+                                self.recorder.write(message, received)
+                            await self.process_message(message, received)
                         except websockets.ConnectionClosed:
                             self.stdout.write(self.style.WARNING('Connection closed, reconnecting...'))
                             break
@@ -49,86 +97,75 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.ERROR(f'Connection failed: {str(e)}'))
                 await asyncio.sleep(5)  # Wait before retrying
 
-    async def process_message(self, message):
-        """Process incoming market data message"""
+    async def process_message(self, message, received=None):
+        """Process incoming market data message received at the given epoch time"""
         try:
-            data = json.loads(message)
-            for item in data:
-                if len(item) < 10:
-                    continue
+            ticks = self.decoder.decode(message)
+        except ValueError:
+            logger.error("Invalid JSON message received")
+            return
+        except Exception as e:
+            logger.error(f"Error decoding MCX message: {str(e)}")
+            return
+        for tick in ticks:
+            symbol = tick.symbol
+            try:
+                # Update or create trading pair
+                base_asset = symbol.replace('FUT', '').strip()
+                quote_asset = 'INR'
                 
-                # Extract data from message
-                symbol = item[0]
-                name = item[1]
+                pair = await self.get_or_create_pair(base_asset, quote_asset)
+                await self.update_pair_data(pair, **tick.fields())
+                if self.history:
+                    tick_history_writer.put(pair.id, tick, received)
+                candle_aggregator.add_tick(pair.id, tick, received)
+                last_price = tick.price('last_price')
+                await self.publish_price(pair, last_price)
+                await apublish_market_data(self.channel_layer, pair)
                 
-                try:
-                    # Handle potential invalid decimal values
-                    open_price = Decimal(str(item[2])) if item[2] not in ['', None] else None
-                    low_price = Decimal(str(item[3])) if item[3] not in ['', None] else None
-                    high_price = Decimal(str(item[4])) if item[4] not in ['', None] else None
-                    close_price = Decimal(str(item[5])) if item[5] not in ['', None] else None
-                    last_price = Decimal(str(item[6])) if item[6] not in ['', None] else None
-                    bid_price = Decimal(str(item[7])) if item[7] not in ['', None] else None
-                    ask_price = Decimal(str(item[8])) if item[8] not in ['', None] else None
-                    timestamp = item[9]
-                    
-                    # Update or create trading pair
-                    base_asset = symbol.replace('FUT', '').strip()
-                    quote_asset = 'INR'
-                    
-                    pair = await self.get_or_create_pair(base_asset, quote_asset)
-                    await self.update_pair_data(
-                        pair,
-                        last_price=last_price,
-                        bid_price=bid_price,
-                        ask_price=ask_price,
-                        high_price=high_price,
-                        low_price=low_price,
-                        open_price=open_price,
-                        close_price=close_price,
-                        timestamp=timestamp
-                    )
-                    
-                    if self.verbose:
-                        self.stdout.write(
-                            self.style.SUCCESS(
-                                f'Updated {symbol}: Last: {last_price}, Bid: {bid_price}, Ask: {ask_price}'
-                            )
+                if self.verbose:
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            f'Updated {symbol}: Last: {last_price}, '
+                            f'Bid: {tick.price("bid_price")}, Ask: {tick.price("ask_price")}'
                         )
-                        
-                except Exception as e:
-                    logger.error(f"Error updating {symbol}: {str(e)}")
+                    )
                     
-        except json.JSONDecodeError:
-            logger.error("Invalid JSON message received")
-        except Exception as e:
-            logger.error(f"Error processing message: {str(e)}")
+            except Exception as e:
+                logger.error(f"Error updating {symbol}: {str(e)}")
 
     async def get_or_create_pair(self, base_asset, quote_asset):
-        """Get or create trading pair"""
+        """Get or create trading pair, through the symbol cache"""
         try:
-            pair = await TradingPair.objects.aget_or_create(
-                base_asset=base_asset,
-                quote_asset=quote_asset,
-                defaults={
-                    'min_trade_size': Decimal('0.01'),
-                    'price_precision': 2,
-                    'is_active': True
-                }
-            )
-            return pair[0]
+            return await symbol_cache.aget_or_create(base_asset, quote_asset)
         except Exception as e:
             logger.error(f"Error getting/creating pair: {str(e)}")
             raise
 
+    async def publish_price(self, pair, last_price):
+        """Send the last price to the matching engines for stop triggers"""
+        if self.channel_layer is None or last_price is None:
+            return
+        try:
+            await self.channel_layer.send(MARKET_PRICE_CHANNEL, {
+                'type': 'market.price',
+                'trading_pair_id': pair.id,
+                'last_price': str(last_price)
+            })
+        except ChannelFull:
+            logger.warning(f"Engine price channel is full, dropped {pair} at {last_price}")
+
     async def update_pair_data(self, pair, **kwargs):
         """Update trading pair with new market data"""
         try:
+            updates = {'last_updated': timezone.now()}
             for key, value in kwargs.items():
-                if value is not None:  # Only update if value is not None
-                    setattr(pair, key, value)
-            pair.last_updated = timezone.now()
-            await pair.asave()
+                if value is not None and key in MARKET_DATA_FIELDS:  # Only update if value is not None
+                    updates[key] = value
+            for key, value in updates.items():
+                setattr(pair, key, value)
+            # Written by the quote writer's next bulk flush, not per tick
+            quote_writer.put(pair, updates)
         except Exception as e:
             logger.error(f"Error updating pair data: {str(e)}")
             raise
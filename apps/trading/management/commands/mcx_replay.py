@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand, CommandError
+import asyncio
+import time
+import websockets
+from apps.trading.mcx_recording import read_recording, recording_segments
+
+
+def parse_speed(value: str):
+    """'10x' or '10' -> 10.0; 'max' -> None (no pacing)"""
+    if value == 'max':
+        return None
+    try:
+        speed = float(value[:-1] if value.endswith('x') else value)
+    except ValueError:
+        raise CommandError(f"Invalid speed {value!r}: use e.g. 1x, 10x or max")
+    if speed <= 0:
+        raise CommandError('Speed must be positive')
+    return speed
+
+
+class Command(BaseCommand):
+    help = 'Serve a recorded MCX capture from a local WebSocket server, for offline feed load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='A recording directory written by mcx_feed --record, or one segment')
+        parser.add_argument(
+            '--speed',
+            default='1x',
+            help="Replay rate relative to the recording, e.g. 1x or 10x; 'max' sends as fast as the client reads"
+        )
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8084)
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Start over at the end of the recording instead of closing the connection'
+        )
+
+    def handle(self, *args, **options):
+        self.path = options['path']
+        self.speed = parse_speed(options['speed'])
+        self.loop = options['loop']
+        if not recording_segments(self.path):
+            raise CommandError(f'No recording segments in {self.path}')
+        asyncio.run(self.serve(options['host'], options['port']))
+
+    async def serve(self, host, port):
+        async with websockets.serve(self.replay, host, port):
+            self.stdout.write(self.style.SUCCESS(
+                f"Replaying {self.path} on ws://{host}:{port} at "
+                f"{'max speed' if self.speed is None else f'{self.speed:g}x'}"
+            ))
+            await asyncio.Future()
+
+    async def replay(self, websocket):
+        """
+        Send the recording to one client, every connection from its start.
+        Frames keep their recorded spacing divided by the speed; a client
+        that cannot keep up falls behind the schedule rather than losing
+        frames.
+        """
+        client = websocket.remote_address
+        self.stdout.write(f'Client connected: {client}')
+        frames = 0
+        started = time.monotonic()
+        try:
+            while True:
+                first = None
+                pass_started = time.monotonic()
+                for received, message in read_recording(self.path):
+                    if first is None:
+                        first = received
+                    if self.speed is not None:
+                        delay = (received - first) / self.speed - (time.monotonic() - pass_started)
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    await websocket.send(message)
+                    frames += 1
+                if not self.loop:
+                    break
+        except websockets.ConnectionClosed:
+            pass
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Sent {frames} frames to {client} in {elapsed:.1f}s '
+            f'({frames / elapsed if elapsed else 0:.0f} frames/s)'
+        )
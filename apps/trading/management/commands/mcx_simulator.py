@@ -0,0 +1,215 @@
+from django.core.management.base import BaseCommand, CommandError
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+import websockets
+
+logger = logging.getLogger(__name__)
+
+TICK_SIZE = 0.05
+
+
+class RandomWalk:
+    """
+    One synthetic contract: the last price moves by a Gaussian log-return
+    per tick, rounded to TICK_SIZE, with a one-tick spread and running
+    session open/high/low against a fixed previous close.
+    """
+
+    def __init__(self, symbol: str, price: float, volatility: float, rng: random.Random):
+        self.symbol = symbol
+        self.rng = rng
+        self.volatility = volatility
+        self.last = self.round(price)
+        self.open = self.high = self.low = self.close = self.last
+
+    @staticmethod
+    def round(price: float) -> float:
+        return round(max(TICK_SIZE, round(price / TICK_SIZE) * TICK_SIZE), 2)
+
+    def step(self, timestamp: str) -> list:
+        """Move the price and return the contract's row in the feed's format"""
+        self.last = self.round(self.last * math.exp(self.rng.gauss(0, self.volatility)))
+        self.high = max(self.high, self.last)
+        self.low = min(self.low, self.last)
+        return [
+            self.symbol, f"{self.symbol} synthetic",
+            self.open, self.low, self.high, self.close,
+            self.last, self.round(self.last - TICK_SIZE), self.round(self.last + TICK_SIZE),
+            timestamp, '',
+        ]
+
+
+class Command(BaseCommand):
+    help = 'Serve synthetic MCX-format ticks from a local WebSocket server, for load and soak tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8084)
+        parser.add_argument('--symbols', type=int, default=20, help='Number of contracts')
+        parser.add_argument('--rate', type=float, default=10, help='Messages per second')
+        parser.add_argument(
+            '--batch',
+            type=int,
+            default=5,
+            help='Contract rows per message, taken round-robin'
+        )
+        parser.add_argument('--volatility', type=float, default=0.0005, help='Per-tick log-return deviation')
+        parser.add_argument(
+            '--burst-every',
+            type=float,
+            default=0,
+            help='Seconds between bursts; 0 disables them'
+        )
+        parser.add_argument('--burst-duration', type=float, default=2, help='Seconds a burst lasts')
+        parser.add_argument('--burst-factor', type=float, default=10, help='Rate multiplier during a burst')
+        parser.add_argument(
+            '--disconnect-every',
+            type=float,
+            default=0,
+            help='Seconds between dropping every client connection; 0 disables it'
+        )
+        parser.add_argument(
+            '--abort',
+            action='store_true',
+            help='Drop connections without a close handshake, as a network failure would'
+        )
+        parser.add_argument(
+            '--latency-stamps',
+            action='store_true',
+            help='Send the epoch send time as the row timestamp, for tick-to-client latency'
+        )
+        parser.add_argument(
+            '--probe',
+            metavar='URL',
+            help='Also connect to this market data WebSocket (e.g. ws://127.0.0.1:8000/ws/trading/mcx-feed/) '
+                 'and report tick-to-client latency; implies --latency-stamps'
+        )
+        parser.add_argument('--report-every', type=float, default=5, help='Seconds between stats lines')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['symbols'] < 1 or options['rate'] <= 0:
+            raise CommandError('--symbols and --rate must be positive')
+        self.options = options
+        self.latency_stamps = options['latency_stamps'] or bool(options['probe'])
+        rng = random.Random(options['seed'])
+        self.contracts = [
+            RandomWalk(f"SIM{i:03d}FUT", rng.uniform(100, 80000), options['volatility'], rng)
+            for i in range(options['symbols'])
+        ]
+        self.batch = max(1, min(options['batch'], len(self.contracts)))
+        self.clients = set()
+        self.sent = 0
+        self.disconnects = 0
+        self.latencies = []
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        options = self.options
+        async with websockets.serve(self.register, options['host'], options['port']):
+            self.stdout.write(self.style.SUCCESS(
+                f"Simulating {len(self.contracts)} contracts at {options['rate']:g} messages/s "
+                f"on ws://{options['host']}:{options['port']}"
+            ))
+            tasks = [self.generate(), self.report()]
+            if options['disconnect_every']:
+                tasks.append(self.inject_disconnects())
+            if options['probe']:
+                tasks.append(self.probe(options['probe']))
+            await asyncio.gather(*tasks)
+
+    async def register(self, websocket):
+        self.clients.add(websocket)
+        try:
+            await websocket.wait_closed()
+        finally:
+            self.clients.discard(websocket)
+
+    def current_rate(self, elapsed: float) -> float:
+        options = self.options
+        if options['burst_every'] and elapsed % options['burst_every'] >= options['burst_every'] - options['burst_duration']:
+            return options['rate'] * options['burst_factor']
+        return options['rate']
+
+    def frame(self) -> str:
+        if self.latency_stamps:
+            timestamp = f"{time.time():.6f}"
+        else:
+            timestamp = time.strftime('%d-%m-%Y %H:%M:%S')
+        rows = []
+        for _ in range(self.batch):
+            contract = self.contracts[self.sent % len(self.contracts)]
+            rows.append(contract.step(timestamp))
+            self.sent += 1
+        return json.dumps(rows)
+
+    async def generate(self):
+        """
+        Broadcast messages on an absolute schedule, so the rate holds on
+        average however long each send takes. Slow clients are not waited
+        for: their buffers grow as a slow feed handler's would.
+        """
+        started = time.monotonic()
+        due = started
+        while True:
+            now = time.monotonic()
+            # Behind schedule still yields, so clients and reports are served
+            await asyncio.sleep(max(0, due - now))
+            if self.clients:
+                websockets.broadcast(self.clients, self.frame())
+            due += 1 / self.current_rate(due - started)
+
+    async def inject_disconnects(self):
+        while True:
+            await asyncio.sleep(self.options['disconnect_every'])
+            clients = list(self.clients)
+            for websocket in clients:
+                if self.options['abort']:
+                    websocket.transport.abort()
+                else:
+                    await websocket.close(code=1012, reason='Simulated restart')
+            self.disconnects += len(clients)
+            self.stdout.write(self.style.WARNING(f'Dropped {len(clients)} connections'))
+
+    async def probe(self, url):
+        """A market data client measuring the time from a tick's send to its arrival"""
+        while True:
+            try:
+                async with websockets.connect(url) as websocket:
+                    async for message in websocket:
+                        received = time.time()
+                        data = json.loads(message)
+                        try:
+                            sent = float(data['data']['timestamp'])
+                        except (KeyError, TypeError, ValueError):
+                            continue
+                        self.latencies.append(received - sent)
+            except Exception as e:
+                logger.error(f"Latency probe connection to {url} failed: {str(e)}")
+            await asyncio.sleep(1)
+
+    async def report(self):
+        every = self.options['report_every']
+        last_sent = 0
+        while True:
+            await asyncio.sleep(every)
+            line = (
+                f"clients {len(self.clients)}, rows {self.sent}, "
+                f"{(self.sent - last_sent) / every:.0f} rows/s, disconnects {self.disconnects}"
+            )
+            last_sent = self.sent
+            if self.latencies:
+                latencies = sorted(self.latencies)
+                self.latencies = []
+
+                def percentile(p):
+                    return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+                line += (
+                    f", latency ms p50 {percentile(0.5):.1f} p99 {percentile(0.99):.1f} "
+                    f"max {latencies[-1] * 1000:.1f} ({len(latencies)} ticks)"
+                )
+            self.stdout.write(line)
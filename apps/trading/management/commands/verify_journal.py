@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from apps.trading.engine import STOP_ORDER_TYPES
+from apps.trading.journal import EngineJournal, decode_decimal, encode_decimal
+from apps.trading.models import Order, OrderStatus, OrderType, TradingPair
+
+# Fields compared between a recovered order and its database row
+COMPARED_FIELDS = (
+    'status', 'side', 'price', 'quantity', 'remaining_quantity', 'filled_quantity',
+    'total_filled_amount', 'fees', 'average_fill_price'
+)
+
+
+def normalize(value):
+    """Bring Decimals to the journal's precision so both sides compare exactly"""
+    if hasattr(value, 'as_tuple'):
+        return decode_decimal(encode_decimal(value))
+    return value
+
+
+class Command(BaseCommand):
+    help = 'Check that the book and stops recovered from each pair journal match the open orders in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pair', type=int, nargs='*', help='Trading pair ids (default: all)')
+        parser.add_argument('--show', type=int, default=20, help='Mismatches to print per pair')
+
+    def handle(self, *args, **options):
+        pairs = TradingPair.objects.all().order_by('id')
+        if options['pair']:
+            pairs = pairs.filter(id__in=options['pair'])
+
+        checked = 0
+        failed = 0
+        for pair in pairs:
+            journal = EngineJournal.for_pair(pair.id)
+            if not journal.has_state():
+                continue
+            checked += 1
+
+            recovered = journal.recover(repair=False)
+            stored = {
+                order.id: order
+                for order in Order.objects.filter(
+                    Q(status__in=[OrderStatus.OPEN, OrderStatus.PARTIALLY_FILLED]) |
+                    Q(status=OrderStatus.PENDING, order_type__in=STOP_ORDER_TYPES),
+                    trading_pair=pair
+                ).exclude(order_type=OrderType.MARKET)  # Partly filled market orders never rest
+            }
+
+            problems = []
+            for order_id in sorted(recovered.keys() - stored.keys()):
+                problems.append(f"order {order_id} rests in the journal but not in the database")
+            for order_id in sorted(stored.keys() - recovered.keys()):
+                problems.append(f"order {order_id} is open in the database but not in the journal")
+            for order_id in sorted(recovered.keys() & stored.keys()):
+                state, order = recovered[order_id], stored[order_id]
+                for field in COMPARED_FIELDS:
+                    expected, actual = normalize(getattr(order, field)), normalize(state[field])
+                    if expected != actual:
+                        problems.append(f"order {order_id} {field}: database {expected}, journal {actual}")
+
+            if problems:
+                failed += 1
+                self.stdout.write(self.style.ERROR(
+                    f"{pair}: {len(problems)} differences between journal and database"
+                ))
+                for problem in problems[:options['show']]:
+                    self.stdout.write(f"  {problem}")
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{pair}: {len(recovered)} resting orders match (journal sequence {journal.sequence})"
+                ))
+
+        if not checked:
+            self.stdout.write('No journals found')
+        elif failed:
+            raise CommandError(f"{failed} of {checked} journals differ from the database")
@@ -0,0 +1,176 @@
+import json
+import logging
+from decimal import Decimal
+from typing import List, Optional
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+FEED_SETTINGS = getattr(settings, 'MCX_FEED', {})
+
+# Prices are carried as integers of this many decimal places between the
+# feed and the quote writer; MCX quotes have at most two
+PRICE_DIGITS = FEED_SETTINGS.get('PRICE_DIGITS', 4)
+PRICE_SCALE = 10 ** PRICE_DIGITS
+
+# Row layout: [symbol, name, open, low, high, close, ltp, bid, ask, timestamp, ...]
+ROW_LENGTH = 10
+
+# TradingPair field -> row index of the prices a tick carries
+PRICE_COLUMNS = (
+    ('open_price', 2),
+    ('low_price', 3),
+    ('high_price', 4),
+    ('close_price', 5),
+    ('last_price', 6),
+    ('bid_price', 7),
+    ('ask_price', 8),
+)
+
+
+def loads(message):
+    """Parse a raw feed frame, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(message)
+    return json.loads(message)
+
+
+def to_ticks(value) -> Optional[int]:
+    """
+    A feed price as an integer of PRICE_DIGITS places; None for the empty
+    values the feed sends for untraded contracts. Prices are a few integer
+    digits, well inside float precision, so rounding the float is exact.
+    """
+    if value is None or value == '':
+        return None
+    return round(float(value) * PRICE_SCALE)
+
+
+def ticks_to_str(ticks: int) -> str:
+    """A scaled price as a plain decimal string, without trailing zeros"""
+    sign = '-' if ticks < 0 else ''
+    whole, fraction = divmod(abs(ticks), PRICE_SCALE)
+    if not fraction:
+        return f"{sign}{whole}"
+    return f"{sign}{whole}.{fraction:0{PRICE_DIGITS}d}".rstrip('0')
+
+
+def ticks_to_decimal(ticks: int) -> Decimal:
+    return Decimal(ticks).scaleb(-PRICE_DIGITS)
+
+
+class MCXTick:
+    """
+    One instrument row of a feed frame. Prices are scaled integers (see
+    PRICE_DIGITS), None where the feed sent nothing; Decimals and strings
+    are only built when a tick leaves the feed handler.
+    """
+    __slots__ = (
+        'symbol', 'name', 'open_price', 'low_price', 'high_price', 'close_price',
+        'last_price', 'bid_price', 'ask_price', 'timestamp',
+    )
+
+    def __init__(self, symbol, name, open_price, low_price, high_price, close_price,
+                 last_price, bid_price, ask_price, timestamp):
+        self.symbol = symbol
+        self.name = name
+        self.open_price = open_price
+        self.low_price = low_price
+        self.high_price = high_price
+        self.close_price = close_price
+        self.last_price = last_price
+        self.bid_price = bid_price
+        self.ask_price = ask_price
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_row(cls, row) -> 'MCXTick':
+        """Decode one row; raises ValueError, TypeError or OverflowError for malformed prices"""
+        return cls(
+            row[0], row[1],
+            to_ticks(row[2]), to_ticks(row[3]), to_ticks(row[4]), to_ticks(row[5]),
+            to_ticks(row[6]), to_ticks(row[7]), to_ticks(row[8]),
+            row[9],
+        )
+
+    def price(self, field: str) -> Optional[Decimal]:
+        ticks = getattr(self, field)
+        return ticks_to_decimal(ticks) if ticks is not None else None
+
+    def fields(self) -> dict:
+        """The prices the tick carries, as TradingPair market data fields"""
+        return {
+            field: ticks_to_decimal(getattr(self, field))
+            for field, _ in PRICE_COLUMNS
+            if getattr(self, field) is not None
+        }
+
+    def frame_data(self) -> dict:
+        """The 'data' of a market_data client frame; absent prices are None"""
+        def text(ticks):
+            return ticks_to_str(ticks) if ticks is not None else None
+        return {
+            'last_price': text(self.last_price),
+            'bid': text(self.bid_price),
+            'ask': text(self.ask_price),
+            'high': text(self.high_price),
+            'low': text(self.low_price),
+            'open': text(self.open_price),
+            'close': text(self.close_price),
+            'timestamp': self.timestamp,
+        }
+
+
+class MCXDecoder:
+    """
+    Turns raw MCX frames into MCXTick records, shared by the MCX upstream
+    and the mcx_feed command. Short rows are skipped and rows with
+    malformed prices are logged and skipped without losing the rest of the
+    frame; both are counted. A frame that is not a list of rows, and rows
+    that are not lists, count as rejected.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.ticks = 0
+        self.skipped = 0
+        self.rejected = 0
+
+    def decode(self, message) -> List[MCXTick]:
+        """Decode a frame; raises ValueError if it is not JSON"""
+        rows = loads(message)
+        self.frames += 1
+        if not isinstance(rows, (list, tuple)):
+            self.rejected += 1
+            logger.error(f"Invalid MCX frame: expected a list of rows, got {type(rows).__name__}")
+            return []
+        ticks = []
+        for row in rows:
+            if not isinstance(row, (list, tuple)):
+                self.rejected += 1
+                logger.error(f"Invalid MCX row: expected a list, got {type(row).__name__}")
+                continue
+            if len(row) < ROW_LENGTH:
+                self.skipped += 1
+                continue
+            try:
+                ticks.append(MCXTick.from_row(row))
+            except (ValueError, TypeError, OverflowError) as e:
+                self.rejected += 1
+                logger.error(f"Invalid MCX row for {row[0]}: {str(e)}")
+        self.ticks += len(ticks)
+        return ticks
+
+    def get_metrics(self) -> dict:
+        return {
+            'orjson': orjson is not None,
+            'frames': self.frames,
+            'ticks': self.ticks,
+            'skipped': self.skipped,
+            'rejected': self.rejected,
+        }
@@ -0,0 +1,103 @@
+import gzip
+import logging
+import os
+import time
+from typing import Iterator, List, Tuple
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+FEED_SETTINGS = getattr(settings, 'MCX_FEED', {})
+
+# A segment is closed and a new one started after this many uncompressed bytes
+SEGMENT_BYTES = FEED_SETTINGS.get('RECORD_SEGMENT_BYTES', 64 * 1024 * 1024)
+
+SEGMENT_SUFFIX = '.mcx.gz'
+
+
+class TickRecorder:
+    """
+    Writes the raw frames received from the MCX feed to gzip segments in a
+    directory, one line per frame: the receive time in epoch seconds, a tab
+    and the frame as sent. Segments are named after the time they were
+    started and rotated every segment_bytes of frames, so a long capture can
+    be pruned or copied piecewise.
+
+    write() only appends to the gzip stream's buffer; the feed loop pays
+    for compression in small steps rather than for disk waits.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.file = None
+        self.path = None
+        self.segment_written = 0
+        self.frames = 0
+        self.segments = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def open_segment(self, received: float):
+        self.close()
+        name = time.strftime('%Y%m%d-%H%M%S', time.gmtime(received))
+        path = os.path.join(self.directory, f"{name}-{int(received * 1e6) % 1000000:06d}{SEGMENT_SUFFIX}")
+        self.file = gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+        self.path = path
+        self.segment_written = 0
+        self.segments += 1
+        logger.info(f"Recording MCX frames to {path}")
+
+    def write(self, message, received: float = None):
+        if received is None:
+            received = time.time()
+        if isinstance(message, bytes):
+            message = message.decode('utf-8')
+        if self.file is None or self.segment_written >= self.segment_bytes:
+            self.open_segment(received)
+        line = f"{received:.6f}\t{message}\n"
+        self.file.write(line)
+        self.segment_written += len(line)
+        self.frames += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def get_metrics(self) -> dict:
+        return {
+            'directory': self.directory,
+            'segment': self.path,
+            'segments': self.segments,
+            'frames': self.frames,
+        }
+
+
+def recording_segments(path: str) -> List[str]:
+    """The segments of a recording: a single file, or every segment in a directory in time order"""
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, name)
+            for name in os.listdir(path)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+    return [path]
+
+
+def read_recording(path: str) -> Iterator[Tuple[float, str]]:
+    """(receive time, frame) for every frame of a recording, in order"""
+    for segment in recording_segments(path):
+        opener = gzip.open if segment.endswith('.gz') else open
+        with opener(segment, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    received, _, message = line.rstrip('\n').partition('\t')
+                    try:
+                        received = float(received)
+                    except ValueError:
+                        logger.warning(f"Skipping malformed line in {segment}")
+                        continue
+                    yield received, message
+            except EOFError:
+                # The last segment of a capture that was killed mid-write
+                logger.warning(f"{segment} ends with a truncated block")
@@ -0,0 +1,165 @@
+import json
+import asyncio
+import websockets
+import logging
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils import timezone
+from .engine import engine_registry
+from .events import MCX_FEED_GROUP
+from .mcx_decoder import MCXDecoder
+from .quotes import quote_writer
+from .symbols import symbol_cache
+
+logger = logging.getLogger(__name__)
+
+FEED_SETTINGS = getattr(settings, 'MCX_FEED', {})
+
+# Both feed clients connect here; point it at mcx_simulator or mcx_replay
+# for offline load tests
+MCX_WS_URL = FEED_SETTINGS.get('URL', "ws://78.46.93.146:8084")
+
+# Seconds the upstream stays connected after its last subscriber leaves,
+# so page reloads do not reconnect it
+IDLE_TIMEOUT = 10
+
+# Reconnect backoff, doubling from WEBSOCKET_RETRY_DELAY up to MAX_RETRY_DELAY
+RETRY_DELAY = getattr(settings, 'WEBSOCKET_RETRY_DELAY', 5)
+MAX_RETRY_DELAY = 60
+
+
+class MCXUpstream:
+    """
+    The process's single connection to the MCX feed, shared by every
+    MCXMarketDataConsumer. Each message is parsed once and its ticks are
+    handed to the quote writer, which coalesces them into periodic bulk
+    writes; every tick is then published to the MCX feed group
+    for the consumers to forward.
+
+    Consumers acquire() on connect and release() on disconnect. The first
+    subscriber starts the supervised connection task, which reconnects with
+    backoff; IDLE_TIMEOUT seconds after the last one leaves it is stopped.
+    Must be used from the server's event loop.
+    """
+
+    def __init__(self, url: str = MCX_WS_URL):
+        self.url = url
+        self.subscribers = 0
+        self.task = None
+        self.idle_handle = None
+        self.connected = False
+        self.connects = 0
+        self.messages = 0
+        self.ticks = 0
+        self.decoder = MCXDecoder()
+
+    def acquire(self):
+        self.subscribers += 1
+        if self.idle_handle is not None:
+            self.idle_handle.cancel()
+            self.idle_handle = None
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    def release(self):
+        self.subscribers = max(0, self.subscribers - 1)
+        if not self.subscribers and self.task is not None and self.idle_handle is None:
+            self.idle_handle = asyncio.get_running_loop().call_later(IDLE_TIMEOUT, self.stop)
+
+    def stop(self):
+        """Close the upstream connection if nobody subscribed again meanwhile"""
+        self.idle_handle = None
+        if self.subscribers or self.task is None:
+            return
+        logger.info("No MCX subscribers left, closing the upstream connection")
+        self.task.cancel()
+        self.task = None
+
+    async def run(self):
+        """Keep the upstream connected, with backoff between attempts"""
+        channel_layer = get_channel_layer()
+        delay = RETRY_DELAY
+        quote_writer.start()
+        while True:
+            try:
+                if symbol_cache.is_stale():
+                    await sync_to_async(symbol_cache.load)()
+                async with websockets.connect(self.url) as websocket:
+                    self.connected = True
+                    self.connects += 1
+                    logger.info("Connected to MCX WebSocket")
+                    async for message in websocket:
+                        delay = RETRY_DELAY
+                        self.messages += 1
+                        await self.process_message(channel_layer, message)
+                logger.warning("MCX WebSocket connection closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error connecting to MCX: {str(e)}")
+            finally:
+                self.connected = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    async def process_message(self, channel_layer, message):
+        """
+        Process incoming MCX market data
+        Format: [symbol, name, open, low, high, close, ltp, bid, ask, timestamp, extra]
+        """
+        try:
+            ticks = self.decoder.decode(message)
+        except Exception as e:
+            logger.error(f"Invalid MCX message: {str(e)}")
+            return
+        for tick in ticks:
+            try:
+                trading_pair = await self.get_or_create_trading_pair(tick.symbol)
+
+                # Update trading pair data
+                updates = tick.fields()
+                updates['last_updated'] = timezone.now()
+
+                quote_writer.put(trading_pair, updates)
+                engine_registry.on_market_price(trading_pair.id, updates.get('last_price'))
+
+                # Serialized once for every subscribed consumer
+                await channel_layer.group_send(MCX_FEED_GROUP, {
+                    'type': 'mcx.data',
+                    'symbol': tick.symbol,
+                    'text': json.dumps({
+                        'type': 'market_data',
+                        'symbol': tick.symbol,
+                        'data': tick.frame_data()
+                    }),
+                })
+                self.ticks += 1
+
+            except Exception as e:
+                logger.error(f"Error processing MCX data for {tick.symbol}: {str(e)}")
+
+    async def get_or_create_trading_pair(self, symbol):
+        """
+        Get or create a trading pair from MCX symbol, through the symbol cache
+        """
+        # Extract base and quote assets from symbol (you may need to adjust this based on your symbol format)
+        base_asset = symbol.replace('FUT', '').strip()
+        quote_asset = 'INR'  # MCX typically quotes in INR
+
+        return await symbol_cache.aget_or_create(base_asset, quote_asset)
+
+    def get_metrics(self) -> dict:
+        return {
+            'url': self.url,
+            'subscribers': self.subscribers,
+            'running': self.task is not None and not self.task.done(),
+            'connected': self.connected,
+            'connects': self.connects,
+            'messages': self.messages,
+            'ticks': self.ticks,
+            'decoder': self.decoder.get_metrics(),
+        }
+
+
+mcx_upstream = MCXUpstream()
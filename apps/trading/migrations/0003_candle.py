@@ -0,0 +1,51 @@
+# Generated by Django 5.1.6 on 2026-10-17 18:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("trading", "0002_add_market_data_fields"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Candle",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("resolution", models.CharField(max_length=3)),
+                ("open_time", models.DateTimeField()),
+                ("open_price", models.DecimalField(decimal_places=8, max_digits=18)),
+                ("high_price", models.DecimalField(decimal_places=8, max_digits=18)),
+                ("low_price", models.DecimalField(decimal_places=8, max_digits=18)),
+                ("close_price", models.DecimalField(decimal_places=8, max_digits=18)),
+                ("volume", models.DecimalField(decimal_places=8, default=0, max_digits=24)),
+                ("updates", models.IntegerField(default=0)),
+                (
+                    "trading_pair",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="trading.tradingpair",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["trading_pair", "resolution", "open_time"],
+                        name="trading_can_trading_82e314_idx",
+                    )
+                ],
+                "unique_together": {("trading_pair", "resolution", "open_time")},
+            },
+        ),
+    ]
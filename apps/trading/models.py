@@ -111,6 +111,28 @@ class Trade(models.Model):
     def __str__(self):
         return f"{self.quantity} @ {self.price}"
 
+class Candle(models.Model):
+    """A closed OHLCV bar of a pair's feed ticks and trades at one resolution"""
+    trading_pair = models.ForeignKey(TradingPair, on_delete=models.CASCADE)
+    resolution = models.CharField(max_length=3)  # 1s, 1m, 5m, 1h or 1d
+    open_time = models.DateTimeField()
+    
+    open_price = models.DecimalField(max_digits=18, decimal_places=8)
+    high_price = models.DecimalField(max_digits=18, decimal_places=8)
+    low_price = models.DecimalField(max_digits=18, decimal_places=8)
+    close_price = models.DecimalField(max_digits=18, decimal_places=8)
+    volume = models.DecimalField(max_digits=24, decimal_places=8, default=0)
+    updates = models.IntegerField(default=0)  # Ticks and trades in the bar
+
+    class Meta:
+        unique_together = ('trading_pair', 'resolution', 'open_time')
+        indexes = [
+            models.Index(fields=['trading_pair', 'resolution', 'open_time']),
+        ]
+
+    def __str__(self):
+        return f"{self.trading_pair} {self.resolution} {self.open_time}"
+
 class OrderBook(models.Model):
     trading_pair = models.ForeignKey(TradingPair, on_delete=models.CASCADE)
     side = models.CharField(max_length=4, choices=OrderSide.choices)
@@ -0,0 +1,269 @@
+import bisect
+import heapq
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class OrderNode:
+    """Intrusive queue node linking a resting order into its price level"""
+
+    __slots__ = ('order', 'remaining', 'side', 'level', 'prev', 'next')
+
+    def __init__(self, order, remaining, side: 'BookSide', level: 'PriceLevel'):
+        self.order = order
+        self.remaining = remaining  # Open quantity in the engine's units
+        self.side = side
+        self.level = level
+        self.prev = None
+        self.next = None
+
+
+class PriceLevel:
+    """
+    All resting orders at one price, as a doubly-linked FIFO in time
+    priority. count and quantity (open quantity in the engine's units) are
+    kept up to date as orders join, leave and fill, so aggregated depth
+    never needs to walk the queue.
+    """
+
+    __slots__ = ('ticks', 'price', 'head', 'tail', 'count', 'quantity')
+
+    def __init__(self, ticks: int, price: Decimal):
+        self.ticks = ticks
+        self.price = price
+        self.head: Optional[OrderNode] = None
+        self.tail: Optional[OrderNode] = None
+        self.count = 0
+        self.quantity = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Iterate resting orders oldest first"""
+        node = self.head
+        while node is not None:
+            yield node.order
+            node = node.next
+
+    def nodes(self) -> Iterator[OrderNode]:
+        node = self.head
+        while node is not None:
+            yield node
+            node = node.next
+
+    def append(self, node: OrderNode):
+        node.prev = self.tail
+        node.next = None
+        if self.tail is None:
+            self.head = node
+        else:
+            self.tail.next = node
+        self.tail = node
+        self.count += 1
+        self.quantity += node.remaining
+
+    def unlink(self, node: OrderNode):
+        if node.prev is None:
+            self.head = node.next
+        else:
+            node.prev.next = node.next
+        if node.next is None:
+            self.tail = node.prev
+        else:
+            node.next.prev = node.prev
+        node.prev = node.next = None
+        self.count -= 1
+        self.quantity -= node.remaining
+
+    def fill(self, node: OrderNode, quantity):
+        """Reduce a resting order's open quantity by a fill"""
+        node.remaining -= quantity
+        self.quantity -= quantity
+
+    def __repr__(self):
+        return f"<PriceLevel {self.price} x{self.count}>"
+
+
+class BookSide:
+    """
+    One side of an order book with price levels kept sorted by integer ticks.
+
+    Level keys are held in a bisect-managed list ordered so that the best
+    price is always the last element: best-price lookup and removal of the
+    best level are O(1), inserting a new level is a binary search plus a
+    memmove.
+    """
+
+    def __init__(self, is_bid: bool):
+        self.is_bid = is_bid
+        self.levels: Dict[int, PriceLevel] = {}  # ticks -> level
+        self._keys: List[int] = []  # ascending, best price last
+        self.order_count = 0
+
+    def _key(self, ticks: int) -> int:
+        # Bids: highest price is best, asks: lowest price is best
+        return ticks if self.is_bid else -ticks
+
+    def __len__(self):
+        return len(self.levels)
+
+    def __bool__(self):
+        return bool(self.levels)
+
+    def __contains__(self, ticks: int):
+        return ticks in self.levels
+
+    def __iter__(self) -> Iterator[PriceLevel]:
+        """Iterate levels from the best price outwards"""
+        for key in reversed(self._keys):
+            yield self.levels[self._key(key)]
+
+    def get(self, ticks: int) -> Optional[PriceLevel]:
+        return self.levels.get(ticks)
+
+    def best(self) -> Optional[PriceLevel]:
+        """Best level on this side, or None when the side is empty"""
+        if not self._keys:
+            return None
+        return self.levels[self._key(self._keys[-1])]
+
+    def best_ticks(self) -> Optional[int]:
+        if not self._keys:
+            return None
+        return self._key(self._keys[-1])
+
+    def add(self, order, ticks: int, price: Decimal, remaining) -> OrderNode:
+        """Append an order to the back of its price level, returning its queue node"""
+        level = self.levels.get(ticks)
+        if level is None:
+            level = PriceLevel(ticks, price)
+            self.levels[ticks] = level
+            bisect.insort(self._keys, self._key(ticks))
+        node = OrderNode(order, remaining, self, level)
+        level.append(node)
+        self.order_count += 1
+        return node
+
+    def remove(self, node: OrderNode):
+        """Unlink an order in O(1), dropping its level when it empties"""
+        level = node.level
+        level.unlink(node)
+        self.order_count -= 1
+        if not level.count:
+            self.remove_level(level.ticks)
+
+    def remove_level(self, ticks: int):
+        """Drop a whole price level"""
+        level = self.levels.pop(ticks, None)
+        if level is None:
+            return
+        self.order_count -= level.count
+        key = self._key(ticks)
+        if self._keys[-1] == key:
+            self._keys.pop()
+        else:
+            index = bisect.bisect_left(self._keys, key)
+            del self._keys[index]
+
+    def clear(self):
+        self.levels.clear()
+        self._keys.clear()
+        self.order_count = 0
+
+
+class StopIndex:
+    """
+    Pending stop orders keyed by stop price in integer ticks. Buy stops
+    trigger once the price rises to their stop, so they sit in a min-heap;
+    sell stops trigger once it falls to theirs and sit in a max-heap of
+    negated ticks. Triggering k stops out of n costs O(k log n).
+
+    Removed stops are not searched for in the heaps: their entries are
+    skipped when they surface, and the heaps are rebuilt once most of
+    their entries are stale.
+    """
+
+    def __init__(self):
+        self.orders: Dict[int, Tuple[object, int]] = {}  # order id -> (order, entry sequence)
+        self._buys: List[Tuple[int, int, int]] = []      # (ticks, sequence, order id)
+        self._sells: List[Tuple[int, int, int]] = []     # (-ticks, sequence, order id)
+        self._sequence = 0
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __contains__(self, order_id: int):
+        return order_id in self.orders
+
+    def __iter__(self):
+        """Pending stops in the order they were armed"""
+        return (order for order, _ in self.orders.values())
+
+    def get(self, order_id: int):
+        entry = self.orders.get(order_id)
+        return entry[0] if entry is not None else None
+
+    def add(self, order, ticks: int):
+        if order.id in self.orders:
+            return
+        self._sequence += 1
+        self.orders[order.id] = (order, self._sequence)
+        if order.side == 'BUY':
+            heapq.heappush(self._buys, (ticks, self._sequence, order.id))
+        else:
+            heapq.heappush(self._sells, (-ticks, self._sequence, order.id))
+
+    def remove(self, order_id: int):
+        """Drop a pending stop, returning its order if it was armed"""
+        entry = self.orders.pop(order_id, None)
+        if len(self._buys) + len(self._sells) > 2 * len(self.orders) + 64:
+            self._compact()
+        return entry[0] if entry is not None else None
+
+    def crossed(self, buy_ticks: int, sell_ticks: int) -> bool:
+        """
+        Whether pop_triggered would find anything. Stale entries may give a
+        false yes; this may be called from outside the writer thread.
+        """
+        buys, sells = self._buys, self._sells
+        try:
+            return bool(
+                (buys and buys[0][0] <= buy_ticks) or
+                (sells and -sells[0][0] >= sell_ticks)
+            )
+        except IndexError:
+            return True
+
+    def pop_triggered(self, buy_ticks: int, sell_ticks: int) -> list:
+        """
+        Remove and return the buy stops at or below buy_ticks and the sell
+        stops at or above sell_ticks, each side in trigger order.
+        """
+        triggered = []
+        for heap, crossed in (
+            (self._buys, lambda key: key <= buy_ticks),
+            (self._sells, lambda key: -key >= sell_ticks),
+        ):
+            while heap and crossed(heap[0][0]):
+                _, sequence, order_id = heapq.heappop(heap)
+                entry = self.orders.get(order_id)
+                if entry is not None and entry[1] == sequence:
+                    del self.orders[order_id]
+                    triggered.append(entry[0])
+        return triggered
+
+    def _compact(self):
+        self._buys = [item for item in self._buys if self._is_live(item)]
+        self._sells = [item for item in self._sells if self._is_live(item)]
+        heapq.heapify(self._buys)
+        heapq.heapify(self._sells)
+
+    def _is_live(self, item) -> bool:
+        entry = self.orders.get(item[2])
+        return entry is not None and entry[1] == item[1]
+
+    def clear(self):
+        self.orders.clear()
+        self._buys.clear()
+        self._sells.clear()
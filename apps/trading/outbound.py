@@ -0,0 +1,185 @@
+import asyncio
+import itertools
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from typing import Callable, Optional
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Pending frames (per connection) at which a slow client is logged
+BACKLOG_ALERT = getattr(settings, 'WEBSOCKET_BACKLOG_ALERT', 100)
+QUEUE_ALERT = getattr(settings, 'WEBSOCKET_QUEUE_ALERT', 1000)
+ALERT_COOLDOWN = getattr(settings, 'WEBSOCKET_ALERT_COOLDOWN', 300)
+
+# Limits after which the overflow policy applies
+MAX_QUEUE = getattr(settings, 'WEBSOCKET_OUTBOUND_MAX_QUEUE', 5000)
+MAX_LAG = getattr(settings, 'WEBSOCKET_OUTBOUND_MAX_LAG', 10.0)
+OVERFLOW_POLICY = getattr(settings, 'WEBSOCKET_OUTBOUND_POLICY', 'drop')
+
+# Close code for clients disconnected for falling behind ("try again later")
+CLOSE_TOO_SLOW = 1013
+
+# Live buffers of this process, for metrics
+_buffers = weakref.WeakSet()
+
+
+class OutboundBuffer:
+    """
+    Per-connection send queue drained by its own task, so consumers never
+    wait on a slow client. Frames queued with a key (a ticker symbol)
+    conflate: while one is waiting to be sent, a newer frame for the same
+    key replaces its text in place, so a client that falls behind gets the
+    latest value per symbol instead of every intermediate tick. Frames
+    without a key (acks, sequenced L3 events) are always kept.
+
+    Once more than max_queue frames are waiting, or the oldest has waited
+    longer than max_lag seconds, the policy applies: 'drop' discards the
+    pending frames and calls on_drop so the consumer can resynchronize the
+    client, 'disconnect' closes the connection.
+    """
+
+    def __init__(self, consumer, on_drop: Optional[Callable[[], None]] = None,
+                 max_queue: int = MAX_QUEUE, max_lag: float = MAX_LAG,
+                 policy: str = OVERFLOW_POLICY):
+        if policy not in ('drop', 'disconnect'):
+            raise ValueError(f"Unknown outbound overflow policy: {policy}")
+        self.consumer = consumer
+        self.on_drop = on_drop
+        self.max_queue = max_queue
+        self.max_lag = max_lag
+        self.policy = policy
+        self.frames = OrderedDict()  # key -> [queued at, text]
+        self._ids = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.closed = False
+        self.sent = 0
+        self.conflated = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.last_alert = 0.0
+        _buffers.add(self)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    def stop(self):
+        self.closed = True
+        self.frames.clear()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def put(self, text: str, key: Optional[str] = None):
+        """Queue a frame, conflating it with a waiting frame for the same key"""
+        if self.closed:
+            return
+        now = time.monotonic()
+        if key is not None:
+            pending = self.frames.get(key)
+            if pending is not None:
+                pending[1] = text
+                self.conflated += 1
+                return
+        else:
+            key = (next(self._ids),)  # Never equal to a symbol
+        self.frames[key] = [now, text]
+
+        depth = len(self.frames)
+        if depth > self.max_depth:
+            self.max_depth = depth
+        if depth > BACKLOG_ALERT:
+            self.alert(depth, now)
+        if depth > self.max_queue or now - next(iter(self.frames.values()))[0] > self.max_lag:
+            self.overflow(depth)
+        else:
+            self._wakeup.set()
+
+    def lag(self) -> float:
+        """Seconds the oldest waiting frame has been queued"""
+        try:
+            return time.monotonic() - next(iter(self.frames.values()))[0]
+        except (StopIteration, RuntimeError):
+            return 0.0  # Empty, or changed by the event loop while metrics read it
+
+    def alert(self, depth: int, now: float):
+        if now - self.last_alert < ALERT_COOLDOWN:
+            return
+        self.last_alert = now
+        log = logger.error if depth > QUEUE_ALERT else logger.warning
+        log(
+            f"WebSocket client {self.describe()} is falling behind: "
+            f"{depth} frames queued, oldest {self.lag():.1f}s"
+        )
+
+    def overflow(self, depth: int):
+        self.dropped += depth
+        self.frames.clear()
+        if self.policy == 'disconnect':
+            logger.warning(f"Disconnecting WebSocket client {self.describe()}: {depth} frames behind")
+            self.closed = True
+            asyncio.create_task(self.consumer.close(code=CLOSE_TOO_SLOW))
+            return
+        logger.warning(f"Dropped {depth} frames queued for WebSocket client {self.describe()}")
+        if self.on_drop is not None:
+            self.on_drop()
+
+    async def run(self):
+        frames = self.frames
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while frames:
+                    _, (_, text) = frames.popitem(last=False)
+                    await self.consumer.send(text_data=text)
+                    self.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error sending to WebSocket client {self.describe()}: {str(e)}")
+            self.stop()
+
+    def describe(self) -> str:
+        scope = self.consumer.scope
+        return f"{scope.get('client')} on {scope.get('path')}"
+
+    def get_metrics(self) -> dict:
+        scope = self.consumer.scope
+        return {
+            'path': scope.get('path'),
+            'client': ':'.join(str(part) for part in scope['client']) if scope.get('client') else None,
+            'queue_depth': len(self.frames),
+            'max_queue_depth': self.max_depth,
+            'lag_seconds': self.lag(),
+            'sent': self.sent,
+            'conflated': self.conflated,
+            'dropped': self.dropped,
+            'alert': (
+                'queue' if len(self.frames) > QUEUE_ALERT
+                else 'backlog' if len(self.frames) > BACKLOG_ALERT
+                else None
+            ),
+        }
+
+
+def get_outbound_metrics() -> dict:
+    """Queue depth and conflation statistics of every WebSocket connection in this process"""
+    connections = [buffer.get_metrics() for buffer in list(_buffers) if not buffer.closed]
+    connections.sort(key=lambda metrics: metrics['queue_depth'], reverse=True)
+    return {
+        'connections': len(connections),
+        'backlog_alert': BACKLOG_ALERT,
+        'queue_alert': QUEUE_ALERT,
+        'max_queue': MAX_QUEUE,
+        'max_lag': MAX_LAG,
+        'policy': OVERFLOW_POLICY,
+        'queued': sum(metrics['queue_depth'] for metrics in connections),
+        'per_connection': connections,
+    }
@@ -0,0 +1,324 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from .models import TradingPair
+from .symbols import MARKET_DATA_FIELDS
+
+logger = logging.getLogger(__name__)
+
+FEED_SETTINGS = getattr(settings, 'MCX_FEED', {})
+STORE_SETTINGS = getattr(settings, 'QUOTE_STORE', {})
+
+
+def encode_fields(fields: dict) -> dict:
+    """Market data fields as stored in a quote: decimals and times as strings"""
+    encoded = {}
+    for field, value in fields.items():
+        if value is None:
+            encoded[field] = None
+        elif field == 'last_updated':
+            encoded[field] = value.isoformat()
+        else:
+            encoded[field] = str(value)
+    return encoded
+
+
+def pair_identity(pair: TradingPair) -> dict:
+    return {
+        'id': pair.id,
+        'symbol': f"{pair.base_asset}/{pair.quote_asset}",
+        'base_asset': pair.base_asset,
+        'quote_asset': pair.quote_asset,
+        'is_active': pair.is_active,
+    }
+
+
+def pair_quote(pair: TradingPair) -> dict:
+    """A pair's full quote: its identity plus every market data field"""
+    return {
+        **pair_identity(pair),
+        **encode_fields({field: getattr(pair, field) for field in MARKET_DATA_FIELDS}),
+    }
+
+
+class LocalQuoteBackend:
+    """
+    Quotes in a dict of this process. The default when the feed runs inside
+    the web server, and the fake for tests of the Redis setup. Processes
+    the feed does not write to refresh it from the database (see
+    QuoteStore).
+    """
+    shared = False
+
+    def __init__(self, **config):
+        self.quotes: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    def update(self, symbol: str, fields: dict):
+        with self.lock:
+            quote = self.quotes.get(symbol)
+            if quote is None:
+                self.quotes[symbol] = dict(fields)
+            else:
+                quote.update(fields)
+
+    def get(self, symbol: str) -> Optional[dict]:
+        with self.lock:
+            quote = self.quotes.get(symbol)
+            return dict(quote) if quote is not None else None
+
+    def get_all(self) -> Dict[str, dict]:
+        with self.lock:
+            return {symbol: dict(quote) for symbol, quote in self.quotes.items()}
+
+    def delete(self, symbol: str):
+        with self.lock:
+            self.quotes.pop(symbol, None)
+
+
+class RedisQuoteBackend:
+    """
+    Quotes in Redis, shared by every process: one hash per symbol holding
+    JSON-encoded fields, plus a set of the symbols. Updates are a single
+    HSET, reading every quote two round trips. Calls block; on the feed's
+    event loop that is one HSET per tick.
+    """
+    shared = True
+
+    def __init__(self, location: str = 'redis://127.0.0.1:6379/0', prefix: str = 'quotes', **config):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('RedisQuoteBackend requires the redis package')
+        self.client = redis.Redis.from_url(location, decode_responses=True)
+        self.prefix = prefix
+        self.symbols_key = f"{prefix}:symbols"
+
+    def key(self, symbol: str) -> str:
+        return f"{self.prefix}:{symbol}"
+
+    def decode(self, values: dict) -> Optional[dict]:
+        return {field: json.loads(value) for field, value in values.items()} if values else None
+
+    def update(self, symbol: str, fields: dict):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(self.key(symbol), mapping={field: json.dumps(value) for field, value in fields.items()})
+        pipe.sadd(self.symbols_key, symbol)
+        pipe.execute()
+
+    def get(self, symbol: str) -> Optional[dict]:
+        return self.decode(self.client.hgetall(self.key(symbol)))
+
+    def get_all(self) -> Dict[str, dict]:
+        symbols = sorted(self.client.smembers(self.symbols_key))
+        pipe = self.client.pipeline(transaction=False)
+        for symbol in symbols:
+            pipe.hgetall(self.key(symbol))
+        quotes = {}
+        for symbol, values in zip(symbols, pipe.execute()):
+            quote = self.decode(values)
+            if quote is not None:
+                quotes[symbol] = quote
+        return quotes
+
+    def delete(self, symbol: str):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.delete(self.key(symbol))
+        pipe.srem(self.symbols_key, symbol)
+        pipe.execute()
+
+
+class QuoteStore:
+    """
+    Latest quote per symbol: last/bid/ask/OHLC, volume and update time as
+    strings, with the pair's id, symbol, assets and is_active. The MCX feed
+    handlers write every tick here; the market data API, WebSocket
+    snapshots, market watch and admin read from it instead of the
+    TradingPair table, which stays the durable copy written behind by the
+    QuoteWriter.
+
+    The store is seeded from the database on first read in each process
+    (pairs it already holds only get their identity refreshed), and kept in
+    step with admin edits by signals.
+
+    A process-local backend only sees the ticks of a feed running in the
+    same process. Unless one wrote to it within the last ttl seconds, e.g.
+    in a web server whose feed is the separate mcx_feed command or whose
+    upstream went idle, reads reload every quote from the database once it
+    is older than ttl seconds; use the Redis backend to share the feed's
+    quotes without that.
+    """
+
+    def __init__(self, backend, ttl: Optional[float] = None):
+        if ttl is None:
+            ttl = STORE_SETTINGS.get('TTL', 1.0)
+        self.backend = backend
+        self.ttl = ttl
+        self.loaded_at = None
+        self.fed_at = None  # Last tick written by a feed in this process
+        self.lock = threading.Lock()  # Serializes loads
+
+    def update(self, pair: TradingPair, fields: dict):
+        """Record market data fields of a pair from a tick"""
+        self.fed_at = time.monotonic()
+        self.backend.update(
+            f"{pair.base_asset}/{pair.quote_asset}",
+            {**pair_identity(pair), **encode_fields(fields)},
+        )
+
+    def sync_pair(self, pair: TradingPair):
+        """Refresh a pair's identity after it was created or edited, adding it if missing"""
+        symbol = f"{pair.base_asset}/{pair.quote_asset}"
+        quotes = self.backend.get_all()
+        for other, quote in quotes.items():
+            if quote.get('id') == pair.id and other != symbol:
+                self.backend.delete(other)  # Renamed
+        self.backend.update(symbol, pair_identity(pair) if symbol in quotes else pair_quote(pair))
+
+    def remove(self, pair: TradingPair):
+        self.backend.delete(f"{pair.base_asset}/{pair.quote_asset}")
+
+    def is_fed(self) -> bool:
+        """Whether a feed keeps the store current: shared, or written here recently"""
+        return self.backend.shared or (
+            self.fed_at is not None and time.monotonic() - self.fed_at <= self.ttl
+        )
+
+    def is_stale(self) -> bool:
+        if self.loaded_at is None:
+            return True
+        if self.is_fed():
+            return False
+        return time.monotonic() - self.loaded_at > self.ttl
+
+    def load(self):
+        """
+        Add every pair the store lacks and drop the ones no longer in the
+        database. Pairs it holds keep their quotes while a feed writes to
+        the store, and take the database's otherwise.
+        """
+        with self.lock:
+            if not self.is_stale():
+                return
+            quotes = self.backend.get_all()
+            keep = self.is_fed()
+            symbols = set()
+            for pair in TradingPair.objects.all():
+                symbol = f"{pair.base_asset}/{pair.quote_asset}"
+                symbols.add(symbol)
+                self.backend.update(symbol, pair_identity(pair) if keep and symbol in quotes else pair_quote(pair))
+            for symbol in quotes.keys() - symbols:
+                self.backend.delete(symbol)
+            self.loaded_at = time.monotonic()
+
+    def get(self, symbol: str) -> Optional[dict]:
+        if self.is_stale():
+            self.load()
+        return self.backend.get(symbol)
+
+    def all(self) -> List[dict]:
+        """Every quote, ordered by symbol"""
+        if self.is_stale():
+            self.load()
+        quotes = self.backend.get_all()
+        return [quotes[symbol] for symbol in sorted(quotes)]
+
+    def active(self) -> List[dict]:
+        return [quote for quote in self.all() if quote.get('is_active')]
+
+
+class QuoteWriter:
+    """
+    Write-behind buffer for the feeds' TradingPair market data columns.
+    put() coalesces ticks into the latest values per pair and updates the
+    quote store; every interval seconds the pending pairs are written with
+    one bulk_update, so the database write rate is bounded by the interval
+    rather than by the tick rate. A failed flush is merged back under any
+    newer ticks and retried on the next one.
+
+    Runs in the event loop of the feed handler using it: call start() from
+    that loop.
+    """
+
+    def __init__(self, store: QuoteStore, interval: Optional[float] = None):
+        if interval is None:
+            interval = FEED_SETTINGS.get('WRITE_INTERVAL', 0.25)
+        self.store = store
+        self.interval = interval
+        self.pending: Dict[int, dict] = {}
+        self.task = None
+        self.ticks = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.last_flush_seconds = 0.0
+
+    def put(self, pair: TradingPair, fields: dict):
+        """Record a tick's market data fields for the pair"""
+        pending = self.pending.get(pair.id)
+        if pending is None:
+            self.pending[pair.id] = dict(fields)
+        else:
+            pending.update(fields)
+        try:
+            self.store.update(pair, fields)
+        except Exception as e:
+            logger.error(f"Error updating the quote store for {pair}: {str(e)}")
+        self.ticks += 1
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.pending:
+                await self.flush()
+
+    async def flush(self):
+        """Write the pending pairs, keeping them for the next flush on failure"""
+        batch, self.pending = self.pending, {}
+        try:
+            await sync_to_async(self.write)(batch)
+        except Exception as e:
+            logger.error(f"Error writing market data for {len(batch)} pairs: {str(e)}")
+            for trading_pair_id, fields in batch.items():
+                self.pending[trading_pair_id] = {**fields, **self.pending.get(trading_pair_id, {})}
+
+    def write(self, batch: Dict[int, dict]):
+        """One bulk_update per set of fields written (normally a single one)"""
+        started = time.perf_counter()
+        groups: Dict[frozenset, list] = {}
+        for trading_pair_id, fields in batch.items():
+            groups.setdefault(frozenset(fields), []).append(TradingPair(id=trading_pair_id, **fields))
+        for fields, pairs in groups.items():
+            TradingPair.objects.bulk_update(pairs, sorted(fields))
+        self.flushes += 1
+        self.rows_written += len(batch)
+        self.last_flush_seconds = time.perf_counter() - started
+
+    def get_metrics(self) -> dict:
+        return {
+            'interval': self.interval,
+            'pending_pairs': len(self.pending),
+            'ticks': self.ticks,
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'last_flush_seconds': self.last_flush_seconds,
+        }
+
+
+def get_quote_backend():
+    backend = STORE_SETTINGS.get('BACKEND', 'apps.trading.quotes.LocalQuoteBackend')
+    return import_string(backend)(**STORE_SETTINGS.get('CONFIG', {}))
+
+
+quote_store = QuoteStore(get_quote_backend())
+quote_writer = QuoteWriter(quote_store)
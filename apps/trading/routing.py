@@ -3,5 +3,7 @@ from . import consumers, consumers_market
 
 websocket_urlpatterns = [
     re_path(r'ws/trading/market-data/$', consumers_market.MarketDataConsumer.as_asgi()),
+    re_path(r'ws/trading/l3/(?P<trading_pair_id>\d+)/$', consumers_market.OrderBookL3Consumer.as_asgi()),
+    re_path(r'ws/trading/book/(?P<trading_pair_id>\d+)/$', consumers_market.OrderBookL2Consumer.as_asgi()),
     re_path(r'ws/trading/mcx-feed/$', consumers.MCXMarketDataConsumer.as_asgi()),
 ]
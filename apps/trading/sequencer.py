@@ -0,0 +1,256 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from .engine import MatchingEngine, StatementCounter
+from .models import Order, OrderStatus
+
+logger = logging.getLogger(__name__)
+
+ENGINE_SETTINGS = getattr(settings, 'MATCHING_ENGINE', {})
+
+# Backoff between attempts to rebuild a book that failed to reload
+RELOAD_RETRY_DELAY = 1
+MAX_RELOAD_RETRY_DELAY = 30
+
+
+class SequencerBusy(Exception):
+    """Raised when a pair's command queue is full"""
+
+
+class Command:
+    __slots__ = ('action', 'args', 'future')
+
+    def __init__(self, action: str, args: tuple):
+        self.action = action
+        self.args = args
+        self.future = Future()
+
+
+class PairSequencer:
+    """
+    Single writer for one trading pair. A dedicated thread owns the pair's
+    MatchingEngine and consumes a bounded queue of commands in arrival
+    order, so concurrent requests never interleave on the book or contend
+    for row locks. Commands that are already waiting when the thread wakes
+    up are processed as one batch: one transaction and one flush. While
+    idle the thread sleeps until the engine's next order expiry, and due
+    expiries run at the start of a batch.
+
+    If a failed batch cannot even rebuild the book (the database is
+    unavailable), every command of the batch fails with that error and the
+    thread retries the reload with backoff before taking more commands;
+    the engine is reported unhealthy meanwhile.
+
+    Orders whose 'place' command failed are still PENDING in the database,
+    which is also how armed stops are stored. They are marked REJECTED
+    before any rebuild, so a reload never arms an order its client was told
+    had failed.
+
+    Actions:
+        place  -- process a saved Order, result is its list of trades
+        cancel -- cancel an Order, result is True if it was cancelled
+        call   -- run a callable on the writer thread, result is its return value
+    """
+
+    def __init__(self, engine: MatchingEngine):
+        self.engine = engine
+        self.commands = queue.Queue(maxsize=ENGINE_SETTINGS.get('SEQUENCER_QUEUE_SIZE', 10000))
+        self.batch_size = ENGINE_SETTINGS.get('SEQUENCER_BATCH_SIZE', 100)
+        self.thread = threading.Thread(
+            target=self.run,
+            name=f"sequencer-{engine.trading_pair.id}",
+            daemon=True
+        )
+        self.batches = 0
+        self.commands_processed = 0
+        self.replays = 0
+        self.healthy = True
+        self.unplaced = set()  # Ids of orders whose placement failed, to reject
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        """Finish the queued commands, then stop the writer thread"""
+        self.commands.put(None)
+
+    def submit(self, action: str, *args) -> Future:
+        """Queue a command; raises SequencerBusy when the queue is full"""
+        command = Command(action, args)
+        try:
+            self.commands.put_nowait(command)
+        except queue.Full:
+            raise SequencerBusy(f"Order queue for {self.engine.trading_pair} is full")
+        return command.future
+
+    def get_metrics(self) -> dict:
+        return {
+            'queue_depth': self.commands.qsize(),
+            'batches': self.batches,
+            'commands_processed': self.commands_processed,
+            'average_batch': self.commands_processed / self.batches if self.batches else 0,
+            'replays': self.replays,
+            'healthy': self.healthy,
+            'alive': self.thread.is_alive(),
+        }
+
+    def run(self):
+        running = True
+        while running:
+            # Sleep until the next command or the next order expiry
+            try:
+                command = self.commands.get(timeout=self.engine.seconds_until_expiry())
+            except queue.Empty:
+                batch = []
+            else:
+                if command is None:
+                    break
+                batch = [command]
+
+            while batch and len(batch) < self.batch_size:
+                try:
+                    command = self.commands.get_nowait()
+                except queue.Empty:
+                    break
+                if command is None:
+                    running = False
+                    break
+                batch.append(command)
+
+            # Orders due to expire leave the book before the batch can trade with them
+            expiry = None
+            if self.engine.seconds_until_expiry() == 0:
+                expiry = Command('call', (self.engine.expire_orders,))
+                batch.insert(0, expiry)
+            if not batch:
+                continue
+
+            close_old_connections()
+            try:
+                with self.engine.lock:
+                    self.execute_batch(batch)
+            except Exception as e:
+                logger.error(
+                    f"Batch of {len(batch)} commands on {self.engine.trading_pair} failed "
+                    f"and the book could not be rebuilt: {str(e)}"
+                )
+                self.fail(batch, e)
+                self.recover()
+                continue
+
+            if expiry is not None and expiry.future.exception() is not None:
+                logger.error(
+                    f"Expiring orders on {self.engine.trading_pair} failed: "
+                    f"{str(expiry.future.exception())}"
+                )
+                time.sleep(1)  # Don't spin while the database is unavailable
+
+        connection.close()
+
+    def fail(self, batch, error: Exception):
+        """Fail the commands of a batch that have no result yet"""
+        for command in batch:
+            if not command.future.done():
+                if command.action == 'place':
+                    self.unplaced.add(command.args[0].id)
+                command.future.set_exception(error)
+
+    def reject_unplaced(self):
+        """Mark the orders of failed 'place' commands REJECTED in the database"""
+        if self.unplaced:
+            Order.objects.filter(id__in=self.unplaced, status=OrderStatus.PENDING).update(
+                status=OrderStatus.REJECTED,
+                updated_at=timezone.now()
+            )
+            self.unplaced.clear()
+
+    def rebuild(self):
+        """Reload the book from the database, after rejecting the orders that failed to place"""
+        self.reject_unplaced()
+        self.engine.reload()
+
+    def recover(self):
+        """Rebuild the book from the database, retrying with backoff until it loads"""
+        self.healthy = False
+        delay = RELOAD_RETRY_DELAY
+        while True:
+            time.sleep(delay)
+            close_old_connections()
+            try:
+                with self.engine.lock:
+                    self.engine.discard_pending()
+                    self.rebuild()
+            except Exception as e:
+                logger.error(f"Reloading the book of {self.engine.trading_pair} failed: {str(e)}")
+                delay = min(delay * 2, MAX_RELOAD_RETRY_DELAY)
+                continue
+            self.healthy = True
+            logger.info(f"Recovered the book of {self.engine.trading_pair}")
+            return
+
+    def drain(self, error: Exception):
+        """Fail every queued command; used when the writer thread is gone"""
+        while True:
+            try:
+                command = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            if command is not None:
+                self.fail([command], error)
+
+    def apply(self, command: Command):
+        engine = self.engine
+        if command.action == 'place':
+            return engine.handle_order(*command.args)
+        if command.action == 'cancel':
+            return engine.handle_cancel(*command.args)
+        if command.action == 'call':
+            function, *args = command.args
+            return function(*args)
+        raise ValueError(f"Unknown sequencer action: {command.action}")
+
+    def execute_batch(self, batch):
+        """Apply a batch in one transaction with a single flush"""
+        counter = StatementCounter()
+        try:
+            with connection.execute_wrapper(counter):
+                with transaction.atomic():
+                    results = [self.apply(command) for command in batch]
+                    self.engine.flush()
+        except Exception as e:
+            self.engine.discard_pending()
+            if len(batch) == 1:
+                self.fail(batch, e)
+                self.rebuild()
+            else:
+                logger.warning(
+                    f"Batch of {len(batch)} commands on {self.engine.trading_pair} failed "
+                    f"({str(e)}), replaying them one at a time"
+                )
+                self.replay(batch)
+            return
+
+        self.batches += 1
+        self.commands_processed += len(batch)
+        self.engine.record_statements(counter.count, len(batch))
+        for command, result in zip(batch, results):
+            command.future.set_result(result)
+
+    def replay(self, batch):
+        """
+        Re-run a failed batch command by command so only the failing one
+        reports an error. The transaction was rolled back, so the book and
+        the orders are rebuilt from the database first.
+        """
+        self.replays += 1
+        self.rebuild()
+        for command in batch:
+            for arg in command.args:
+                if isinstance(arg, Order):
+                    arg.refresh_from_db()
+            self.execute_batch([command])
@@ -4,6 +4,7 @@ from .models import (
     Order, Trade, TradingPair, OrderBook, TestExchangeAPI, TestTrade,
     OrderType, OrderSide, OrderStatus
 )
+from .fixedpoint import decimal_places
 
 class TradingPairSerializer(serializers.ModelSerializer):
     class Meta:
@@ -49,13 +50,19 @@ class OrderSerializer(serializers.ModelSerializer):
             )
 
         # Check price precision
-        if data.get('price'):
-            decimal_places = len(str(data['price']).split('.')[-1])
-            if decimal_places > data['trading_pair'].price_precision:
+        for field in ('price', 'stop_price'):
+            if data.get(field) and decimal_places(data[field]) > data['trading_pair'].price_precision:
                 raise serializers.ValidationError(
-                    {'price': f'Price exceeds maximum precision of {data["trading_pair"].price_precision} decimals'}
+                    {field: f'Price exceeds maximum precision of {data["trading_pair"].price_precision} decimals'}
                 )
 
+        # Check quantity precision against the lot size
+        lot_places = decimal_places(data['trading_pair'].min_trade_size)
+        if decimal_places(data['quantity']) > lot_places:
+            raise serializers.ValidationError(
+                {'quantity': f'Quantity exceeds maximum precision of {lot_places} decimals'}
+            )
+
         # Check minimum trade size
         if data['quantity'] < data['trading_pair'].min_trade_size:
             raise serializers.ValidationError(
@@ -0,0 +1,54 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .engine import engine_registry
+from .models import TradingPair
+from .quotes import quote_store
+from .symbols import MARKET_DATA_FIELDS, symbol_cache
+
+@receiver(post_save, sender=TradingPair)
+def invalidate_symbol_cache_on_save(sender, instance, created, update_fields, **kwargs):
+    """
+    Reload the feed handlers' symbol map after a pair is edited, e.g. in the
+    admin. New pairs are picked up by the next lookup that misses, and the
+    feeds' own market data saves leave it alone.
+    """
+    if created:
+        return
+    if update_fields is not None and set(update_fields) <= MARKET_DATA_FIELDS:
+        return
+    symbol_cache.invalidate()
+
+@receiver(post_delete, sender=TradingPair)
+def invalidate_symbol_cache_on_delete(sender, instance, **kwargs):
+    symbol_cache.invalidate()
+
+@receiver(post_save, sender=TradingPair)
+def sync_quote_store_on_save(sender, instance, created, update_fields, **kwargs):
+    """Keep the quote store's pair identity (symbol, is_active) in step with edits"""
+    if update_fields is not None and set(update_fields) <= MARKET_DATA_FIELDS:
+        return
+    quote_store.sync_pair(instance)
+
+@receiver(post_delete, sender=TradingPair)
+def remove_from_quote_store_on_delete(sender, instance, **kwargs):
+    quote_store.remove(instance)
+
+@receiver(post_save, sender=TradingPair)
+def invalidate_engine_on_save(sender, instance, created, update_fields, **kwargs):
+    """
+    Rebuild the pair's matching engine with the edited settings (price
+    precision, trade size) once the edit commits. The reload is queued on
+    the pair's sequencer, so it never races the writer thread.
+    """
+    if created:
+        return
+    if update_fields is not None and set(update_fields) <= MARKET_DATA_FIELDS:
+        return
+    pair_id = instance.id
+    transaction.on_commit(lambda: engine_registry.invalidate(pair_id))
+
+@receiver(post_delete, sender=TradingPair)
+def remove_engine_on_delete(sender, instance, **kwargs):
+    pair_id = instance.id
+    transaction.on_commit(lambda: engine_registry.remove(pair_id))
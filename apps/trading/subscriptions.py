@@ -0,0 +1,88 @@
+import json
+from fnmatch import fnmatchcase
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MARKET_DATA_SUBPROTOCOL = 'market.data.v1'
+PATTERN_CHARS = '*?['
+
+
+def is_pattern(symbol: str) -> bool:
+    """Whether a subscription is a shell-style pattern such as '*', 'GOLD*' or '*/INR'"""
+    return any(char in symbol for char in PATTERN_CHARS)
+
+
+def parse_subscription_message(text: str) -> Tuple[Optional[str], List[str]]:
+    """
+    Parse a market.data.v1 client message:
+        {"action": "subscribe" | "unsubscribe", "symbols": ["GOLD/INR", "SILVER*"]}
+    Returns (action, symbols); raises ValueError on anything else.
+    """
+    try:
+        message = json.loads(text)
+    except (TypeError, ValueError):
+        raise ValueError('Message is not valid JSON')
+    if not isinstance(message, dict):
+        raise ValueError('Message must be a JSON object')
+    action = message.get('action')
+    if action not in ('subscribe', 'unsubscribe'):
+        raise ValueError("action must be 'subscribe' or 'unsubscribe'")
+    symbols = message.get('symbols')
+    if isinstance(symbols, str):
+        symbols = [symbols]
+    if not isinstance(symbols, list) or not all(isinstance(symbol, str) and symbol for symbol in symbols):
+        raise ValueError('symbols must be a list of symbol names or patterns')
+    return action, symbols
+
+
+class Subscriptions:
+    """
+    The symbols and symbol patterns one connection is subscribed to.
+    Pattern matches are cached per symbol, so filtering a tick is a dict
+    lookup once a symbol has been seen.
+    """
+
+    def __init__(self):
+        self.symbols = set()
+        self.patterns = set()
+        self._matches: Dict[str, bool] = {}
+
+    def __bool__(self):
+        return bool(self.symbols or self.patterns)
+
+    @property
+    def has_patterns(self) -> bool:
+        return bool(self.patterns)
+
+    def add(self, symbols: Iterable[str]) -> List[str]:
+        """Subscribe, returning the entries that were not subscribed yet"""
+        added = []
+        for symbol in symbols:
+            target = self.patterns if is_pattern(symbol) else self.symbols
+            if symbol not in target:
+                target.add(symbol)
+                added.append(symbol)
+        if any(is_pattern(symbol) for symbol in added):
+            self._matches.clear()
+        return added
+
+    def remove(self, symbols: Iterable[str]) -> List[str]:
+        """Unsubscribe, returning the entries that were subscribed"""
+        removed = []
+        for symbol in symbols:
+            target = self.patterns if is_pattern(symbol) else self.symbols
+            if symbol in target:
+                target.discard(symbol)
+                removed.append(symbol)
+        if any(is_pattern(symbol) for symbol in removed):
+            self._matches.clear()
+        return removed
+
+    def matches(self, symbol: str) -> bool:
+        if symbol in self.symbols:
+            return True
+        matched = self._matches.get(symbol)
+        if matched is None:
+            matched = self._matches[symbol] = any(
+                fnmatchcase(symbol, pattern) for pattern in self.patterns
+            )
+        return matched
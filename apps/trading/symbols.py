@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .models import TradingPair
+
+logger = logging.getLogger(__name__)
+
+FEED_SETTINGS = getattr(settings, 'MCX_FEED', {})
+
+# TradingPair columns written by the market data feeds; saves touching only
+# these leave the symbol map valid
+MARKET_DATA_FIELDS = frozenset({
+    'last_price', 'bid_price', 'ask_price', 'high_price', 'low_price',
+    'open_price', 'close_price', 'volume_24h', 'last_updated',
+})
+
+
+class SymbolCache:
+    """
+    (base asset, quote asset) -> TradingPair map for the feed handlers, so
+    resolving an instrument on every tick is a dict hit. The map is loaded
+    in one query on first use and reloaded once it is older than ttl
+    seconds or after invalidate(); a miss creates or fetches just that pair.
+
+    The cached instances are shared: callers may set market data fields on
+    them but must save with update_fields.
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        if ttl is None:
+            ttl = FEED_SETTINGS.get('SYMBOL_CACHE_TTL', 300)
+        self.ttl = ttl
+        self.pairs: Dict[Tuple[str, str], TradingPair] = {}
+        self.loaded_at = None
+        self.lock = threading.Lock()  # Serializes loads and misses
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl
+
+    def load(self):
+        """Replace the map with every pair in the database"""
+        pairs = {(pair.base_asset, pair.quote_asset): pair for pair in TradingPair.objects.all()}
+        self.pairs = pairs
+        self.loaded_at = time.monotonic()
+        self.loads += 1
+        logger.info(f"Loaded {len(pairs)} trading pairs into the symbol cache")
+
+    def invalidate(self):
+        """Reload the map on its next use"""
+        self.loaded_at = None
+
+    def get_or_create(self, base_asset: str, quote_asset: str) -> TradingPair:
+        if not self.is_stale():
+            pair = self.pairs.get((base_asset, quote_asset))
+            if pair is not None:
+                self.hits += 1
+                return pair
+        return self.resolve(base_asset, quote_asset)
+
+    async def aget_or_create(self, base_asset: str, quote_asset: str) -> TradingPair:
+        """get_or_create for the event loop: only loads and misses leave it"""
+        if not self.is_stale():
+            pair = self.pairs.get((base_asset, quote_asset))
+            if pair is not None:
+                self.hits += 1
+                return pair
+        return await sync_to_async(self.resolve)(base_asset, quote_asset)
+
+    def resolve(self, base_asset: str, quote_asset: str) -> TradingPair:
+        """Slow path: reload a stale map, then fetch or create a missing pair"""
+        key = (base_asset, quote_asset)
+        with self.lock:
+            if self.is_stale():
+                self.load()
+            pair = self.pairs.get(key)
+            if pair is None:
+                self.misses += 1
+                pair, created = TradingPair.objects.get_or_create(
+                    base_asset=base_asset,
+                    quote_asset=quote_asset,
+                    defaults={
+                        'min_trade_size': Decimal('0.01'),
+                        'price_precision': 2,
+                        'is_active': True
+                    }
+                )
+                if created:
+                    logger.info(f"Created trading pair {pair} for a new contract")
+                self.pairs = {**self.pairs, key: pair}
+            else:
+                self.hits += 1
+            return pair
+
+    def get_metrics(self) -> dict:
+        return {
+            'pairs': len(self.pairs),
+            'hits': self.hits,
+            'misses': self.misses,
+            'loads': self.loads,
+            'age_seconds': time.monotonic() - self.loaded_at if self.loaded_at is not None else None,
+        }
+
+
+symbol_cache = SymbolCache()
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, List, Optional
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .mcx_decoder import PRICE_SCALE
+
+logger = logging.getLogger(__name__)
+
+FEED_SETTINGS = getattr(settings, 'MCX_FEED', {})
+
+# Every column is a flat little-endian int64 file: receive time in
+# microseconds since the epoch, then prices as integers of PRICE_DIGITS
+# places with NULL where the tick carried none
+COLUMNS = ('time', 'last', 'bid', 'ask')
+DTYPE = np.dtype('<i8')
+NULL = -(2 ** 63)
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def day_of(timestamp_us: int) -> str:
+    """UTC day (YYYYMMDD) of a tick time; segments never span midnight"""
+    return time.strftime('%Y%m%d', time.gmtime(timestamp_us // 1000000))
+
+
+def to_microseconds(value: datetime) -> int:
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def to_prices(column: np.ndarray) -> np.ndarray:
+    """A price column as floats, NaN where missing (a copy)"""
+    prices = column.astype(np.float64) / PRICE_SCALE
+    prices[column == NULL] = np.nan
+    return prices
+
+
+class TickHistory:
+    """
+    Per-pair, per-day columnar tick segments under a directory:
+        {directory}/{pair id}/{YYYYMMDD}/{column}.i64
+    Segments are only ever appended to, with times non-decreasing, so a
+    range is found by binary search. Reads memory-map the column files:
+    a range within one day is a view of the mapping and copies nothing.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def segment_path(self, trading_pair_id: int, day: str) -> str:
+        return os.path.join(self.directory, str(trading_pair_id), day)
+
+    def days(self, trading_pair_id: int) -> List[str]:
+        path = os.path.join(self.directory, str(trading_pair_id))
+        if not os.path.isdir(path):
+            return []
+        return sorted(name for name in os.listdir(path) if name.isdigit())
+
+    def segment(self, trading_pair_id: int, day: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        A day's columns, memory-mapped read-only; None if the pair has no
+        ticks that day. Columns are cut to their common length, so a flush
+        in progress shows up as whole ticks only.
+        """
+        path = self.segment_path(trading_pair_id, day)
+        sizes = {}
+        for column in COLUMNS:
+            try:
+                sizes[column] = os.path.getsize(os.path.join(path, f"{column}.i64")) // DTYPE.itemsize
+            except OSError:
+                return None
+        length = min(sizes.values())
+        if not length:
+            return {column: np.empty(0, dtype=DTYPE) for column in COLUMNS}
+        return {
+            column: np.memmap(os.path.join(path, f"{column}.i64"), dtype=DTYPE, mode='r', shape=(length,))
+            for column in COLUMNS
+        }
+
+    def range(self, trading_pair_id: int, start: datetime, end: datetime) -> Dict[str, np.ndarray]:
+        """
+        Ticks received in [start, end). Within one day the columns are
+        views of the memory maps; a range over several days is concatenated
+        into new arrays.
+        """
+        start_us, end_us = to_microseconds(start), to_microseconds(end)
+        first_day, last_day = day_of(start_us), day_of(max(start_us, end_us - 1))
+        parts = []
+        for day in self.days(trading_pair_id):
+            if not first_day <= day <= last_day:
+                continue
+            segment = self.segment(trading_pair_id, day)
+            if segment is None:
+                continue
+            times = segment['time']
+            lo = np.searchsorted(times, start_us, side='left')
+            hi = np.searchsorted(times, end_us, side='left')
+            if hi > lo:
+                parts.append({column: values[lo:hi] for column, values in segment.items()})
+        if not parts:
+            return {column: np.empty(0, dtype=DTYPE) for column in COLUMNS}
+        if len(parts) == 1:
+            return parts[0]
+        return {column: np.concatenate([part[column] for part in parts]) for column in COLUMNS}
+
+
+class TickHistoryWriter:
+    """
+    Buffers the feed's ticks and appends them to the tick history every
+    interval seconds. put() only appends to lists; the file writes run on a
+    worker thread, so the feed loop never waits for the disk. A failed
+    flush is kept and retried ahead of newer ticks.
+
+    Runs in the event loop of the feed handler using it: call start() from
+    that loop.
+    """
+
+    def __init__(self, history: TickHistory, interval: Optional[float] = None):
+        if interval is None:
+            interval = FEED_SETTINGS.get('TICK_HISTORY_FLUSH_INTERVAL', 1.0)
+        self.history = history
+        self.interval = interval
+        self.pending: Dict[int, List[tuple]] = {}  # pair id -> [(time, last, bid, ask)]
+        self.last_time: Dict[int, int] = {}
+        self.task = None
+        self.ticks = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.last_flush_seconds = 0.0
+
+    def put(self, trading_pair_id: int, tick, received: Optional[float] = None):
+        """Record an MCXTick received at the given epoch time (now by default)"""
+        timestamp = int((time.time() if received is None else received) * 1000000)
+        # Clock steps backwards must not unsort a segment
+        timestamp = max(timestamp, self.last_time.get(trading_pair_id, timestamp))
+        self.last_time[trading_pair_id] = timestamp
+        self.pending.setdefault(trading_pair_id, []).append((
+            timestamp,
+            NULL if tick.last_price is None else tick.last_price,
+            NULL if tick.bid_price is None else tick.bid_price,
+            NULL if tick.ask_price is None else tick.ask_price,
+        ))
+        self.ticks += 1
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.pending:
+                await self.flush()
+
+    async def flush(self):
+        """Append the pending ticks, keeping the pairs that failed for the next flush"""
+        batch, self.pending = self.pending, {}
+        try:
+            failed = await sync_to_async(self.write, thread_sensitive=False)(batch)
+        except Exception as e:
+            logger.error(f"Error writing tick history for {len(batch)} pairs: {str(e)}")
+            failed = batch
+        for trading_pair_id, rows in failed.items():
+            self.pending[trading_pair_id] = rows + self.pending.get(trading_pair_id, [])
+
+    def write(self, batch: Dict[int, List[tuple]]) -> Dict[int, List[tuple]]:
+        """One append per column for each pair and day in the batch; returns the pairs that failed"""
+        started = time.perf_counter()
+        failed = {}
+        for trading_pair_id, rows in batch.items():
+            table = np.array(rows, dtype=DTYPE)
+            row_days = [day_of(timestamp) for timestamp in table[[0, -1], 0]]
+            if row_days[0] == row_days[1]:
+                parts = [(row_days[0], table)]
+            else:
+                row_days = np.array([day_of(timestamp) for timestamp in table[:, 0]])
+                parts = [(str(day), table[row_days == day]) for day in np.unique(row_days)]
+            for index, (day, part) in enumerate(parts):
+                try:
+                    self.append(trading_pair_id, day, part)
+                except Exception as e:
+                    logger.error(f"Error writing tick history for pair {trading_pair_id} on {day}: {str(e)}")
+                    failed[trading_pair_id] = [tuple(row) for part in parts[index:] for row in part[1].tolist()]
+                    break
+                self.rows_written += len(part)
+        self.flushes += 1
+        self.last_flush_seconds = time.perf_counter() - started
+        return failed
+
+    def append(self, trading_pair_id: int, day: str, table: np.ndarray):
+        """
+        Append rows to a day's segment. If a column cannot be written the
+        others are cut back, so the columns of a segment stay aligned.
+        """
+        path = self.history.segment_path(trading_pair_id, day)
+        os.makedirs(path, exist_ok=True)
+        files = [os.path.join(path, f"{column}.i64") for column in COLUMNS]
+        sizes = [os.path.getsize(name) if os.path.exists(name) else 0 for name in files]
+        try:
+            for index, name in enumerate(files):
+                with open(name, 'ab') as f:
+                    np.ascontiguousarray(table[:, index]).tofile(f)
+        except Exception:
+            for name, size in zip(files, sizes):
+                if os.path.exists(name):
+                    os.truncate(name, size)
+            raise
+
+    def get_metrics(self) -> dict:
+        return {
+            'interval': self.interval,
+            'pending_ticks': sum(len(rows) for rows in self.pending.values()),
+            'ticks': self.ticks,
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'last_flush_seconds': self.last_flush_seconds,
+        }
+
+
+tick_history = TickHistory(FEED_SETTINGS.get('TICK_HISTORY_DIR', 'tick_history'))
+tick_history_writer = TickHistoryWriter(tick_history)
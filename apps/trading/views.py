@@ -1,21 +1,52 @@
+import logging
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from django.conf import settings
+from django.http import HttpResponse
 from django.utils import timezone
-from decimal import Decimal
+from django.utils.dateparse import parse_datetime
+from decimal import Decimal, InvalidOperation
 from .models import (
     Order, Trade, TradingPair, OrderBook, TestExchangeAPI,
     OrderType, OrderSide, OrderStatus
 )
-from .engine import MatchingEngine
+from .candles import RESOLUTIONS, candle_aggregator
+from .engine import engine_registry
+from .mcx_upstream import mcx_upstream
+from .quotes import quote_writer
+from .outbound import get_outbound_metrics
+from .sequencer import SequencerBusy
 from .test_exchange import test_exchange_manager
 from .serializers import (
     OrderSerializer, TradeSerializer, TradingPairSerializer,
     OrderBookSerializer, TestExchangeAPISerializer
 )
 
+logger = logging.getLogger(__name__)
+
+# Seconds a request waits for the pair's sequencer to run its command
+SEQUENCER_TIMEOUT = getattr(settings, 'MATCHING_ENGINE', {}).get('SEQUENCER_TIMEOUT', 10)
+
+# Most candles one request may ask for
+MAX_CANDLES = 1000
+
+def run_on_sequencer(trading_pair, action, *args):
+    """Submit a command to the pair's sequencer and wait for its result"""
+    return engine_registry.submit(trading_pair, action, *args).result(timeout=SEQUENCER_TIMEOUT)
+
+def parse_aware_datetime(value):
+    """An ISO datetime query parameter with a timezone, or None if absent"""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None or parsed.tzinfo is None:
+        raise ValueError(f"Invalid datetime {value!r}")
+    return parsed
+
 class TradingPairViewSet(viewsets.ModelViewSet):
     queryset = TradingPair.objects.filter(is_active=True)
     serializer_class = TradingPairSerializer
@@ -23,11 +54,88 @@ class TradingPairViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def order_book(self, request, pk=None):
-        """Get order book for trading pair"""
+        """
+        Get order book for trading pair. Optional ?depth=N keeps the best N
+        levels per side and ?band=bps the levels within that many basis
+        points of the mid price.
+        """
         pair = self.get_object()
-        engine = MatchingEngine(pair)
-        snapshot = engine.get_order_book_snapshot()
-        return Response(snapshot)
+        try:
+            depth = request.query_params.get('depth')
+            depth = int(depth) if depth else None
+            band = request.query_params.get('band')
+            band = Decimal(band) if band else None
+        except (ValueError, InvalidOperation):
+            return Response(
+                {'error': 'depth must be an integer and band a number of basis points'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if (depth is not None and depth < 1) or (band is not None and not (band.is_finite() and band > 0)):
+            return Response(
+                {'error': 'depth and band must be positive'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        engine = engine_registry.get_engine(pair)
+        with engine.lock:
+            content = engine.cached_snapshot(JSONRenderer().render, depth, band)
+        return HttpResponse(content, content_type='application/json')
+
+    @action(detail=True, methods=['get'])
+    def candles(self, request, pk=None):
+        """
+        Get OHLCV candles for trading pair, oldest first. ?resolution= is one
+        of 1s, 1m, 5m, 1h, 1d (default 1m); ?start= and ?end= are ISO
+        datetimes bounding the bars' open times and ?limit=N (at most
+        MAX_CANDLES) caps the count, returning the latest bars without start.
+        """
+        pair = self.get_object()
+        resolution = request.query_params.get('resolution', '1m')
+        if resolution not in RESOLUTIONS:
+            return Response(
+                {'error': f"resolution must be one of {', '.join(RESOLUTIONS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = int(request.query_params.get('limit', 500))
+            start = parse_aware_datetime(request.query_params.get('start'))
+            end = parse_aware_datetime(request.query_params.get('end'))
+        except ValueError:
+            limit = None
+        if limit is None or not 1 <= limit <= MAX_CANDLES:
+            return Response(
+                {'error': f'limit must be 1 to {MAX_CANDLES} and start/end ISO datetimes with a timezone'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({
+            'trading_pair': pair.id,
+            'resolution': resolution,
+            'candles': candle_aggregator.get_candles(pair.id, resolution, start, end, limit),
+        })
+
+    @action(detail=False, methods=['get'])
+    def engine_metrics(self, request):
+        """Get matching engine registry metrics (admin/moderator only)"""
+        if request.user.role not in ['ADMIN', 'MODERATOR']:
+            return Response(
+                {'error': 'Not allowed'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return Response(engine_registry.get_metrics())
+
+    @action(detail=False, methods=['get'])
+    def websocket_metrics(self, request):
+        """Get per-connection WebSocket queue depths, MCX upstream and quote writer state (admin/moderator only)"""
+        if request.user.role not in ['ADMIN', 'MODERATOR']:
+            return Response(
+                {'error': 'Not allowed'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return Response({
+            **get_outbound_metrics(),
+            'mcx_upstream': mcx_upstream.get_metrics(),
+            'quote_writer': quote_writer.get_metrics(),
+        })
 
     @action(detail=True, methods=['get'])
     def recent_trades(self, request, pk=None):
@@ -36,7 +144,13 @@ class TradingPairViewSet(viewsets.ModelViewSet):
         trades = Trade.objects.filter(trading_pair=pair).order_by('-timestamp')[:100]
         return Response(TradeSerializer(trades, many=True).data)
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Orders are placed with create and removed with cancel/cancel_all, both
+    through the pair's sequencer. There is no update or delete: the pair's
+    engine holds open orders in memory, and direct row writes would leave
+    its book out of step with the database.
+    """
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
 
@@ -46,7 +160,6 @@ class OrderViewSet(viewsets.ModelViewSet):
             return Order.objects.all()
         return Order.objects.filter(user=self.request.user)
 
-    @transaction.atomic
     def create(self, request, *args, **kwargs):
         """Place a new order"""
         data = request.data.copy()
@@ -58,11 +171,32 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
+        # Saved outside a transaction so the pair's sequencer thread can see it
         order = serializer.save()
         
-        # Process order through matching engine
-        engine = MatchingEngine(order.trading_pair)
-        trades = engine.process_order(order)
+        # Process order through the pair's sequencer
+        try:
+            trades = run_on_sequencer(order.trading_pair, 'place', order)
+        except SequencerBusy:
+            order.status = OrderStatus.REJECTED
+            order.save(update_fields=['status', 'updated_at'])
+            return Response(
+                {'error': 'Order queue is full, try again later'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        except FutureTimeoutError:
+            # Still queued; the engine will process it in order
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+        except Exception as e:
+            # The batch was rolled back; the sequencer rejects the order
+            # before rebuilding the book, so it is never armed later
+            logger.error(f"Order {order.id} failed on the sequencer: {str(e)}")
+            order.status = OrderStatus.REJECTED
+            order.save(update_fields=['status', 'updated_at'])
+            return Response(
+                {'error': 'Order could not be processed'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
         
         # If test mode is enabled, place test order
         if 'test_exchange_api' in data:
@@ -86,8 +220,8 @@ class OrderViewSet(viewsets.ModelViewSet):
         """Cancel an order"""
         order = self.get_object()
         
-        # Check if order can be cancelled
-        if order.status not in [OrderStatus.OPEN, OrderStatus.PARTIALLY_FILLED]:
+        # Check if order can be cancelled; pending stops wait for their trigger
+        if order.status not in [OrderStatus.OPEN, OrderStatus.PARTIALLY_FILLED, OrderStatus.PENDING]:
             return Response(
                 {'error': 'Order cannot be cancelled'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -100,14 +234,62 @@ class OrderViewSet(viewsets.ModelViewSet):
                 test_exchange_manager.cancel_test_order(test_trade)
         
         # Cancel order in matching engine
-        engine = MatchingEngine(order.trading_pair)
-        if engine.cancel_order(order):
+        try:
+            cancelled = run_on_sequencer(order.trading_pair, 'cancel', order)
+        except (SequencerBusy, FutureTimeoutError):
+            return Response(
+                {'error': 'Order queue is busy, try again later'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        if cancelled:
             return Response({'status': 'Order cancelled'})
         return Response(
             {'error': 'Failed to cancel order'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @action(detail=False, methods=['post'])
+    def cancel_all(self, request):
+        """
+        Cancel all of the user's open orders, optionally for one trading
+        pair. Pairs whose order queue is busy are listed in 'failed' and
+        left for the client to retry; the others are still cancelled.
+        """
+        user_id = request.user.id
+        if request.user.role in ['ADMIN', 'MODERATOR'] and request.data.get('all_users'):
+            user_id = None  # Clear the whole book
+        
+        pairs = TradingPair.objects.filter(is_active=True)
+        if request.data.get('trading_pair'):
+            pairs = pairs.filter(id=request.data['trading_pair'])
+        elif user_id is not None:
+            pairs = pairs.filter(
+                order__user_id=user_id,
+                order__status__in=[
+                    OrderStatus.OPEN, OrderStatus.PARTIALLY_FILLED, OrderStatus.PENDING
+                ]
+            ).distinct()
+        
+        cancelled = []
+        failed = []  # Pairs whose order queue was busy or did not answer in time
+        pairs = list(pairs)
+        for pair in pairs:
+            engine = engine_registry.get_engine(pair)
+            try:
+                cancelled += run_on_sequencer(pair, 'call', engine.mass_cancel, user_id)
+            except (SequencerBusy, FutureTimeoutError):
+                failed.append(pair.id)
+        if failed:
+            return Response(
+                {
+                    'error': 'Order queue is busy for some trading pairs, try them again later',
+                    'cancelled': cancelled,
+                    'failed': failed
+                },
+                status=status.HTTP_503_SERVICE_UNAVAILABLE if len(failed) == len(pairs) else status.HTTP_200_OK
+            )
+        return Response({'status': 'Orders cancelled', 'cancelled': cancelled})
+
 class TradeViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TradeSerializer
     permission_classes = [IsAuthenticated]
@@ -3,7 +3,7 @@ from django.utils.decorators import method_decorator
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.utils import timezone
-from .models import TradingPair
+from .quotes import quote_store
 from apps.analytics.models import MarketPrediction, SentimentAnalysis
 
 class MarketWatchView(TemplateView):
@@ -15,9 +15,7 @@ class MarketWatchView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['trading_pairs'] = TradingPair.objects.filter(
-            is_active=True
-        ).order_by('base_asset')
+        context['trading_pairs'] = quote_store.active()
         return context
 
 class AIPredictionView(TemplateView):
@@ -91,22 +89,21 @@ class AIPredictionView(TemplateView):
         return context
 
 def market_data_api(request):
-    """API endpoint for getting all market data"""
-    pairs = TradingPair.objects.filter(is_active=True)
+    """API endpoint for getting all market data, served from the quote store"""
     data = []
     
-    for pair in pairs:
+    for quote in quote_store.active():
         data.append({
-            'symbol': f"{pair.base_asset}/{pair.quote_asset}",
-            'last_price': str(pair.last_price) if pair.last_price else None,
-            'bid_price': str(pair.bid_price) if pair.bid_price else None,
-            'ask_price': str(pair.ask_price) if pair.ask_price else None,
-            'high_price': str(pair.high_price) if pair.high_price else None,
-            'low_price': str(pair.low_price) if pair.low_price else None,
-            'open_price': str(pair.open_price) if pair.open_price else None,
-            'close_price': str(pair.close_price) if pair.close_price else None,
-            'volume_24h': str(pair.volume_24h) if pair.volume_24h else '0',
-            'last_updated': pair.last_updated.isoformat() if pair.last_updated else None
+            'symbol': quote['symbol'],
+            'last_price': quote.get('last_price'),
+            'bid_price': quote.get('bid_price'),
+            'ask_price': quote.get('ask_price'),
+            'high_price': quote.get('high_price'),
+            'low_price': quote.get('low_price'),
+            'open_price': quote.get('open_price'),
+            'close_price': quote.get('close_price'),
+            'volume_24h': quote.get('volume_24h') or '0',
+            'last_updated': quote.get('last_updated')
         })
     
     return JsonResponse({
@@ -323,6 +323,11 @@ WEBSOCKET_ERROR_ALERT = 5             # Alert after 5 consecutive errors
 WEBSOCKET_QUEUE_ALERT = 1000          # Alert if message queue exceeds 1000
 WEBSOCKET_BACKLOG_ALERT = 100         # Alert if unprocessed messages exceed 100
 
+# Outbound buffering for slow clients (frames per ticker symbol conflate first)
+WEBSOCKET_OUTBOUND_MAX_QUEUE = 5000   # Frames a connection may have waiting
+WEBSOCKET_OUTBOUND_MAX_LAG = 10.0     # Seconds the oldest waiting frame may wait
+WEBSOCKET_OUTBOUND_POLICY = 'drop'    # Past either limit: 'drop' pending frames and resync, or 'disconnect'
+
 # Logging configuration
 WEBSOCKET_LOG_LEVEL = 'INFO'          # Log level for websocket operations
 WEBSOCKET_LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
@@ -370,6 +375,60 @@ CSRF_TRUSTED_ORIGINS = [
     'https://fp3zfy-8000.csb.app'
 ]
 
+# Matching engine settings
+MATCHING_ENGINE = {
+    'FIXED_POINT': True,  # Match on scaled integer ticks/lots instead of Decimals
+    'SEQUENCER_QUEUE_SIZE': 10000,  # Commands queued per pair before rejecting new ones
+    'SEQUENCER_BATCH_SIZE': 100,    # Commands applied per transaction/flush
+    'SEQUENCER_TIMEOUT': 10,        # Seconds a request waits for its command
+    # Binary journal + book snapshots used to restart without scanning the
+    # orders table. Only enable it for a single engine process per pair.
+    'JOURNAL_ENABLED': False,
+    'JOURNAL_DIR': os.path.join(BASE_DIR, 'journal'),
+    'JOURNAL_FSYNC': 'interval',        # always, interval or never
+    'JOURNAL_FSYNC_INTERVAL': 0.05,     # Seconds between fsyncs with 'interval'
+    'JOURNAL_SNAPSHOT_INTERVAL': 10000, # Records between book snapshots
+    'EXPIRY_SWEEP_INTERVAL': 60,  # Seconds between database sweeps for pairs without an engine
+}
+
+# MCX market data feed settings
+MCX_FEED = {
+    # Upstream of the MCX consumers and mcx_feed; ws://127.0.0.1:8084 for a
+    # local mcx_simulator or mcx_replay
+    'URL': 'ws://78.46.93.146:8084',
+    # Symbol -> TradingPair map of the feed handlers. Admin changes invalidate
+    # it in their own process; other processes pick them up after the TTL.
+    'SYMBOL_CACHE_TTL': 300,  # Seconds
+    # Ticks are coalesced per pair and written with one bulk_update this often
+    'WRITE_INTERVAL': 0.25,  # Seconds
+    # Decimal places of the scaled integer prices the feed decoder produces
+    'PRICE_DIGITS': 4,
+    # mcx_feed appends every tick to per-pair, per-day column files here,
+    # buffering them for this long between appends
+    'TICK_HISTORY_DIR': os.path.join(BASE_DIR, 'tick_history'),
+    'TICK_HISTORY_FLUSH_INTERVAL': 1.0,  # Seconds
+}
+
+# Latest quote per symbol, written by the MCX feeds and read by the market
+# data API, WebSocket snapshots and market watch. The local backend only
+# sees ticks of a feed in its own process; elsewhere (run.sh starts
+# mcx_feed apart from daphne) it reloads from the database every TTL
+# seconds. Share the feed's quotes between processes with Redis instead:
+#     'BACKEND': 'apps.trading.quotes.RedisQuoteBackend',
+#     'CONFIG': {'location': 'redis://127.0.0.1:6379/1', 'prefix': 'quotes'},
+QUOTE_STORE = {
+    'BACKEND': 'apps.trading.quotes.LocalQuoteBackend',
+    'CONFIG': {},
+    'TTL': 1.0,  # Seconds
+}
+
+# OHLCV candles built from feed ticks (mcx_feed) and engine trades
+CANDLES = {
+    'RING_SIZE': 1000,       # Closed bars kept in memory per pair and resolution
+    'FLUSH_INTERVAL': 1.0,   # Seconds between bulk inserts of closed bars
+    'MAX_PENDING': 100000,   # Unwritten bars kept while the database is failing
+}
+
 # Channels and WebSocket configuration
 CHANNEL_LAYERS = {
     'default': {